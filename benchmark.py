@@ -0,0 +1,561 @@
+"""
+Collect Em All! 自動遊戲程式 - 效能測試
+量測各模組熱點的執行時間
+
+執行方式:
+    python benchmark.py capture     # 比較截圖後端的延遲（需要桌面環境）
+    python benchmark.py input       # 比較輸入後端的拖曳時間（需要桌面環境，會移動滑鼠）
+    python benchmark.py simulator   # 模擬器每秒可以執行幾步
+    python benchmark.py groups      # 完整重算 vs 增量更新連通組
+    python benchmark.py logic       # game_logic 熱點（多種盤面大小與顏色數）
+
+    # 結果存成 JSON，並和之前存的基準比較（變慢超過門檻時結束碼為 1）
+    python benchmark.py logic --json results.json
+    python benchmark.py logic --compare baseline.json --threshold 0.15
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+import config
+
+
+# ==================== 輔助函數 ====================
+
+
+def summarize(samples):
+    """
+    計算延遲統計
+
+    Args:
+        samples: 每次執行的秒數列表
+
+    Returns:
+        dict: mean / p50 / p95 / p99 / max（毫秒）與每秒次數
+    """
+    ms = np.array(samples, dtype=np.float64) * 1000
+    mean = float(ms.mean())
+    return {
+        "mean_ms": mean,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "ops_per_sec": 1000 / mean if mean > 0 else float("inf"),
+    }
+
+
+def time_calls(func, rounds, warmup=3):
+    """
+    重複執行 func 並記錄每次的秒數
+
+    Args:
+        func: 無參數的函數
+        rounds: 量測次數
+        warmup: 不列入統計的暖身次數
+
+    Returns:
+        list: 每次執行的秒數
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def print_summary(name, stats):
+    """以一行印出延遲統計"""
+    print(
+        f"  {name:<24} mean {stats['mean_ms']:8.3f} ms | "
+        f"p50 {stats['p50_ms']:8.3f} | p95 {stats['p95_ms']:8.3f} | "
+        f"{stats['ops_per_sec']:10.1f} ops/s"
+    )
+
+
+# ==================== 截圖 ====================
+
+
+def bench_capture(rounds=50):
+    """
+    比較各截圖後端截取盤面區域的延遲
+
+    使用螢幕左上角、與盤面相同大小的區域，不需要開啟遊戲
+    browser 後端在無頭瀏覽器中截取本機測試頁面的同一個區域
+    """
+    import vision_module
+
+    print("\n=== 截圖後端延遲 ===\n")
+
+    board_width = config.GRID_COLS * config.CELL_SIZE
+    board_height = config.GRID_ROWS * config.CELL_SIZE
+    region = (100, 100, board_width, board_height)
+    print(f"區域: {region}（{board_width * board_height * 3 / 1e6:.2f} MB RGB）\n")
+
+    # browser 後端需要瀏覽器：開一個無頭瀏覽器載入本機測試頁面
+    driver = _open_test_page()
+
+    results = {}
+    try:
+        for name in vision_module.FRAME_SOURCES:
+            try:
+                source = vision_module.create_frame_source(name)
+            except Exception as e:
+                print(f"  {name:<24} 無法使用: {e}")
+                continue
+
+            try:
+                samples = time_calls(lambda: source.grab(region), rounds)
+            finally:
+                source.close()
+
+            results[name] = summarize(samples)
+            print_summary(name, results[name])
+    finally:
+        if driver is not None:
+            driver.quit()
+
+    return results
+
+
+def _open_test_page():
+    """
+    開一個無頭瀏覽器載入 pointer_test.html，設定給 browser 截圖後端使用
+
+    Returns:
+        WebDriver；無法啟動時回傳 None（browser 後端會顯示無法使用）
+    """
+    import os
+    import vision_module
+
+    try:
+        import game_launcher
+
+        headless = config.HEADLESS_MODE
+        config.HEADLESS_MODE = True
+        try:
+            driver = game_launcher.init_driver()
+        finally:
+            config.HEADLESS_MODE = headless
+    except Exception as e:
+        print(f"[效能] 無法啟動瀏覽器（browser 後端略過）: {e}")
+        return None
+
+    driver.set_window_size(1280, 900)
+    page = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pointer_test.html")
+    driver.get("file://" + page)
+    vision_module.attach_driver(driver)
+    return driver
+
+
+# ==================== 輸入 ====================
+
+
+def bench_input(rounds=5, cells=10):
+    """
+    比較各輸入後端拖曳一條 cells 格路徑的時間（從開始拖曳到放開）
+
+    只移動滑鼠不按鍵（避免在桌面上拖到東西），會移動真的滑鼠游標
+    "legacy" 是原本 perform_drag_full_path 的寫法（moveTo duration=0.1 + sleep 0.05 + PAUSE）
+    """
+    import pyautogui
+    import controller
+
+    print("\n=== 輸入後端拖曳時間 ===\n")
+
+    # 蛇形路徑：在盤面左上角的兩列之間來回
+    path = [(index % 2, index // 2) for index in range(cells)]
+    points = [controller.grid_to_screen(row, col, 100, 100) for row, col in path]
+    print(f"路徑: {cells} 格（不按鍵）\n")
+
+    def legacy():
+        start = time.perf_counter()
+        pyautogui.moveTo(*points[0], duration=config.MOUSE_MOVE_DURATION)
+        time.sleep(0.1)
+        time.sleep(0.1)
+        for x, y in points[1:]:
+            pyautogui.moveTo(x, y, duration=0.1)
+            time.sleep(0.05)
+        return time.perf_counter() - start
+
+    runners = {"legacy": (legacy, None)}
+    for name in controller.INPUT_BACKENDS:
+        try:
+            backend = controller.create_input_backend(name)
+        except Exception as e:
+            print(f"  {name:<24} 無法使用: {e}")
+            continue
+        runners[name] = (lambda backend=backend: backend.drag(points, press=False), backend)
+
+    results = {}
+    for name, (run, backend) in runners.items():
+        try:
+            samples = [run() for _ in range(rounds)]
+        finally:
+            if backend is not None:
+                backend.close()
+
+        results[name] = summarize(samples)
+        print_summary(name, results[name])
+
+    return results
+
+
+# ==================== 模擬器 ====================
+
+
+def bench_simulator(steps=100000, seed=0):
+    """
+    量測模擬器的速度（消除 + 落下 + 補球）
+
+    先用 bitboard + calculate_drag_path 找出一批合法路徑，量測時只計算 apply_move 本身
+    """
+    import bitboard
+    import game_logic
+    import simulator
+
+    print("\n=== 模擬器速度 ===\n")
+
+    sim = simulator.GameSimulator(seed=seed)
+    board = sim.new_board()
+    geometry = bitboard.get_geometry(sim.rows, sim.cols)
+
+    # 準備 (盤面, 路徑) 的序列：每一步都取第一個拖得動的組合
+    moves = []
+    while len(moves) < 1000:
+        groups = bitboard.group_masks(bitboard.color_masks(board), geometry)
+        paths = [
+            game_logic.calculate_drag_path(bitboard.mask_to_cells(group, sim.cols))
+            for _, group in groups
+        ]
+        paths = [path for path in paths if len(path) >= config.MIN_GROUP_SIZE]
+        if not paths:
+            board = sim.new_board()
+            continue
+        path = paths[0]
+        moves.append((board, path))
+        board, _ = sim.apply_move(board, path, validate=False)
+
+    results = {}
+    for name, validate in (("apply_move", False), ("apply_move+validate", True)):
+        start = time.perf_counter()
+        for i in range(steps):
+            board, path = moves[i % len(moves)]
+            sim.apply_move(board, path, validate=validate)
+        elapsed = time.perf_counter() - start
+
+        results[name] = {"steps_per_sec": steps / elapsed, "us_per_step": elapsed / steps * 1e6}
+        print(
+            f"  {name:<24} {results[name]['us_per_step']:8.2f} us/步 | "
+            f"{results[name]['steps_per_sec']:10.0f} 步/秒"
+        )
+
+    return results
+
+
+# ==================== 連通組 ====================
+
+
+def bench_groups(steps=2000, seed=0):
+    """
+    比較移動後取得所有組合的成本
+
+    - bfs / bitboard: 每一步都對整個盤面完整重算
+    - incremental: GroupIndex.update 只重建受影響的組合（傳入路徑經過的行）
+    """
+    import bitboard
+    import game_logic
+    import group_index
+    import simulator
+
+    print("\n=== 連通組：完整重算 vs 增量更新 ===\n")
+
+    # 準備一串連續的盤面（每一步消除最大的組合）
+    sim = simulator.GameSimulator(seed=seed)
+    board = sim.new_board()
+    boards = [board]
+    columns = [None]
+    while len(boards) < steps:
+        groups = bitboard.find_all_groups(board)
+        if not groups:
+            board = sim.new_board()
+            boards.append(board)
+            columns.append(None)
+            continue
+        path = game_logic.calculate_drag_path(max(groups, key=len))
+        board, _ = sim.apply_move(board, path, validate=False)
+        boards.append(board)
+        columns.append({col for _, col in path})
+
+    engine = config.GROUP_ENGINE
+
+    def run_full(name):
+        config.GROUP_ENGINE = name
+        try:
+            for current in boards:
+                game_logic.find_all_groups(current)
+        finally:
+            config.GROUP_ENGINE = engine
+
+    def run_incremental():
+        index = group_index.GroupIndex()
+        for current, touched in zip(boards, columns):
+            index.update(current, touched)
+            index.groups()
+
+    results = {}
+    for name, func in (
+        ("bfs", lambda: run_full("bfs")),
+        ("bitboard", lambda: run_full("bitboard")),
+        ("incremental", run_incremental),
+    ):
+        samples = time_calls(func, rounds=5, warmup=1)
+        per_step = [sample / len(boards) for sample in samples]
+        results[name] = summarize(per_step)
+        print_summary(name, results[name])
+
+    speedup = results["bfs"]["mean_ms"] / results["incremental"]["mean_ms"]
+    print(f"\n  增量更新比 bfs 完整重算快 {speedup:.1f} 倍")
+    return results
+
+
+# ==================== game_logic 熱點 ====================
+
+# 測試用盤面：(列數, 行數, 顏色數)
+LOGIC_CORPORA = [(6, 6, 5), (6, 6, 3), (9, 9, 5), (12, 12, 5)]
+
+
+def make_corpus(rows, cols, colors, count, seed=0):
+    """
+    產生可重現的隨機盤面
+
+    Args:
+        rows, cols: 盤面大小
+        colors: 使用 BALL_COLORS 的前幾種顏色
+        count: 盤面數量
+        seed: 亂數種子（同樣的參數永遠產生同樣的盤面）
+
+    Returns:
+        list: [Board, ...]
+    """
+    import simulator
+
+    weights = {name: 1 for name in list(config.BALL_COLORS)[:colors]}
+    sim = simulator.GameSimulator(seed=seed, weights=weights, rows=rows, cols=cols)
+    return [sim.new_board() for _ in range(count)]
+
+
+def time_each(func, items, warmup=1):
+    """
+    對每個 item 各執行一次 func，分別記錄秒數
+
+    Returns:
+        list: 每次執行的秒數
+    """
+    for item in items[:warmup]:
+        func(item)
+
+    samples = []
+    perf_counter = time.perf_counter
+    for item in items:
+        start = perf_counter()
+        func(item)
+        samples.append(perf_counter() - start)
+    return samples
+
+
+def bench_logic(boards=200, seed=0):
+    """
+    量測 game_logic 熱點在不同盤面上的延遲
+
+    - find_all_groups: 整個盤面找組合（config.GROUP_ENGINE）
+    - find_connected_group: 從最大組合的第一格做一次 BFS
+    - drag_path_cold / drag_path_cached: calculate_drag_path 清空形狀快取 / 快取已經暖好
+    - analyze_and_select_move: 完整決策（config.PLANNER，每次清空決策快取）
+    """
+    import game_logic
+    from board import get_grid
+
+    print("\n=== game_logic 熱點 ===")
+
+    results = {}
+    for rows, cols, colors in LOGIC_CORPORA:
+        corpus = make_corpus(rows, cols, colors, boards, seed)
+        grid = get_grid(rows, cols)
+        groups = [game_logic.find_all_groups(board) for board in corpus]
+        all_groups = [group for board_groups in groups for group in board_groups]
+        starts = [
+            (board, max(board_groups, key=len)[0])
+            for board, board_groups in zip(corpus, groups)
+            if board_groups
+        ]
+
+        def connected(item):
+            board, (row, col) = item
+            visited = [[False] * cols for _ in range(rows)]
+            game_logic.find_connected_group(board, row, col, visited, grid)
+
+        def cold_path(group):
+            game_logic._solve_shape.cache_clear()
+            game_logic.calculate_drag_path(group)
+
+        def analyze(board):
+            game_logic.get_decision_table().clear()
+            game_logic.analyze_and_select_move(board)
+
+        name = f"{rows}x{cols}-c{colors}"
+        print(f"\n{name}（{len(corpus)} 個盤面，{len(all_groups)} 個組合）")
+
+        # 量測時關掉除錯輸出（analyze_and_select_move 的除錯訊息會算進時間）
+        debug_mode = config.DEBUG_MODE
+        config.DEBUG_MODE = False
+        try:
+            samples = {
+                "find_all_groups": time_each(game_logic.find_all_groups, corpus),
+                "find_connected_group": time_each(connected, starts),
+                "drag_path_cold": time_each(cold_path, all_groups),
+            }
+
+            # 先把所有形狀放進快取，再量測查表的成本
+            for group in all_groups:
+                game_logic.calculate_drag_path(group)
+            samples["drag_path_cached"] = time_each(game_logic.calculate_drag_path, all_groups)
+            samples["analyze_and_select_move"] = time_each(analyze, corpus)
+        finally:
+            config.DEBUG_MODE = debug_mode
+
+        results[name] = {}
+        for op, op_samples in samples.items():
+            results[name][op] = summarize(op_samples)
+            print_summary(op, results[name][op])
+
+    return results
+
+
+# ==================== JSON 與比較 ====================
+
+
+def flatten_results(results, prefix=""):
+    """
+    把巢狀的結果攤平成 {"logic/6x6-c5/find_all_groups": stats, ...}
+
+    只有包含 "mean_ms" 的 dict 才算一筆統計
+    """
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict) and "mean_ms" in value:
+            flat[name] = value
+        elif isinstance(value, dict):
+            flat.update(flatten_results(value, name))
+    return flat
+
+
+def save_results(path, results):
+    """把結果連同執行環境寫成 JSON"""
+    payload = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": {
+            "GROUP_ENGINE": config.GROUP_ENGINE,
+            "PLANNER": config.PLANNER,
+            "CONNECTIVITY": config.CONNECTIVITY,
+        },
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    print(f"\n[效能] 結果已寫入 {path}")
+
+
+def compare_results(results, baseline_path, threshold, metric="p50_ms"):
+    """
+    和基準 JSON 比較，列出變慢超過門檻的項目
+
+    Args:
+        results: 這次的結果
+        baseline_path: save_results 寫出的 JSON
+        threshold: 容許變慢的比例（0.1 = 10%）
+        metric: 比較哪個統計（預設中位數，比平均值不受偶發延遲影響）
+
+    Returns:
+        list: 變慢的項目名稱
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = flatten_results(json.load(f)["results"])
+    current = flatten_results(results)
+
+    print(f"\n=== 與基準比較（{baseline_path}，{metric}，門檻 {threshold:.0%}）===\n")
+
+    regressions = []
+    for name, stats in current.items():
+        if name not in baseline:
+            print(f"  {name:<52} （基準中沒有）")
+            continue
+
+        before = baseline[name][metric]
+        after = stats[metric]
+        change = (after - before) / before if before > 0 else 0.0
+
+        flag = ""
+        if change > threshold:
+            flag = "  ❌ 變慢"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  ✅ 變快"
+        print(f"  {name:<52} {before:9.4f} -> {after:9.4f} ms ({change:+7.1%}){flag}")
+
+    if regressions:
+        print(f"\n[效能] {len(regressions)} 個項目變慢超過 {threshold:.0%}")
+    else:
+        print("\n[效能] 沒有項目變慢超過門檻")
+    return regressions
+
+
+# ==================== 主程式 ====================
+
+BENCHMARKS = {
+    "capture": bench_capture,
+    "input": bench_input,
+    "simulator": bench_simulator,
+    "groups": bench_groups,
+    "logic": bench_logic,
+}
+
+
+def main():
+    """依命令列參數執行對應的效能測試"""
+    parser = argparse.ArgumentParser(description="Collect Em All! 效能測試")
+    parser.add_argument("names", nargs="*", help=f"要執行的測試（可用: {list(BENCHMARKS)}）")
+    parser.add_argument("--json", help="把結果寫成 JSON")
+    parser.add_argument("--compare", help="和之前寫出的 JSON 比較")
+    parser.add_argument("--threshold", type=float, default=0.1, help="容許變慢的比例（預設 0.1）")
+    args = parser.parse_args()
+
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"[錯誤] 未知的效能測試: {name}（可用: {list(BENCHMARKS)}）")
+            sys.exit(1)
+
+    results = {}
+    for name in names:
+        results[name] = BENCHMARKS[name]()
+
+    if args.json:
+        save_results(args.json, results)
+
+    if args.compare and compare_results(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
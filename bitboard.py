@@ -0,0 +1,230 @@
+"""
+Collect Em All! 自動遊戲程式 - 位元盤面（bitboard）連通組引擎
+用整數的位元表示盤面，以位移和遮罩運算找出連通組
+
+學習資源:
+- Bitboard: https://www.chessprogramming.org/Bitboards
+- Flood fill: https://en.wikipedia.org/wiki/Flood_fill
+
+學習重點:
+- 格子 (row, col) 對應第 row * cols + col 個位元
+- 每種顏色一個整數（bitmask），該顏色的格子位元為 1
+- 「往右一格」= 左移 1 位，但最右邊一行會繞到下一列的最左邊，所以要用邊緣遮罩清掉
+- 「往下一格」= 左移 cols 位，超出盤面的位元用 full 遮罩清掉
+- 從一個格子開始，不斷「往 8 方向擴張一格，再和同色遮罩取交集」，直到不再變大
+"""
+
+from functools import lru_cache
+import config
+from board import BALL_CODES, as_board
+
+
+class BitboardGeometry:
+    """
+    某個盤面大小的邊緣遮罩（建立一次，重複使用）
+
+    Attributes:
+        rows, cols: 盤面大小
+        full: 所有格子都是 1 的遮罩
+        not_first_col: 除了第一行以外都是 1（往右移之後用）
+        not_last_col: 除了最後一行以外都是 1（往左移之後用）
+        connectivity: 4 或 8 方向相鄰
+    """
+
+    def __init__(self, rows, cols, connectivity=8):
+        if connectivity not in (4, 8):
+            raise ValueError(f"connectivity 必須是 4 或 8，收到 {connectivity}")
+
+        self.rows = rows
+        self.cols = cols
+        self.connectivity = connectivity
+        self.full = (1 << (rows * cols)) - 1
+
+        first_col = 0
+        for row in range(rows):
+            first_col |= 1 << (row * cols)
+        last_col = first_col << (cols - 1)
+
+        self.not_first_col = self.full & ~first_col
+        self.not_last_col = self.full & ~last_col
+
+    def dilate(self, mask):
+        """
+        把遮罩往相鄰方向擴張一格（包含原本的格子）
+
+        學習重點:
+        - 8 方向：先左右擴張，再把結果上下擴張，就包含了斜角
+        - 4 方向：左右、上下分別擴張後取聯集
+        """
+        cols = self.cols
+        horizontal = (
+            mask
+            | ((mask << 1) & self.not_first_col)
+            | ((mask >> 1) & self.not_last_col)
+        )
+
+        if self.connectivity == 8:
+            return (horizontal | (horizontal << cols) | (horizontal >> cols)) & self.full
+
+        return (horizontal | (mask << cols) | (mask >> cols)) & self.full
+
+
+def get_geometry(rows, cols, connectivity=None):
+    """取得（並快取）指定大小的邊緣遮罩（connectivity 預設 config.CONNECTIVITY）"""
+    return _build_geometry(rows, cols, connectivity or config.CONNECTIVITY)
+
+
+@lru_cache(maxsize=None)
+def _build_geometry(rows, cols, connectivity):
+    return BitboardGeometry(rows, cols, connectivity)
+
+
+def color_masks(board_state):
+    """
+    把盤面轉成每種顏色一個遮罩
+
+    Args:
+        board_state: Board 或二維字串陣列
+
+    Returns:
+        dict: 顏色代碼 -> 遮罩（只包含球的顏色，不含 EMPTY / UNKNOWN）
+    """
+    board = as_board(board_state)
+    data = board.data
+
+    # 📝 STUDY: bytes.translate 一次把整個盤面變成「是這個顏色 = 1，否則 = 0」，
+    # 再用 bytes.find 跳到每個 1 的位置設定位元（不用逐格比較）
+    masks = {}
+    for code in BALL_CODES:
+        if code not in data:
+            masks[code] = 0
+            continue
+        selected = data.translate(_SELECT_TABLES[code])
+        masks[code] = _bytes_to_bits(selected)
+
+    return masks
+
+
+# 每種顏色的 translate 表：該顏色 -> 1，其他 -> 0
+_SELECT_TABLES = {
+    code: bytes(1 if value == code else 0 for value in range(256)) for code in BALL_CODES
+}
+
+
+def _bytes_to_bits(selected):
+    """
+    把每格 0/1 的 bytes 壓成位元遮罩（第 i 個 byte -> 第 i 個位元）
+
+    學習重點:
+    - bytes.find 在 C 裡面搜尋，只有值為 1 的格子才會進到 Python 迴圈
+    """
+    mask = 0
+    index = selected.find(1)
+    while index != -1:
+        mask |= 1 << index
+        index = selected.find(1, index + 1)
+    return mask
+
+
+def component_mask(seed, mask, geometry):
+    """
+    找出 seed 所在的連通組
+
+    Args:
+        seed: 起點的位元（例如 1 << index）
+        mask: 同色格子的遮罩
+        geometry: BitboardGeometry
+
+    Returns:
+        int: 連通組的遮罩
+    """
+    group = seed & mask
+
+    if geometry.connectivity != 8:
+        dilate = geometry.dilate
+        while True:
+            grown = dilate(group) & mask
+            if grown == group:
+                return group
+            group = grown
+
+    # 📝 STUDY: 每次往外擴張一格，直到不再變大
+    # （把 dilate() 展開在迴圈裡，省下函數呼叫的時間）
+    cols = geometry.cols
+    not_first_col = geometry.not_first_col
+    not_last_col = geometry.not_last_col
+
+    while True:
+        horizontal = group | ((group << 1) & not_first_col) | ((group >> 1) & not_last_col)
+        grown = (horizontal | (horizontal << cols) | (horizontal >> cols)) & mask
+        if grown == group:
+            return group
+        group = grown
+
+
+def group_masks(masks, geometry, min_size=None):
+    """
+    找出所有連通組（以遮罩表示）
+
+    Args:
+        masks: color_masks() 的結果
+        geometry: BitboardGeometry
+        min_size: 最小組合大小（預設 config.MIN_GROUP_SIZE）
+
+    Returns:
+        list: [(顏色代碼, 遮罩), ...]，依每組最小的格子編號排序（與 BFS 掃描順序相同）
+    """
+    if min_size is None:
+        min_size = config.MIN_GROUP_SIZE
+
+    found = []
+    for code, remaining in masks.items():
+        # 同色格子太少，不可能形成組合
+        if remaining.bit_count() < min_size:
+            continue
+
+        while remaining:
+            seed = remaining & -remaining  # 最低位的 1
+            group = component_mask(seed, remaining, geometry)
+            remaining &= ~group
+
+            if group.bit_count() >= min_size:
+                found.append((seed.bit_length() - 1, code, group))
+
+    found.sort()
+    return [(code, group) for _, code, group in found]
+
+
+def mask_to_cells(mask, cols):
+    """
+    遮罩 -> 格子座標列表
+
+    Returns:
+        list: [(row, col), ...]，依列優先順序排列
+    """
+    cells = []
+    while mask:
+        low = mask & -mask
+        index = low.bit_length() - 1
+        cells.append(divmod(index, cols))
+        mask ^= low
+    return cells
+
+
+def find_all_groups(board_state, min_size=None, connectivity=None):
+    """
+    尋找盤面上所有可消除的球組（與 game_logic.find_all_groups 相同的組合）
+
+    Args:
+        board_state: Board 或二維字串陣列
+        min_size: 最小組合大小（預設 config.MIN_GROUP_SIZE）
+        connectivity: 4 或 8 方向相鄰（預設 config.CONNECTIVITY）
+
+    Returns:
+        list: [[(row, col), ...], ...]
+              組合的順序與 BFS 版本相同；組內的格子依列優先順序排列
+    """
+    board = as_board(board_state)
+    geometry = get_geometry(board.rows, board.cols, connectivity)
+    groups = group_masks(color_masks(board), geometry, min_size)
+    return [mask_to_cells(group, board.cols) for _, group in groups]
@@ -0,0 +1,315 @@
+"""
+Collect Em All! 自動遊戲程式 - 盤面資料結構
+用一塊連續的 uint8 陣列表示盤面，視覺、邏輯、主程式共用
+
+學習資源:
+- numpy 陣列: https://numpy.org/doc/stable/user/absolute_beginners.html
+- IntEnum: https://docs.python.org/3/library/enum.html#enum.IntEnum
+"""
+
+from enum import IntEnum
+from functools import lru_cache
+import numpy as np
+import config
+
+
+# 📝 STUDY: 顏色代碼（由 config.BALL_COLORS 產生）
+# 0 = EMPTY，1..K = BALL_COLORS 中的顏色（依序），K+1 = UNKNOWN
+Color = IntEnum(
+    "Color",
+    [("EMPTY", 0)]
+    + [(name, index + 1) for index, name in enumerate(config.BALL_COLORS)]
+    + [("UNKNOWN", len(config.BALL_COLORS) + 1)],
+)
+
+# 熱點迴圈中直接用 int 比較，比 IntEnum 快
+EMPTY = int(Color.EMPTY)
+UNKNOWN = int(Color.UNKNOWN)
+BALL_CODES = tuple(range(1, UNKNOWN))  # 所有球的顏色代碼
+
+COLOR_NAMES = tuple(color.name for color in Color)  # 代碼 -> 名稱
+_NAME_TO_CODE = {color.name: int(color) for color in Color}
+
+
+def color_code(name):
+    """顏色名稱 -> 代碼（不認得的名稱視為 UNKNOWN）"""
+    return _NAME_TO_CODE.get(name, UNKNOWN)
+
+
+def color_name(code):
+    """代碼 -> 顏色名稱"""
+    return COLOR_NAMES[code]
+
+
+class Board:
+    """
+    盤面（不可修改）
+
+    學習重點:
+    - 內部是一塊 (rows, cols) 的 uint8 陣列，每格一個顏色代碼
+    - 雜湊值第一次計算後就記住，之後 O(1)
+    - 比較兩個盤面只要比較 bytes，不用逐格比較字串
+    - cells 回傳唯讀的 view，不會複製資料
+    - 從 bytes 建立時（模擬器），numpy 陣列等到第一次使用 cells 才建立
+
+    用法:
+        board = Board.from_grid([["RED", "BLUE"], ["GREEN", "RED"]])
+        board[0, 1]             # -> Color.BLUE 的代碼
+        board.color_at(0, 1)    # -> "BLUE"
+        board.to_grid()         # -> 轉回二維字串陣列
+    """
+
+    __slots__ = ("_cells", "_data", "_shape", "_hash")
+
+    def __init__(self, cells):
+        cells = np.array(cells, dtype=np.uint8, copy=True, order="C")
+        if cells.ndim != 2:
+            raise ValueError(f"盤面必須是二維陣列，收到形狀 {cells.shape}")
+
+        cells.flags.writeable = False
+        self._cells = cells
+        self._data = None
+        self._shape = cells.shape
+        self._hash = None
+
+    # ==================== 轉換 ====================
+
+    @classmethod
+    def from_grid(cls, grid):
+        """從二維字串陣列建立盤面（原本的 board_state 格式）"""
+        return cls([[color_code(name) for name in row] for row in grid])
+
+    @classmethod
+    def from_indices(cls, indices):
+        """
+        從調色盤索引建立盤面
+
+        Args:
+            indices: BALL_COLORS 中的索引陣列，-1 表示 UNKNOWN
+                     （vision_module.lookup_colors 的結果）
+        """
+        indices = np.asarray(indices)
+        codes = np.where(indices < 0, UNKNOWN, indices + 1)
+        return cls(codes)
+
+    @classmethod
+    def from_bytes(cls, data, rows, cols):
+        """
+        從 bytes（Board.data）建立盤面
+
+        學習重點:
+        - bytes 本身不可修改，np.frombuffer 直接共用同一塊記憶體（唯讀、不複製）
+        - 模擬器每一步都會建立新盤面，省下複製和 tobytes() 的時間
+        """
+        data = bytes(data)
+        if len(data) != rows * cols:
+            raise ValueError(f"資料長度 {len(data)} 和盤面大小 {rows}x{cols} 不符")
+
+        board = cls.__new__(cls)
+        board._cells = None
+        board._data = data
+        board._shape = (rows, cols)
+        board._hash = None
+        return board
+
+    def to_grid(self):
+        """轉回二維字串陣列"""
+        return [[COLOR_NAMES[code] for code in row] for row in self.cells.tolist()]
+
+    # ==================== 屬性 ====================
+
+    @property
+    def cells(self):
+        """唯讀的 (rows, cols) uint8 陣列"""
+        if self._cells is None:
+            self._cells = np.frombuffer(self._data, dtype=np.uint8).reshape(self._shape)
+        return self._cells
+
+    @property
+    def data(self):
+        """
+        逐列攤平的 bytes（第一次使用時建立）
+
+        學習重點:
+        - bytes[i] 取出來就是 Python int，在純 Python 迴圈中比 numpy 索引快很多
+        - 格子 (row, col) 的位置是 row * cols + col
+        """
+        if self._data is None:
+            self._data = self._cells.tobytes()
+        return self._data
+
+    @property
+    def rows(self):
+        return self._shape[0]
+
+    @property
+    def cols(self):
+        return self._shape[1]
+
+    @property
+    def shape(self):
+        return self._shape
+
+    def color_at(self, row, col):
+        """取得格子的顏色名稱"""
+        return COLOR_NAMES[self.data[row * self._shape[1] + col]]
+
+    def count(self, code):
+        """計算某個顏色代碼出現幾次"""
+        return self.data.count(code)
+
+    def replace(self, updates):
+        """
+        回傳修改部分格子後的新盤面
+
+        Args:
+            updates: {(row, col): code, ...}
+        """
+        cells = self.cells.copy()
+        for (row, col), code in updates.items():
+            cells[row, col] = code
+        return Board(cells)
+
+    # ==================== Python 協定 ====================
+
+    def __getitem__(self, position):
+        """board[row, col] -> 顏色代碼"""
+        return int(self.cells[position])
+
+    def __eq__(self, other):
+        if not isinstance(other, Board):
+            return NotImplemented
+        return self.shape == other.shape and self.data == other.data
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self.shape, self.data))
+        return self._hash
+
+    def __reduce__(self):
+        return (Board, (self.cells,))
+
+    def __repr__(self):
+        rows = "\n".join(
+            " ".join(f"{COLOR_NAMES[code]:>7}" for code in row)
+            for row in self.cells.tolist()
+        )
+        return f"Board({self.rows}x{self.cols})\n{rows}"
+
+
+def as_board(board_state):
+    """
+    把 Board 或二維字串陣列統一轉成 Board
+
+    Args:
+        board_state: Board 或 [["RED", ...], ...]
+
+    Returns:
+        Board
+    """
+    if isinstance(board_state, Board):
+        return board_state
+    return Board.from_grid(board_state)
+
+
+# ==================== 盤面拓撲 ====================
+
+
+class Grid:
+    """
+    盤面拓撲：每個格子的鄰居（建立一次，重複使用）
+
+    學習重點:
+    - 格子 (row, col) 攤平成 index = row * cols + col，和 Board.data 相同
+    - neighbors[index] 事先列出所有在盤面內的鄰居 index，熱點迴圈不用再檢查邊界
+    - connectivity = 8：上下左右 + 斜角；4：只有上下左右
+    - 任意大小都可以（例如 9x9、12x12 的變體盤面）
+
+    Attributes:
+        rows, cols, size: 盤面大小與格子總數
+        connectivity: 4 或 8
+        directions: 使用的方向 (dr, dc)
+        positions: index -> (row, col)
+        neighbors: index -> 鄰居 index 的 tuple
+    """
+
+    def __init__(self, rows, cols, connectivity=8):
+        if connectivity not in (4, 8):
+            raise ValueError(f"connectivity 必須是 4 或 8，收到 {connectivity}")
+
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.connectivity = connectivity
+        self.directions = directions_for(connectivity)
+        self.positions = tuple(divmod(index, cols) for index in range(self.size))
+        self.neighbors = tuple(
+            tuple(
+                (row + dr) * cols + (col + dc)
+                for dr, dc in self.directions
+                if 0 <= row + dr < rows and 0 <= col + dc < cols
+            )
+            for row, col in self.positions
+        )
+
+    def index(self, row, col):
+        """(row, col) -> index"""
+        return row * self.cols + col
+
+    def contains(self, row, col):
+        """座標是否在盤面內"""
+        return 0 <= row < self.rows and 0 <= col < self.cols
+
+    def __repr__(self):
+        return f"Grid({self.rows}x{self.cols}, connectivity={self.connectivity})"
+
+
+def directions_for(connectivity=None):
+    """
+    取得相鄰方向
+
+    Args:
+        connectivity: 4 或 8（預設 config.CONNECTIVITY）
+
+    Returns:
+        tuple: ((dr, dc), ...)；config.DIRECTIONS 的前 4 個是上下左右
+    """
+    if connectivity is None:
+        connectivity = config.CONNECTIVITY
+    if connectivity == 4:
+        return tuple(config.DIRECTIONS[:4])
+    return tuple(config.DIRECTIONS)
+
+
+def is_adjacent(a, b, connectivity=None):
+    """兩個格子是否相鄰（依 connectivity）"""
+    dr = abs(a[0] - b[0])
+    dc = abs(a[1] - b[1])
+    if connectivity is None:
+        connectivity = config.CONNECTIVITY
+    if connectivity == 4:
+        return dr + dc == 1
+    return max(dr, dc) == 1
+
+
+def get_grid(rows=None, cols=None, connectivity=None):
+    """
+    取得（並快取）指定大小的盤面拓撲
+
+    Args:
+        rows, cols: 盤面大小（預設 config.GRID_ROWS / GRID_COLS）
+        connectivity: 4 或 8（預設 config.CONNECTIVITY）
+
+    Returns:
+        Grid
+    """
+    return _build_grid(
+        rows or config.GRID_ROWS,
+        cols or config.GRID_COLS,
+        connectivity or config.CONNECTIVITY,
+    )
+
+
+@lru_cache(maxsize=None)
+def _build_grid(rows, cols, connectivity):
+    return Grid(rows, cols, connectivity)
@@ -42,6 +42,15 @@ GRID_COLS = 6
 # 格式：(x_offset, y_offset)
 BOARD_OFFSET_FROM_REFERENCE = (692, 415)  # 🔍 可能需要調整
 
+# 🔍 ADJUST: 畫面變化偵測（畫面沒變就沿用上次的分析結果）
+FRAME_FINGERPRINT_STEP = 4  # 指紋取樣間隔（像素）
+FRAME_CHANGE_THRESHOLD = 6  # 每格平均顏色差異超過這個值才算畫面有變化
+
+# 🔍 ADJUST: 盤面位置快取與重新確認
+BOARD_LOCATION_CACHE = "assets/board_location.json"  # 盤面位置快取檔（連同視窗位置一起存）
+BOARD_VERIFY_MARGIN = 40  # 確認位置時，在參考圖示周圍多截幾個像素
+BOARD_VERIFY_INTERVAL = 10  # 遊戲中每隔幾回合重新確認盤面位置（0 表示不確認）
+
 # 📝 STUDY: 格子大小（像素）
 CELL_SIZE = 97  # 🔍 可能需要調整
 
@@ -54,6 +63,22 @@ COLOR_SAMPLE_RADIUS = 15  # 取 30x30 像素區域的平均顏色
 # 如果使用一般顯示器，設為 1.0
 DISPLAY_SCALE_FACTOR = 2.0  # 你的 4K 顯示器應該是 2.0
 
+# 🔍 ADJUST: 截圖後端
+# - "region": 只截取需要的區域（使用 mss，X11 上走 shared memory），並重複使用緩衝區
+# - "pyautogui": 原本的做法（截全螢幕再裁切），沒有安裝 mss 時會自動退回這個
+# - "browser": 直接從瀏覽器取得頁面畫面（不截螢幕，可用於 HEADLESS_MODE；搭配 INPUT_BACKEND = "canvas"）
+CAPTURE_BACKEND = "region"
+
+# 🔍 ADJUST: browser 截圖後端
+# - "cdp": Page.captureScreenshot 只截盤面區域（Chrome）
+# - "canvas": 在頁面裡讀回 canvas 的像素（CANVAS_SELECTOR；WebGL 遊戲需要 preserveDrawingBuffer）
+BROWSER_CAPTURE_MODE = "cdp"
+# 截圖像素 / CSS 像素：模板、CELL_SIZE 和盤面座標都是以 DISPLAY_SCALE_FACTOR 的螢幕像素量的，
+# 所以預設用同一個倍數（無頭瀏覽器的 devicePixelRatio 是 1，用它的話畫面只有模板的一半大）
+# None = 頁面的 devicePixelRatio
+BROWSER_CAPTURE_SCALE = DISPLAY_SCALE_FACTOR
+BROWSER_CAPTURE_FORMAT = "png"  # "png"（無損）或 "jpeg"（編碼較快，顏色有些微誤差）
+
 
 # ==================== 顏色定義 ====================
 
@@ -72,6 +97,12 @@ BALL_COLORS = {
 # 越小越嚴格，越大越寬鬆
 COLOR_TOLERANCE = 80
 
+# 📝 STUDY: 顏色查表（LUT）
+# 啟動時把「任意 RGB -> 顏色」預先算成一張表，之後辨識只要查表
+# BALL_COLORS 或 COLOR_TOLERANCE 改變時會自動重建
+COLOR_LUT_BITS = 6  # 每個通道保留幾個位元（6 -> 64x64x64 的表，約 256 KB）
+COLOR_LUT_CACHE_DIR = "assets/cache"  # 查表快取資料夾（檔名包含調色盤的雜湊）
+
 # 除錯用：顏色對應的 emoji
 COLOR_EMOJI = {
     "RED": "🔴",
@@ -89,6 +120,44 @@ COLOR_EMOJI = {
 # 最小消除數量
 MIN_GROUP_SIZE = 3
 
+# 🔍 ADJUST: 連通組引擎
+# - "bfs": 逐格 BFS（find_connected_group）
+# - "bitboard": 位元盤面，用位移和遮罩擴張（bitboard.py），適合大量搜尋
+GROUP_ENGINE = "bfs"
+
+# 🔍 ADJUST: 遊戲中用增量索引（group_index.py）維護連通組
+# 每次移動後只重建顏色改變的格子所在的組合，結果和完整重算相同
+INCREMENTAL_GROUPS = True
+
+# 🔍 ADJUST: 拖曳路徑搜尋（calculate_drag_path）
+DRAG_PATH_MAX_NODES = 20000  # 每個形狀最多搜尋幾個節點（超過就用目前最長的路徑）
+DRAG_PATH_CACHE_SIZE = 4096  # 記住幾種形狀的答案
+
+# 🔍 ADJUST: 選擇移動的策略
+# - "greedy": 選最大的組合（不往前看）
+# - "expectimax": 用 simulator 往前看幾步，對補球抽樣取平均
+# - "rollout": 每個候選移動各模擬幾局短局（常駐 process pool 平行計算），取平均分數
+PLANNER = "greedy"
+PLANNER_TIME_FRACTION = 0.3  # 每步最多用 WAIT_ANIMATION 的幾成時間搜尋（時間到就用目前最好的）
+PLANNER_MAX_DEPTH = 4  # 最多往前看幾步
+PLANNER_SAMPLES = 3  # 每個機會節點抽樣幾次補球
+PLANNER_BRANCHING = 6  # 內層每個盤面只考慮最大的幾個移動
+PLANNER_SEED = 0  # 搜尋抽樣的亂數種子
+ROLLOUT_COUNT = 16  # rollout: 每個候選移動模擬幾局
+ROLLOUT_DEPTH = 5  # rollout: 每局執行候選移動之後再用貪心玩幾步
+ROLLOUT_WORKERS = None  # rollout: process 數量，None = CPU 核心數
+ROLLOUT_MIN_TIME = 0.02  # rollout: 剩下的規劃時間少於幾秒就直接用貪心
+
+# 🔍 ADJUST: 置換表（transposition.py），讓搜尋重用看過的盤面
+TT_MAX_MB = 16  # 記憶體上限（MB）
+TT_POLICY = "depth"  # 取代策略："depth"（保留搜尋較深的結果）或 "lru"（丟掉最久沒用的）
+TT_DECISION_MB = 1  # analyze_and_select_move 記住「盤面 -> 決策」的上限（MB）
+ZOBRIST_SEED = 0  # Zobrist 亂數表的種子
+
+# 🔍 ADJUST: 相鄰的定義（8 = 上下左右 + 斜角，4 = 只有上下左右）
+# 連通組和拖曳路徑都依照這個設定（board.Grid）
+CONNECTIVITY = 8
+
 # 📝 STUDY: 8方向相鄰定義（上、下、左、右、左上、右上、左下、右下）
 DIRECTIONS = [
     (-1, 0),  # 上
@@ -102,6 +171,25 @@ DIRECTIONS = [
 ]
 
 
+# ==================== 模擬器設定 ====================
+
+# 📝 STUDY: simulator.py 在記憶體中模擬消除、落下、補球，用來離線測試策略
+SIM_SEED = 0  # 預設亂數種子（同樣的種子 + 同樣的移動 = 同樣的結果）
+SIM_MAX_MOVES = 200  # play() 一局最多幾步
+SIM_DRAW_POOL = 4096  # 補球時一次預先產生幾個隨機 byte（查表轉成顏色）
+
+# 🔍 ADJUST: 補球的顏色分布 {顏色名稱: 權重}，None = BALL_COLORS 平均分布
+# 例如 {"RED": 2, "BLUE": 1, "GREEN": 1, "PURPLE": 1, "ORANGE": 1}
+SIM_COLOR_WEIGHTS = None
+
+# 🔍 ADJUST: self_play.py 多核心自我對戰
+SELF_PLAY_GAMES = 1000  # 預設局數
+SELF_PLAY_WORKERS = None  # process 數量，None = CPU 核心數
+SELF_PLAY_CHUNKSIZE = 8  # 每次交給 worker 幾局（局數很多時調大可減少 process 間通訊）
+SELF_PLAY_POLICY = "game_logic:analyze_and_select_move"  # "模組:函數"，簽名同 analyze_and_select_move
+SELF_PLAY_OUTPUT = "assets/self_play.jsonl"  # 每局一行 JSON
+
+
 # ==================== 操作控制設定 ====================
 
 # 🔍 ADJUST: 滑鼠移動速度（秒）
@@ -110,20 +198,111 @@ MOUSE_MOVE_DURATION = 0.1
 # 🔍 ADJUST: 滑鼠拖曳速度（秒）
 MOUSE_DRAG_DURATION = 0.3
 
+# 🔍 ADJUST: 輸入後端（perform_drag_full_path 使用）
+# - "xtest": X11 XTest 擴充（需要 python-xlib），直接送事件，沒有額外等待
+# - "pyautogui": 所有平台都能用；無法使用 xtest 時會自動退回這個
+# - "canvas": 透過 Selenium 在頁面裡派送 pointer / mouse 事件，不移動真的滑鼠（可用於 HEADLESS_MODE）
+INPUT_BACKEND = "xtest"
+
+# 🔍 ADJUST: canvas 輸入後端
+# - "script": 整段拖曳一次 execute_async_script 送出（只有一次來回，事件 isTrusted = false）
+# - "cdp": Chrome DevTools Input.dispatchMouseEvent（和真的滑鼠相同，可進到跨網域 iframe，每個事件一次來回）
+CANVAS_INPUT_MODE = "script"
+CANVAS_SELECTOR = None  # 接收事件 / 讀回像素的元素（例如 "canvas"），None = 起點位置最上層的元素（讀回像素時為第一個 canvas）
+CANVAS_EVENT_TYPES = ("pointer", "mouse")  # script 模式派送哪些事件
+CANVAS_VIEWPORT_OFFSET = None  # 內容區域左上角的滑鼠座標 (x, y)，None = 依視窗位置自動計算
+
+# 🔍 ADJUST: 拖曳驗證：放開後只截路徑經過的區域，確認路徑上的格子有沒有變化
+# 完全沒有變化（missed）就馬上用比較慢的軌跡重試，不用等三回合盤面不變才發現
+VERIFY_DRAGS = True
+VERIFY_TIMEOUT = 0.4  # 最多等幾秒讓格子開始變化（同 SETTLE_START_TIMEOUT）
+VERIFY_POLL_INTERVAL = 0.02  # 每隔幾秒截一次
+VERIFY_COLOR_THRESHOLD = 40  # 格子平均顏色（任一 RGB 通道）變化超過多少算有變化
+VERIFY_SAMPLE_STEP = 4  # 取樣間隔（像素）
+DRAG_RETRIES = 1  # missed 時最多重試幾次
+DRAG_RETRY_SLOWDOWN = 2.0  # 每次重試放慢幾倍（事件間隔、每格插點數、按下 / 放開前的停留）
+
+# 🔍 ADJUST: 每個輸入後端的拖曳時間設定（秒 / 每秒事件數）
+# 每一格停留 substeps / event_rate 秒，不要短於一個畫面（約 0.017 秒），不然遊戲可能漏掉格子
+INPUT_PROFILES = {
+    "pyautogui": {
+        "settle": 0.05,
+        "press_hold": 0.05,
+        "event_rate": 20,  # 每格 0.05 秒（原本 moveTo 0.1 秒 + sleep 0.05 秒 + PAUSE 0.1 秒）
+        "substeps": 1,
+        "release_hold": 0.05,
+    },
+    "xtest": {
+        "settle": 0.02,
+        "press_hold": 0.02,
+        "event_rate": 120,  # 每格 3 個事件 = 0.025 秒
+        "substeps": 3,
+        "release_hold": 0.02,
+    },
+    "canvas": {
+        "settle": 0.0,
+        "press_hold": 0.02,
+        "event_rate": 120,
+        "substeps": 3,
+        "release_hold": 0.02,
+    },
+}
+
 # 🔍 ADJUST: 等待時間設定（秒）
 WAIT_PAGE_LOAD = 3  # 等待頁面載入
 WAIT_GAME_START = 2  # 等待遊戲開始
 WAIT_AFTER_MOVE = 2  # 每次移動後等待
 WAIT_ANIMATION = 1  # 等待消除動畫
 
+# 🔍 ADJUST: 管線模式（pipeline.py）：截圖辨識、規劃、拖曳分成三個階段同時進行
+# 拖曳前先預測下一個盤面並開始規劃，實際盤面和預測不同時才重新規劃
+PIPELINED_LOOP = False
+PIPELINE_QUEUE_SIZE = 2  # 階段之間的佇列上限
+
+# 🔍 ADJUST: 動畫結束偵測（取代固定的 WAIT_ANIMATION / WAIT_AFTER_MOVE）
+# 移動後高頻率截取盤面，畫面連續一段時間不變就繼續下一步
+USE_SETTLE_DETECTOR = True
+SETTLE_POLL_INTERVAL = 0.03  # 每隔幾秒截一次
+SETTLE_STABLE_WINDOW = 0.15  # 畫面連續幾秒不變才算動畫結束
+SETTLE_TIMEOUT = 3.0  # 最多等幾秒（原本固定等 WAIT_ANIMATION + WAIT_AFTER_MOVE）
+SETTLE_START_TIMEOUT = 0.4  # 幾秒內畫面都沒開始變化，就當作沒有動畫
+SETTLE_FINGERPRINT_STEP = 8  # 偵測用的取樣間隔（越大越快、越粗略）
+
 
 # ==================== 遊戲結束偵測 ====================
 
+# 🔍 ADJUST: 盤面彈窗偵測（藍色區域比例）
+POPUP_SAMPLE_STRIDE = 10  # 每隔幾個像素取樣一次
+POPUP_BLUE_LOWER = (30, 90, 150)  # 藍色範圍下限 (R, G, B)，不含邊界
+POPUP_BLUE_UPPER = (90, 150, 210)  # 藍色範圍上限 (R, G, B)，不含邊界
+POPUP_BLUE_RATIO = 0.4  # 藍色像素比例超過這個值就視為有彈窗
+
 # 🔍 ADJUST: 廣告彈窗偵測（如果有參考圖片）
 AD_POPUP_IMAGE = "assets/add_popup.png"  # 可以設定為廣告按鈕的截圖路徑
 CLOSE_BUTTON_IMAGE = "assets/close_button.png"  # 「關閉按鈕」圖片
 POPUP_TEXT_IMAGE = "assets/popup_text.png"  # 「不能再移動」文字圖片
 
+# 📝 STUDY: 模板匹配（vision_module.TemplateMatcher 啟動時載入一次）
+# 格式：模板名稱 -> 圖片路徑
+TEMPLATE_IMAGES = {
+    "reference_icon": REFERENCE_ICON_PATH,
+    "popup_text": POPUP_TEXT_IMAGE,
+    "close_button": CLOSE_BUTTON_IMAGE,
+}
+
+# 🔍 ADJUST: 各模板的匹配信心度
+TEMPLATE_CONFIDENCE = {
+    "reference_icon": MATCH_CONFIDENCE,
+    "popup_text": 0.9,
+    "close_button": 0.7,
+}
+
+TEMPLATE_PYRAMID_LEVELS = 3  # 金字塔層數（每層縮小一半，先粗找再精修）
+TEMPLATE_PYRAMID_CANDIDATES = 3  # 粗搜尋保留前幾名，每個都回到原尺寸精修
+TEMPLATE_PYRAMID_FALLBACK_SCORE = 0.7  # 精修最高分低於此值就改用原尺寸全圖搜尋（取各模板信心度的最低值）
+POPUP_SEARCH_MARGIN = 200  # 彈窗搜尋範圍：盤面往外擴展的像素數
+TEMPLATE_RESULT_MAX_AGE = 1.0  # 幾秒內的比對結果可以直接沿用（偵測後馬上關閉彈窗）
+
 # 🔍 ADJUST: 關閉按鈕相對於文字的位置偏移
 # 這個值需要根據實際彈窗調整
 CLOSE_BUTTON_OFFSET_X = 160  # 關閉按鈕在文字右側約 120 像素
@@ -149,6 +328,12 @@ DEBUG_COLOR_DETECTION = f"{DEBUG_OUTPUT_DIR}/02_color_detection.png"
 DEBUG_CURRENT_MOVE = f"{DEBUG_OUTPUT_DIR}/03_current_move.png"
 DEBUG_BOARD_STATE = f"{DEBUG_OUTPUT_DIR}/04_board_state.txt"
 
+# 🔍 ADJUST: 背景輸出除錯圖片（debug_sink.py），不拖慢遊戲主迴圈
+DEBUG_ASYNC_OUTPUT = True  # False: 跟以前一樣在主迴圈中直接存檔
+DEBUG_QUEUE_SIZE = 4  # 等待輸出的除錯圖片最多幾張
+DEBUG_QUEUE_POLICY = "drop_oldest"  # 佇列滿時: "drop_oldest" 丟最舊的 / "drop_newest" 丟新的
+DEBUG_SAMPLE_EVERY = 1  # 每種除錯圖片每 N 次才輸出一次（1 表示每次都輸出）
+
 
 # ==================== 學習資源連結 ====================
 
@@ -7,12 +7,537 @@ Collect Em All! 自動遊戲程式 - 操作控制模組
 - 滑鼠控制: https://pyautogui.readthedocs.io/en/latest/mouse.html
 """
 
-import pyautogui
 import time
-from PIL import ImageDraw
+from collections import namedtuple
+import numpy as np
+from PIL import Image, ImageDraw
 import config
 import vision_module
 
+try:
+    from Xlib import X, display as xdisplay  # 選用：XTest 輸入後端
+    from Xlib.ext import xtest
+except ImportError:
+    xdisplay = None
+
+
+def _load_pyautogui():
+    """
+    需要時才匯入 pyautogui
+
+    Linux 上匯入 pyautogui 就會連線 $DISPLAY，沒有桌面的主機（例如只用 canvas 輸入後端）
+    不能在模組載入時就匯入
+
+    Raises:
+        RuntimeError: 沒有安裝 pyautogui，或沒有可用的桌面
+    """
+    try:
+        import pyautogui
+    except Exception as e:
+        raise RuntimeError(
+            f"無法使用 pyautogui（需要安裝套件，並且有可用的桌面 $DISPLAY）: {e}"
+        ) from e
+    return pyautogui
+
+
+# ==================== 輸入後端（InputBackend） ====================
+
+# 拖曳的時間設定（每個後端一組，見 config.INPUT_PROFILES）
+# - settle: 移到起點後，按下前等待
+# - press_hold: 按下後，開始移動前等待
+# - event_rate: 每秒送出幾個移動事件
+# - substeps: 相鄰兩格之間拆成幾個移動事件（1 = 只送格子中心）
+# - release_hold: 到達終點後，放開前等待
+TimingProfile = namedtuple(
+    "TimingProfile", ["settle", "press_hold", "event_rate", "substeps", "release_hold"]
+)
+
+
+def get_timing_profile(name):
+    """
+    取得後端的時間設定
+
+    Args:
+        name: 後端名稱（config.INPUT_PROFILES 的 key）
+
+    Returns:
+        TimingProfile
+    """
+    if name not in config.INPUT_PROFILES:
+        raise ValueError(f"沒有 {name} 的時間設定（可用: {list(config.INPUT_PROFILES)}）")
+    return TimingProfile(**config.INPUT_PROFILES[name])
+
+
+def _sleep_until(target):
+    """睡到 time.perf_counter() 到達 target（已經超過就不睡）"""
+    remaining = target - time.perf_counter()
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def interpolate_points(points, substeps):
+    """
+    在相鄰的點之間插入中間點
+
+    Args:
+        points: [(x, y), ...]
+        substeps: 每一段拆成幾步（1 = 不插點）
+
+    Returns:
+        list: [(x, y), ...]，第一個點不變，之後每段 substeps 個點（最後一個是原本的點）
+    """
+    if substeps <= 1 or len(points) < 2:
+        return list(points)
+
+    result = [points[0]]
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        for step in range(1, substeps + 1):
+            t = step / substeps
+            result.append((round(x0 + (x1 - x0) * t), round(y0 + (y1 - y0) * t)))
+    return result
+
+
+class InputBackend:
+    """
+    滑鼠輸入後端的基底類別
+
+    座標和 grid_to_screen() 的回傳值相同（滑鼠座標）
+
+    子類別需要實作:
+    - move(x, y): 移動滑鼠（立即送出，不等待）
+    - press(): 按下左鍵
+    - release(): 放開左鍵
+    """
+
+    name = "base"
+    moves_os_cursor = True  # 是否移動作業系統的滑鼠游標（canvas 後端只在頁面裡派送事件）
+
+    def __init__(self, profile=None):
+        """
+        Args:
+            profile: TimingProfile（None 時使用 config.INPUT_PROFILES[name]）
+        """
+        self.profile = profile or get_timing_profile(self.name)
+
+    def move(self, x, y):
+        raise NotImplementedError
+
+    def press(self):
+        raise NotImplementedError
+
+    def release(self):
+        raise NotImplementedError
+
+    def click(self, x, y):
+        """移到 (x, y) 並點一下"""
+        self.move(x, y)
+        self.press()
+        self.release()
+
+    def drag(self, points, press=True, profile=None):
+        """
+        按住左鍵依序經過 points，再放開
+
+        學習重點:
+        - 每個移動事件的送出時間事先排好（第 i 個在 start + i / event_rate），
+          睡過頭時下一個事件自動補回來，不會越拖越慢
+        - 遊戲每一畫面只看最後的滑鼠位置，所以每一格至少要停留約一個畫面
+          （substeps / event_rate 不要小於 1/60 秒）
+
+        Args:
+            points: [(x, y), ...] 滑鼠座標
+            press: False 時只移動不按鍵（效能測試用）
+            profile: 這一次使用的 TimingProfile（None 時使用 self.profile，重試時放慢用）
+
+        Returns:
+            float: 從開始拖曳（移到起點）到放開的秒數
+        """
+        profile = profile or self.profile
+        start = time.perf_counter()
+
+        self.move(*points[0])
+        _sleep_until(start + profile.settle)
+        if press:
+            self.press()
+
+        moved = time.perf_counter() + profile.press_hold
+        interval = 1.0 / profile.event_rate
+        for index, (x, y) in enumerate(interpolate_points(points, profile.substeps)[1:]):
+            _sleep_until(moved + index * interval)
+            self.move(x, y)
+
+        _sleep_until(time.perf_counter() + profile.release_hold)
+        if press:
+            self.release()
+        return time.perf_counter() - start
+
+    def close(self):
+        """釋放資源"""
+
+
+class PyAutoGUIInputBackend(InputBackend):
+    """
+    PyAutoGUI（所有平台都能用的備用後端）
+
+    學習重點:
+    - pyautogui 每個呼叫之後都會再睡 pyautogui.PAUSE（預設 0.1 秒）
+    - 這裡傳 _pause=False 關掉，等待時間全部由 TimingProfile 控制
+    """
+
+    name = "pyautogui"
+
+    def __init__(self, profile=None):
+        self._pyautogui = _load_pyautogui()
+        super().__init__(profile)
+
+    def move(self, x, y):
+        self._pyautogui.moveTo(x, y, _pause=False)
+
+    def press(self):
+        self._pyautogui.mouseDown(_pause=False)
+
+    def release(self):
+        self._pyautogui.mouseUp(_pause=False)
+
+
+class XTestInputBackend(InputBackend):
+    """
+    X11 XTest 擴充（python-xlib）：直接把事件送進 X server
+
+    學習重點:
+    - 每個事件只是一個 X 請求，flush 之後就送出，不經過 pyautogui 的包裝和等待
+    - 只能在 X11（或 XWayland）上使用
+    """
+
+    name = "xtest"
+
+    def __init__(self, profile=None):
+        if xdisplay is None:
+            raise RuntimeError("需要安裝 python-xlib 套件: pip install python-xlib")
+
+        self._display = xdisplay.Display()
+        if not self._display.has_extension("XTEST"):
+            self._display.close()
+            raise RuntimeError("X server 不支援 XTEST 擴充")
+        super().__init__(profile)
+
+    def move(self, x, y):
+        xtest.fake_input(self._display, X.MotionNotify, x=int(x), y=int(y))
+        self._display.flush()
+
+    def press(self):
+        xtest.fake_input(self._display, X.ButtonPress, 1)
+        self._display.flush()
+
+    def release(self):
+        xtest.fake_input(self._display, X.ButtonRelease, 1)
+        self._display.flush()
+
+    def close(self):
+        self._display.close()
+
+
+# 📝 STUDY: 在頁面裡派送 pointer / mouse 事件的腳本（execute_async_script）
+# - 整段拖曳（按下、每個移動、放開）一次送進瀏覽器，由頁面自己的 setTimeout 排時間
+# - 目標元素：CANVAS_SELECTOR 找到的元素，或起點位置最上層的元素
+#   起點落在同源的 iframe 裡時，會進到 iframe 裡找，座標也換成 iframe 內的座標
+_DISPATCH_SCRIPT = """
+const [selector, points, types, timing] = arguments;
+const done = arguments[arguments.length - 1];
+const [startX, startY] = points[0];
+let doc = document;
+let dx = 0;
+let dy = 0;
+let target = selector ? document.querySelector(selector) : null;
+while (!target) {
+  const element = doc.elementFromPoint(startX - dx, startY - dy);
+  if (!element) {
+    done({error: "起點沒有元素: " + startX + ", " + startY});
+    return;
+  }
+  if (element.tagName !== "IFRAME") {
+    target = element;
+    break;
+  }
+  let inner = null;
+  try {
+    inner = element.contentDocument;
+  } catch (e) {}
+  if (!inner) {
+    done({error: "目標在跨網域的 iframe 裡，請改用 CANVAS_INPUT_MODE = 'cdp'"});
+    return;
+  }
+  const rect = element.getBoundingClientRect();
+  dx += rect.left + element.clientLeft;
+  dy += rect.top + element.clientTop;
+  doc = inner;
+}
+
+const view = doc.defaultView || window;
+function fire(kind, x, y, buttons) {
+  const init = {
+    bubbles: true, cancelable: true, composed: true, view: view,
+    clientX: x - dx, clientY: y - dy, screenX: x, screenY: y,
+    button: 0, buttons: buttons,
+    pointerId: 1, pointerType: "mouse", isPrimary: true,
+  };
+  if (types.includes("pointer")) {
+    target.dispatchEvent(new view.PointerEvent("pointer" + kind, init));
+  }
+  if (types.includes("mouse")) {
+    target.dispatchEvent(new view.MouseEvent("mouse" + kind, init));
+  }
+}
+
+// [時間 ms, 事件, x, y, buttons]
+const steps = [[0, "move", startX, startY, 0], [timing.settle, "down", startX, startY, 1]];
+let at = timing.settle + timing.press_hold;
+let last = at;
+for (let i = 1; i < points.length; i++) {
+  steps.push([at, "move", points[i][0], points[i][1], 1]);
+  last = at;
+  at += timing.interval;
+}
+const [endX, endY] = points[points.length - 1];
+steps.push([last + timing.release_hold, "up", endX, endY, 0]);
+
+const start = performance.now();
+let index = 0;
+function run() {
+  // 時間到的事件全部送出，再排下一個（依絕對時間，不會越拖越慢）
+  while (index < steps.length && performance.now() - start >= steps[index][0]) {
+    const [, kind, x, y, buttons] = steps[index++];
+    fire(kind, x, y, buttons);
+  }
+  if (index < steps.length) {
+    setTimeout(run, Math.max(0, steps[index][0] - (performance.now() - start)));
+  } else {
+    done({elapsed: (performance.now() - start) / 1000, target: target.tagName});
+  }
+}
+run();
+"""
+
+
+class CanvasPointerBackend(InputBackend):
+    """
+    透過 Selenium 直接在頁面裡派送事件（不移動真的滑鼠）
+
+    學習重點:
+    - 不需要桌面，HEADLESS_MODE 也能用；同一個螢幕可以同時跑好幾個 bot
+    - 傳進來的座標和其他後端一樣是滑鼠座標，扣掉「瀏覽器內容區域在螢幕上的位置」
+      就是頁面的 clientX / clientY（canvas 的事件處理再扣掉 canvas 的位置）
+    - CANVAS_INPUT_MODE:
+      "script": 整段拖曳一次 execute_async_script 送出（一次來回），事件 isTrusted = false
+      "cdp": Chrome DevTools Input.dispatchMouseEvent，事件和真的滑鼠相同
+             （isTrusted = true、可以進到跨網域 iframe），但每個事件一次來回
+
+    用法:
+        attach_driver(driver)   # main 啟動瀏覽器之後呼叫
+        backend = create_input_backend("canvas")
+    """
+
+    name = "canvas"
+    moves_os_cursor = False
+
+    def __init__(self, profile=None, driver=None, mode=None):
+        """
+        Args:
+            profile: TimingProfile（None 時使用 config.INPUT_PROFILES["canvas"]）
+            driver: Selenium WebDriver（None 時使用 attach_driver() 設定的 driver）
+            mode: "script" 或 "cdp"（預設 config.CANVAS_INPUT_MODE）
+        """
+        self.driver = driver or _driver
+        if self.driver is None:
+            raise RuntimeError("沒有瀏覽器可以用，請先呼叫 controller.attach_driver(driver)")
+
+        self.mode = mode or config.CANVAS_INPUT_MODE
+        if self.mode not in ("script", "cdp"):
+            raise ValueError(f"未知的 CANVAS_INPUT_MODE: {self.mode}（可用: ['script', 'cdp']）")
+        if self.mode == "cdp" and not hasattr(self.driver, "execute_cdp_cmd"):
+            raise RuntimeError("目前的瀏覽器不支援 Chrome DevTools Protocol")
+
+        super().__init__(profile)
+        self.viewport_offset = config.CANVAS_VIEWPORT_OFFSET or self.measure_viewport_offset()
+        self._position = (0, 0)
+        self._buttons = 0
+
+    def measure_viewport_offset(self):
+        """
+        量出瀏覽器內容區域左上角的滑鼠座標
+
+        學習重點:
+        - 視窗位置 + 邊框 + 上方的分頁列和網址列
+        - 無頭模式沒有視窗外框，結果是 (0, 0)
+        - 截圖來自瀏覽器本身（browser 截圖後端）時，座標本來就是頁面座標，也是 (0, 0)
+        """
+        if vision_module.get_frame_source().name == "browser":
+            return 0, 0
+
+        screen_x, screen_y, extra_width, extra_height = self.driver.execute_script(
+            "return [window.screenX, window.screenY,"
+            " window.outerWidth - window.innerWidth, window.outerHeight - window.innerHeight];"
+        )
+        border = extra_width / 2
+        return screen_x + border, screen_y + extra_height - border
+
+    def to_client(self, x, y):
+        """滑鼠座標 -> 頁面的 clientX / clientY"""
+        offset_x, offset_y = self.viewport_offset
+        return x - offset_x, y - offset_y
+
+    def drag(self, points, press=True, profile=None):
+        return self.drag_client([self.to_client(x, y) for x, y in points], press, profile)
+
+    def drag_client(self, client, press=True, profile=None):
+        """
+        用頁面座標（clientX / clientY）拖曳
+
+        Args:
+            client: [(x, y), ...] 頁面座標
+            press: False 時只移動不按鍵（效能測試用）
+            profile: 這一次使用的 TimingProfile（None 時使用 self.profile）
+
+        Returns:
+            float: 從開始拖曳到放開的秒數（script 模式是頁面裡量到的時間）
+        """
+        if self.mode == "cdp":
+            # 沿用基底類別的時間安排，每個事件送一個 Input.dispatchMouseEvent
+            return super().drag(client, press, profile)
+
+        profile = profile or self.profile
+        timing = {
+            "settle": profile.settle * 1000,
+            "press_hold": profile.press_hold * 1000,
+            "interval": 1000 / profile.event_rate,
+            "release_hold": profile.release_hold * 1000,
+        }
+        types = list(config.CANVAS_EVENT_TYPES) if press else []
+        result = self.driver.execute_async_script(
+            _DISPATCH_SCRIPT,
+            config.CANVAS_SELECTOR,
+            interpolate_points(client, profile.substeps),
+            types,
+            timing,
+        )
+        if result.get("error"):
+            raise RuntimeError(result["error"])
+        return result["elapsed"]
+
+    # 以下只在 CDP 模式（基底類別的 drag / click）使用，座標已經是 client 座標
+
+    def _mouse_event(self, kind):
+        x, y = self._position
+        params = {"type": kind, "x": x, "y": y, "button": "left", "buttons": self._buttons}
+        if kind != "mouseMoved":
+            params["clickCount"] = 1
+        self.driver.execute_cdp_cmd("Input.dispatchMouseEvent", params)
+
+    def move(self, x, y):
+        self._position = (x, y)
+        self._mouse_event("mouseMoved")
+
+    def press(self):
+        self._buttons = 1
+        self._mouse_event("mousePressed")
+
+    def release(self):
+        self._buttons = 0
+        self._mouse_event("mouseReleased")
+
+    def click(self, x, y):
+        x, y = self.to_client(x, y)
+        if self.mode == "cdp":
+            super().click(x, y)
+        else:
+            self.drag_client([(x, y)])
+
+
+_driver = None
+
+
+def attach_driver(driver):
+    """
+    設定 canvas 輸入後端使用的 Selenium driver（main 啟動瀏覽器後呼叫）
+
+    Args:
+        driver: Selenium WebDriver 實例
+    """
+    global _driver
+
+    _driver = driver
+
+
+# 可用的輸入後端（名稱 -> 類別）
+INPUT_BACKENDS = {
+    PyAutoGUIInputBackend.name: PyAutoGUIInputBackend,
+    XTestInputBackend.name: XTestInputBackend,
+    CanvasPointerBackend.name: CanvasPointerBackend,
+}
+
+_input_backend = None
+
+
+def create_input_backend(name):
+    """
+    依名稱建立輸入後端
+
+    Args:
+        name: INPUT_BACKENDS 中的名稱（如 "xtest", "pyautogui", "canvas"）
+
+    Returns:
+        InputBackend: 輸入後端實例
+
+    Raises:
+        ValueError: 未知的名稱
+        RuntimeError: 這個後端在目前的環境不能用（例如沒有安裝套件、沒有桌面）
+    """
+    if name not in INPUT_BACKENDS:
+        raise ValueError(f"未知的輸入後端: {name}（可用: {list(INPUT_BACKENDS)}）")
+    return INPUT_BACKENDS[name]()
+
+
+def get_input_backend():
+    """
+    取得目前使用的輸入後端（第一次呼叫時依 config.INPUT_BACKEND 建立）
+
+    Returns:
+        InputBackend: 輸入後端實例
+    """
+    global _input_backend
+
+    if _input_backend is None:
+        try:
+            _input_backend = create_input_backend(config.INPUT_BACKEND)
+        except Exception as e:
+            print(f"[警告] 無法使用輸入後端 {config.INPUT_BACKEND}: {e}")
+            print("[警告] 改用 pyautogui 輸入")
+            try:
+                _input_backend = PyAutoGUIInputBackend()
+            except RuntimeError as fallback:
+                raise RuntimeError(
+                    f"沒有可用的輸入後端: {config.INPUT_BACKEND}（{e}）、pyautogui（{fallback}）"
+                ) from fallback
+
+        if config.DEBUG_MODE:
+            print(f"[操作] 輸入後端: {_input_backend.name}")
+
+    return _input_backend
+
+
+def set_input_backend(backend):
+    """
+    替換目前使用的輸入後端
+
+    Args:
+        backend: InputBackend 實例
+    """
+    global _input_backend
+
+    if _input_backend is not None and _input_backend is not backend:
+        _input_backend.close()
+    _input_backend = backend
+
 
 # ✅ COMPLETE: 計算格子中心的螢幕座標
 def grid_to_screen(row, col, board_x, board_y):
@@ -40,9 +565,10 @@ def grid_to_screen(row, col, board_x, board_y):
     screen_x_actual = board_x + relative_x
     screen_y_actual = board_y + relative_y
 
-    # 使用 config 中的縮放係數
-    screen_x_logical = screen_x_actual / config.DISPLAY_SCALE_FACTOR
-    screen_y_logical = screen_y_actual / config.DISPLAY_SCALE_FACTOR
+    # 截圖像素 -> 滑鼠座標（螢幕截圖是 DISPLAY_SCALE_FACTOR，browser 截圖後端是 CSS 像素的倍數）
+    scale = vision_module.get_frame_source().display_scale
+    screen_x_logical = screen_x_actual / scale
+    screen_y_logical = screen_y_actual / scale
 
     return int(screen_x_logical), int(screen_y_logical)
 
@@ -70,6 +596,8 @@ def perform_drag(path, board_x, board_y):
     print(f"[操作] 執行拖曳: {len(path)} 個點")
 
     try:
+        pyautogui = _load_pyautogui()
+
         # 📝 STUDY: 拖曳第一顆球到最後一顆
         # 方法 1: 簡單拖曳（從起點到終點）
         start_row, start_col = path[0]
@@ -102,8 +630,9 @@ def perform_drag(path, board_x, board_y):
 
         print(f"[操作] 拖曳完成: ({start_row},{start_col}) -> ({end_row},{end_col})")
 
-        # 等待消除動畫
-        time.sleep(config.WAIT_ANIMATION)
+        # 等待消除動畫（使用動畫結束偵測時由呼叫端等待）
+        if not config.USE_SETTLE_DETECTOR:
+            time.sleep(config.WAIT_ANIMATION)
 
         return True
 
@@ -112,8 +641,184 @@ def perform_drag(path, board_x, board_y):
         return False
 
 
+# ==================== 拖曳驗證 ====================
+
+# 拖曳結果
+REGISTERED = "registered"  # 路徑上的格子全部有變化（遊戲收到整段拖曳）
+PARTIAL = "partial"  # 只有部分格子變化（遊戲只收到前面一段）
+MISSED = "missed"  # 沒有任何變化（遊戲沒有收到拖曳）
+
+# status: 上面三種之一；changed / total: 有變化的格子數 / 路徑格子數；elapsed: 驗證花的秒數
+DragOutcome = namedtuple("DragOutcome", ["status", "changed", "total", "elapsed"])
+
+
+def _path_cell_means(frame, path, origin_row=0, origin_col=0, step=None):
+    """
+    路徑上每一格取樣區域的平均顏色
+
+    Args:
+        frame: (H, W, 3) 陣列，左上角是格子 (origin_row, origin_col) 的左上角
+        path: [(row, col), ...]
+        step: 取樣間隔（預設 config.VERIFY_SAMPLE_STEP）
+
+    Returns:
+        np.ndarray: (len(path), 3)
+    """
+    if step is None:
+        step = config.VERIFY_SAMPLE_STEP
+    cell = config.CELL_SIZE
+    center = cell // 2
+    start = max(0, center - config.COLOR_SAMPLE_RADIUS)
+    stop = min(cell, center + config.COLOR_SAMPLE_RADIUS)
+
+    means = np.empty((len(path), 3))
+    for i, (row, col) in enumerate(path):
+        top = (row - origin_row) * cell
+        left = (col - origin_col) * cell
+        patch = frame[top + start : top + stop : step, left + start : left + stop : step]
+        means[i] = patch.reshape(-1, 3).mean(axis=0)
+    return means
+
+
+def capture_path_cells(path, board_x, board_y):
+    """
+    只截取路徑經過的區域（路徑的外框），回傳每一格的平均顏色
+
+    學習重點:
+    - 短路徑的外框通常只有幾格大，比截整個盤面快很多
+    """
+    rows = [row for row, _ in path]
+    cols = [col for _, col in path]
+    top, left = min(rows), min(cols)
+    cell = config.CELL_SIZE
+
+    region = (
+        board_x + left * cell,
+        board_y + top * cell,
+        (max(cols) - left + 1) * cell,
+        (max(rows) - top + 1) * cell,
+    )
+    frame = vision_module.get_frame_source().grab(region)
+    return _path_cell_means(frame, path, top, left)
+
+
+def verify_drag(path, board_x, board_y, before, timeout=None):
+    """
+    放開滑鼠後確認拖曳有沒有被遊戲收到
+
+    學習重點:
+    - 只比較路徑上的格子：和拖曳前的顏色差超過 VERIFY_COLOR_THRESHOLD 就算有變化
+    - 消除後上方的球會掉下來，剛好同色時那一格看起來沒變，
+      所以在時限內持續截圖，只要曾經變化過就算
+    - 全部變化 = registered；部分 = partial；時限內完全沒變化 = missed
+
+    Args:
+        path: 拖曳路徑
+        board_x, board_y: 盤面位置
+        before: 拖曳前的盤面截圖（capture_board_array 的結果）
+        timeout: 最多等幾秒（預設 config.VERIFY_TIMEOUT）
+
+    Returns:
+        DragOutcome
+    """
+    if timeout is None:
+        timeout = config.VERIFY_TIMEOUT
+
+    start = time.perf_counter()
+    reference = _path_cell_means(before, path)
+    changed = np.zeros(len(path), dtype=bool)
+    threshold = config.VERIFY_COLOR_THRESHOLD
+
+    while True:
+        current = capture_path_cells(path, board_x, board_y)
+        changed |= np.abs(current - reference).max(axis=1) > threshold
+        if changed.all() or time.perf_counter() - start >= timeout:
+            break
+        time.sleep(config.VERIFY_POLL_INTERVAL)
+
+    count = int(changed.sum())
+    if count == len(path):
+        status = REGISTERED
+    elif count:
+        status = PARTIAL
+    else:
+        status = MISSED
+    return DragOutcome(status, count, len(path), time.perf_counter() - start)
+
+
+def slower_profile(profile, factor=None):
+    """
+    重試用的時間設定：事件變慢、每格插更多點、按下和放開前停久一點
+
+    Args:
+        profile: 原本的 TimingProfile
+        factor: 放慢幾倍（預設 config.DRAG_RETRY_SLOWDOWN）
+    """
+    if factor is None:
+        factor = config.DRAG_RETRY_SLOWDOWN
+    return profile._replace(
+        settle=max(profile.settle * factor, 0.03),
+        press_hold=max(profile.press_hold * factor, 0.03),
+        event_rate=profile.event_rate / factor,
+        substeps=max(1, int(round(profile.substeps * factor))),
+        release_hold=max(profile.release_hold * factor, 0.03),
+    )
+
+
+class DragStats:
+    """依路徑長度統計拖曳結果（registered / partial / missed，以及重試後成功的次數）"""
+
+    def __init__(self):
+        self.by_length = {}
+
+    def record(self, length, outcome, retries):
+        """
+        Args:
+            length: 路徑長度
+            outcome: 最後一次的 DragOutcome
+            retries: 重試了幾次
+        """
+        entry = self.by_length.setdefault(
+            length, {REGISTERED: 0, PARTIAL: 0, MISSED: 0, "retried": 0, "recovered": 0}
+        )
+        entry[outcome.status] += 1
+        if retries:
+            entry["retried"] += 1
+            if outcome.status != MISSED:
+                entry["recovered"] += 1
+
+    def success_rate(self, length):
+        entry = self.by_length.get(length)
+        if not entry:
+            return 0.0
+        total = entry[REGISTERED] + entry[PARTIAL] + entry[MISSED]
+        return entry[REGISTERED] / total
+
+    def report(self):
+        """印出每種路徑長度的成功率"""
+        if not self.by_length:
+            return
+        print("[操作] 拖曳結果（依路徑長度）:")
+        for length in sorted(self.by_length):
+            entry = self.by_length[length]
+            total = entry[REGISTERED] + entry[PARTIAL] + entry[MISSED]
+            print(
+                f"[操作]   {length:>2} 格: 成功 {self.success_rate(length):.0%}（{total} 次；"
+                f"部分 {entry[PARTIAL]}，失敗 {entry[MISSED]}，"
+                f"重試 {entry['retried']} 次救回 {entry['recovered']} 次）"
+            )
+
+
+_drag_stats = DragStats()
+
+
+def get_drag_stats():
+    """取得拖曳結果統計"""
+    return _drag_stats
+
+
 # 📝 STUDY: 執行完整拖曳路徑（備用方案）
-def perform_drag_full_path(path, board_x, board_y):
+def perform_drag_full_path(path, board_x, board_y, before=None, verifier=None):
     """
     執行完整的拖曳路徑，經過每一個點
     （如果簡單拖曳不work，可以試試這個）
@@ -122,6 +827,14 @@ def perform_drag_full_path(path, board_x, board_y):
         path: 拖曳路徑（格子座標列表）
         board_x: 盤面左上角 x 座標
         board_y: 盤面左上角 y 座標
+        before: 拖曳前的盤面截圖；有提供且 VERIFY_DRAGS 時，放開後確認拖曳結果，
+                完全沒反應（missed）就放慢重試，最多 DRAG_RETRIES 次
+                （要傳自己的一份，不能是截圖後端的緩衝區，不然中間任何一次截圖都會覆寫它）
+        verifier: 驗證函數，參數和 verify_drag 相同（預設 verify_drag；
+                  管線模式用來把截圖交給截圖執行緒）
+
+    Returns:
+        bool: 拖曳有送出（而且驗證時遊戲有收到）
     """
     if not path or len(path) < config.MIN_GROUP_SIZE:
         return False
@@ -129,29 +842,41 @@ def perform_drag_full_path(path, board_x, board_y):
     print(f"[操作] 執行完整路徑拖曳: {len(path)} 個點")
 
     try:
-        # 移動到起點
-        start_row, start_col = path[0]
-        start_x, start_y = grid_to_screen(start_row, start_col, board_x, board_y)
-        pyautogui.moveTo(start_x, start_y, duration=config.MOUSE_MOVE_DURATION)
-        time.sleep(0.1)
-
-        # 按下滑鼠
-        pyautogui.mouseDown()
-        time.sleep(0.1)
-
-        # 依序經過每個點
-        for row, col in path[1:]:
-            x, y = grid_to_screen(row, col, board_x, board_y)
-            pyautogui.moveTo(x, y, duration=0.1)
-            time.sleep(0.05)
-
-        # 釋放滑鼠
-        pyautogui.mouseUp()
-
-        print("[操作] 完整路徑拖曳完成")
-        time.sleep(config.WAIT_ANIMATION)
-
-        return True
+        # 📝 STUDY: 按下 -> 依序經過每個點 -> 放開，整段交給輸入後端
+        # 等待時間由後端的 TimingProfile 決定（config.INPUT_PROFILES）
+        backend = get_input_backend()
+        points = [grid_to_screen(row, col, board_x, board_y) for row, col in path]
+        elapsed = backend.drag(points)
+
+        print(f"[操作] 完整路徑拖曳完成（{backend.name}，{elapsed * 1000:.0f} ms）")
+
+        success = True
+        if before is not None and config.VERIFY_DRAGS:
+            verifier = verifier or verify_drag
+            outcome = verifier(path, board_x, board_y, before)
+
+            # 完全沒反應：馬上用比較慢的軌跡重試（盤面沒變，原本的路徑仍然有效）
+            profile = backend.profile
+            retries = 0
+            while outcome.status == MISSED and retries < config.DRAG_RETRIES:
+                retries += 1
+                profile = slower_profile(profile)
+                print(f"[操作] 拖曳沒有反應，放慢重試（第 {retries} 次）")
+                backend.drag(points, profile=profile)
+                outcome = verifier(path, board_x, board_y, before)
+
+            get_drag_stats().record(len(path), outcome, retries)
+            print(
+                f"[操作] 拖曳驗證: {outcome.status}"
+                f"（{outcome.changed}/{outcome.total} 格變化，{outcome.elapsed * 1000:.0f} ms）"
+            )
+            success = outcome.status != MISSED
+
+        # 等待消除動畫（使用動畫結束偵測時由呼叫端等待）
+        if not config.USE_SETTLE_DETECTOR:
+            time.sleep(config.WAIT_ANIMATION)
+
+        return success
 
     except Exception as e:
         print(f"[錯誤] 完整路徑拖曳失敗: {e}")
@@ -159,7 +884,7 @@ def perform_drag_full_path(path, board_x, board_y):
 
 
 # 📝 STUDY: 嘗試關閉廣告彈窗
-def close_ad_popup():
+def close_ad_popup(board_x=None, board_y=None):
     """
     偵測並關閉遊戲結束彈窗
 
@@ -168,32 +893,44 @@ def close_ad_popup():
     2. 根據文字位置計算關閉按鈕位置
     3. 點擊關閉按鈕
 
+    Args:
+        board_x: 盤面 x 座標（有提供時只截盤面周圍的區域）
+        board_y: 盤面 y 座標
+
     Returns:
         bool: 是否成功關閉
     """
     print("[操作] 偵測並關閉彈窗...")
 
-    import os
+    matcher = vision_module.get_template_matcher()
 
     # 檢查圖片是否存在
-    if not os.path.exists(config.POPUP_TEXT_IMAGE):
+    if not matcher.has_template("popup_text"):
         print(f"[錯誤] 找不到彈窗文字圖片: {config.POPUP_TEXT_IMAGE}")
         print("[提示] 請截取「不能再移動」文字並儲存為 assets/popup_text.png")
         return False
 
     try:
-        # 偵測縮放係數（處理 HiDPI 顯示器）
-        screenshot = pyautogui.screenshot()
-        screen_size = pyautogui.size()
-        scale_factor = screenshot.size[0] / screen_size[0]
+        # 截圖像素 -> 滑鼠座標的縮放係數（處理 HiDPI 顯示器，與 grid_to_screen 相同）
+        scale_factor = vision_module.get_frame_source().display_scale
 
         print(f"[操作] 尋找彈窗文字... (縮放係數: {scale_factor})")
 
-        # 方法 1: 尋找「不能再移動」文字
-        popup_location = pyautogui.locateOnScreen(
-            config.POPUP_TEXT_IMAGE, confidence=0.7
+        # 📝 STUDY: 一次截圖同時找「不能再移動」文字和關閉按鈕
+        # 剛偵測過彈窗的話，直接沿用那次的比對結果
+        region = None
+        if board_x is not None and board_y is not None:
+            region = vision_module.board_search_region(board_x, board_y)
+
+        matches = matcher.capture_and_match(
+            {"popup_text": region, "close_button": region},
+            confidences={"popup_text": 0.7},
+            max_age=config.TEMPLATE_RESULT_MAX_AGE,
         )
 
+        # 方法 1: 根據「不能再移動」文字的位置
+        popup_location = matches["popup_text"]
+
         if popup_location:
             print(f"[操作] ✅ 找到彈窗！文字位置: {popup_location}")
 
@@ -206,23 +943,21 @@ def close_ad_popup():
             close_y_actual = text_center_y + config.CLOSE_BUTTON_OFFSET_Y
 
             # 轉換為邏輯座標（處理 HiDPI）
-            if scale_factor != 1.0:
-                close_x = close_x_actual / scale_factor
-                close_y = close_y_actual / scale_factor
-            else:
-                close_x = close_x_actual
-                close_y = close_y_actual
+            close_x = close_x_actual / scale_factor
+            close_y = close_y_actual / scale_factor
 
             print(f"[操作] 計算關閉按鈕位置: ({close_x:.0f}, {close_y:.0f})")
 
             # 先移動滑鼠讓你確認位置（除錯模式）
-            if config.DEBUG_MODE:
+            # canvas 後端的座標是頁面座標，不是螢幕上的游標位置，所以不移動
+            backend = get_input_backend()
+            if config.DEBUG_MODE and backend.moves_os_cursor:
                 print("[除錯] 移動滑鼠到關閉按鈕位置（2秒後點擊）")
-                pyautogui.moveTo(close_x, close_y, duration=0.5)
+                backend.move(close_x, close_y)
                 time.sleep(2)
 
             # 點擊關閉按鈕
-            pyautogui.click(close_x, close_y)
+            backend.click(close_x, close_y)
             time.sleep(1)
 
             print("[操作] ✅ 已點擊關閉按鈕")
@@ -231,27 +966,21 @@ def close_ad_popup():
         else:
             print("[操作] ❌ 未找到彈窗文字")
 
-            # 方法 2: 備用 - 直接尋找關閉按鈕圖片
-            if os.path.exists(config.CLOSE_BUTTON_IMAGE):
-                print("[操作] 嘗試直接尋找關閉按鈕...")
+            # 方法 2: 備用 - 同一次截圖中的關閉按鈕
+            close_location = matches["close_button"]
 
-                close_location = pyautogui.locateOnScreen(
-                    config.CLOSE_BUTTON_IMAGE, confidence=0.7
-                )
+            if close_location:
+                center_x = close_location.left + close_location.width // 2
+                center_y = close_location.top + close_location.height // 2
 
-                if close_location:
-                    center_x = close_location.left + close_location.width // 2
-                    center_y = close_location.top + close_location.height // 2
+                center_x = center_x / scale_factor
+                center_y = center_y / scale_factor
 
-                    if scale_factor != 1.0:
-                        center_x = center_x / scale_factor
-                        center_y = center_y / scale_factor
-
-                    print(f"[操作] 找到關閉按鈕: ({center_x:.0f}, {center_y:.0f})")
-                    pyautogui.click(center_x, center_y)
-                    time.sleep(1)
-                    print("[操作] ✅ 已關閉彈窗（備用方法）")
-                    return True
+                print(f"[操作] 找到關閉按鈕: ({center_x:.0f}, {center_y:.0f})")
+                get_input_backend().click(center_x, center_y)
+                time.sleep(1)
+                print("[操作] ✅ 已關閉彈窗（備用方法）")
+                return True
 
             return False
 
@@ -271,11 +1000,14 @@ def save_debug_move(board_image, path, board_state):
     儲存標記當前移動的除錯圖片
 
     Args:
-        board_image: 盤面截圖
+        board_image: 盤面截圖（PIL.Image 或 numpy 陣列）
         path: 移動路徑
         board_state: 盤面狀態
     """
-    debug_image = board_image.copy()
+    if isinstance(board_image, np.ndarray):
+        debug_image = Image.fromarray(board_image)
+    else:
+        debug_image = board_image.copy()
     draw = ImageDraw.Draw(debug_image)
 
     # 標記路徑上的點
@@ -346,7 +1078,7 @@ def test_controller():
     # 測試：移動滑鼠到格子 (2, 3)
     print("\n[測試] 測試滑鼠移動到格子 (2, 3)")
     test_x, test_y = grid_to_screen(2, 3, board_x, board_y)
-    pyautogui.moveTo(test_x, test_y, duration=1)
+    _load_pyautogui().moveTo(test_x, test_y, duration=1)
     print(f"[測試] 滑鼠已移動到 ({test_x}, {test_y})")
 
     time.sleep(1)
@@ -360,6 +1092,81 @@ def test_controller():
     print("[測試] 請檢查滑鼠是否正確移動和拖曳")
 
 
+def test_canvas_backend():
+    """
+    測試 canvas 輸入後端（無頭瀏覽器 + 本機測試頁面 pointer_test.html）
+    不需要桌面，也不會移動真的滑鼠
+    """
+    import os
+    import game_launcher
+
+    print("\n" + "=" * 50)
+    print("測試: canvas 輸入後端")
+    print("=" * 50 + "\n")
+
+    headless = config.HEADLESS_MODE
+    config.HEADLESS_MODE = True
+    try:
+        driver = game_launcher.init_driver()
+    finally:
+        config.HEADLESS_MODE = headless
+
+    try:
+        page = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pointer_test.html")
+        driver.get("file://" + page)
+
+        # 測試頁面的盤面：6x6，每格 60px，canvas 不在頁面左上角
+        left, top = driver.execute_script(
+            "const r = document.getElementById('board').getBoundingClientRect();"
+            "return [r.left, r.top];"
+        )
+        path = [(0, 0), (1, 1), (1, 2), (2, 3)]
+        client = [(left + col * 60 + 30, top + row * 60 + 30) for row, col in path]
+
+        for mode in ("script", "cdp"):
+            backend = CanvasPointerBackend(driver=driver, mode=mode)
+            driver.execute_script("window.resetEvents();")
+            elapsed = backend.drag_client(client)
+            events = driver.execute_script("return window.receivedEvents;")
+
+            pointer = [event for event in events if event["type"].startswith("pointer")]
+            moves = [event for event in pointer if event["type"] == "pointermove" and event["buttons"]]
+            expected = (len(path) - 1) * backend.profile.substeps
+
+            # 按下之前會先有一個沒按鍵的 pointermove（把游標移到起點），所以要找第一個 pointerdown
+            downs = [event for event in pointer if event["type"] == "pointerdown"]
+            pressed = [event for event in pointer if event["buttons"]]
+            # cdp 送出的是真的輸入事件，瀏覽器可能把同一個畫格內的移動合併成一個
+            enough = len(moves) == expected if mode == "script" else 0 < len(moves) <= expected
+
+            ok = (
+                len(downs) == 1
+                and pressed[0] is downs[0]
+                and abs(downs[0]["x"] - 30) <= 1
+                and abs(downs[0]["y"] - 30) <= 1
+                and pointer[-1]["type"] == "pointerup"
+                and enough
+                and abs(moves[-1]["x"] - (3 * 60 + 30)) <= 1
+                and abs(moves[-1]["y"] - (2 * 60 + 30)) <= 1
+            )
+            trusted = all(event["trusted"] for event in pointer)
+            print(
+                f"{mode}: {'✅' if ok else '❌'} {len(events)} 個事件，"
+                f"拖曳中移動 {len(moves)}/{expected} 次，{elapsed * 1000:.0f} ms，"
+                f"isTrusted={trusted}"
+            )
+    finally:
+        game_launcher.close_driver(driver)
+
+    print("\n[測試] 測試完成！")
+
+
 if __name__ == "__main__":
     # 當直接執行這個檔案時，運行測試
-    test_controller()
+    # python controller.py canvas: 測試 canvas 輸入後端（不需要桌面）
+    import sys
+
+    if "canvas" in sys.argv[1:]:
+        test_canvas_backend()
+    else:
+        test_controller()
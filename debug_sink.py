@@ -0,0 +1,196 @@
+"""
+Collect Em All! 自動遊戲程式 - 除錯輸出模組
+在背景執行緒繪製並儲存除錯圖片，不拖慢遊戲主迴圈
+
+學習資源:
+- threading 文檔: https://docs.python.org/3/library/threading.html
+- 生產者-消費者模式: https://en.wikipedia.org/wiki/Producer%E2%80%93consumer_problem
+"""
+
+import os
+import threading
+from collections import deque
+import numpy as np
+import config
+
+
+class DebugSink:
+    """
+    背景除錯輸出
+
+    - 主迴圈只把已經截好的畫面和標註資料放進佇列（submit）
+    - 背景執行緒負責繪圖、PNG 編碼和寫檔
+    - 佇列有上限，滿了依 policy 丟掉最舊或最新的工作
+    - 每種除錯圖片可以每 N 次才輸出一次（sample_every）
+
+    學習重點:
+    - 生產者（主迴圈）與消費者（背景執行緒）之間用 Condition 同步
+    - 放進佇列前先複製 numpy 陣列，因為截圖緩衝區下一回合會被覆寫
+    """
+
+    POLICIES = ("drop_oldest", "drop_newest")
+
+    def __init__(self, max_queue=None, policy=None, sample_every=None):
+        self.max_queue = max_queue or config.DEBUG_QUEUE_SIZE
+        self.policy = policy or config.DEBUG_QUEUE_POLICY
+        self.sample_every = sample_every or config.DEBUG_SAMPLE_EVERY
+
+        if self.policy not in self.POLICIES:
+            raise ValueError(f"未知的佇列策略: {self.policy}（可用: {self.POLICIES}）")
+
+        self.stats = {
+            "submitted": 0,
+            "sampled_out": 0,
+            "dropped": 0,
+            "written": 0,
+            "errors": 0,
+        }
+        self._queue = deque()
+        self._counters = {}  # 每種除錯圖片被送出的次數
+        self._busy = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(
+            target=self._run, name="debug-sink", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, kind, render, *args):
+        """
+        送出一個除錯輸出工作
+
+        Args:
+            kind: 除錯圖片種類（用於每 N 次取樣，如 "color_detection"）
+            render: 在背景執行的函數，例如 save_debug_color_detection
+            *args: 傳給 render 的參數；numpy 陣列會先複製一份
+
+        Returns:
+            bool: 是否放進佇列（被取樣略過或被丟棄時為 False）
+        """
+        with self._condition:
+            if self._closed:
+                return False
+
+            self.stats["submitted"] += 1
+            count = self._counters.get(kind, 0)
+            self._counters[kind] = count + 1
+
+            # 📝 STUDY: 每 N 次才輸出一次（略過的工作連陣列都不用複製）
+            if count % self.sample_every != 0:
+                self.stats["sampled_out"] += 1
+                return False
+
+            if len(self._queue) >= self.max_queue:
+                self.stats["dropped"] += 1
+                if self.policy == "drop_newest":
+                    return False
+                self._queue.popleft()
+
+            args = tuple(
+                arg.copy() if isinstance(arg, np.ndarray) else arg for arg in args
+            )
+            self._queue.append((kind, render, args))
+            self._condition.notify()
+            return True
+
+    def _run(self):
+        """背景執行緒：不斷取出工作並執行"""
+        try:
+            os.makedirs(config.DEBUG_OUTPUT_DIR, exist_ok=True)
+        except OSError as e:
+            print(f"[警告] 無法建立除錯資料夾: {e}")
+
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+
+                if not self._queue:
+                    return  # 已關閉且沒有剩下的工作
+
+                kind, render, args = self._queue.popleft()
+                self._busy = True
+
+            try:
+                render(*args)
+                written = True
+            except Exception as e:
+                written = False
+                print(f"[警告] 除錯輸出失敗（{kind}）: {e}")
+
+            with self._condition:
+                self.stats["written" if written else "errors"] += 1
+                self._busy = False
+                self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        等待佇列中的工作全部完成
+
+        Returns:
+            bool: 是否在時限內完成
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._queue and not self._busy, timeout
+            )
+
+    def close(self, timeout=5.0):
+        """完成剩下的工作後停止背景執行緒"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join(timeout)
+
+    def report(self):
+        """印出統計"""
+        stats = self.stats
+        print(
+            f"[除錯] 除錯輸出: 送出 {stats['submitted']}，寫入 {stats['written']}，"
+            f"取樣略過 {stats['sampled_out']}，丟棄 {stats['dropped']}，"
+            f"失敗 {stats['errors']}"
+        )
+
+
+class SyncDebugSink:
+    """直接在呼叫端執行的除錯輸出（DEBUG_ASYNC_OUTPUT = False 時使用）"""
+
+    def submit(self, kind, render, *args):
+        try:
+            render(*args)
+            return True
+        except Exception as e:
+            print(f"[警告] 除錯輸出失敗（{kind}）: {e}")
+            return False
+
+    def flush(self, timeout=None):
+        return True
+
+    def close(self, timeout=None):
+        pass
+
+    def report(self):
+        pass
+
+
+_sink = None
+
+
+def get_debug_sink():
+    """取得共用的除錯輸出（第一次呼叫時建立）"""
+    global _sink
+
+    if _sink is None:
+        _sink = DebugSink() if config.DEBUG_ASYNC_OUTPUT else SyncDebugSink()
+    return _sink
+
+
+def shutdown():
+    """寫完剩下的除錯圖片並停止背景執行緒"""
+    global _sink
+
+    if _sink is not None:
+        _sink.close()
+        if config.DEBUG_MODE:
+            _sink.report()
+        _sink = None
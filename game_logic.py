@@ -8,8 +8,17 @@ Collect Em All! 自動遊戲程式 - 遊戲邏輯模組
 - 圖論連通組: https://en.wikipedia.org/wiki/Connected_component_(graph_theory)
 """
 
-from collections import deque
+import multiprocessing
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import lru_cache
 import config
+from board import EMPTY, UNKNOWN, Board, as_board, directions_for, get_grid, is_adjacent
+import bitboard
+import simulator
+import transposition
 
 
 # ✅ COMPLETE: 檢查座標是否在盤面內
@@ -24,19 +33,20 @@ def is_valid_position(row, col):
     Returns:
         bool: 是否為有效座標
     """
-    return 0 <= row < config.GRID_ROWS and 0 <= col < config.GRID_COLS
+    return get_grid().contains(row, col)
 
 
 # 📝 STUDY: 使用 BFS 尋找連通組
-def find_connected_group(board_state, start_row, start_col, visited):
+def find_connected_group(board_state, start_row, start_col, visited, grid=None):
     """
     使用 BFS (廣度優先搜尋) 找出從指定位置開始的連通同色球組
 
     Args:
-        board_state: 二維陣列，表示盤面狀態
+        board_state: Board（或二維字串陣列），表示盤面狀態
         start_row: 起始行索引
         start_col: 起始列索引
         visited: 二維布林陣列，標記已訪問的位置
+        grid: 盤面拓撲（預設依盤面大小和 config.CONNECTIVITY 取得）
 
     Returns:
         list: 連通組中所有格子的座標列表 [(row, col), ...]
@@ -53,46 +63,47 @@ def find_connected_group(board_state, start_row, start_col, visited):
     - DFS: 深入探索，適合找所有路徑
     - 在這個問題中兩者都可以，BFS 較直觀
     """
-    target_color = board_state[start_row][start_col]
+    # 📝 STUDY: 盤面攤平成 bytes，格子 (row, col) 的代碼是 cells[row * cols + col]
+    board = as_board(board_state)
+    if grid is None:
+        grid = get_grid(board.rows, board.cols)
+    cells = board.data
+    neighbors = grid.neighbors
+    positions = grid.positions
+    target_color = cells[grid.index(start_row, start_col)]
 
     # 如果起始位置不是有效顏色，返回空列表
-    if target_color == "UNKNOWN" or target_color == "EMPTY":
+    if target_color == UNKNOWN or target_color == EMPTY:
         return []
 
     # 如果已經訪問過，返回空列表
     if visited[start_row][start_col]:
         return []
 
-    # 📝 STUDY: BFS 初始化
-    queue = deque([(start_row, start_col)])  # 使用 deque 作為佇列
+    # 📝 STUDY: BFS 初始化（佇列中放攤平的 index）
+    queue = deque([grid.index(start_row, start_col)])  # 使用 deque 作為佇列
     group = []  # 儲存連通組
     visited[start_row][start_col] = True
 
     # 📝 STUDY: BFS 主迴圈
     while queue:
-        row, col = queue.popleft()  # 從佇列前端取出
-        group.append((row, col))
+        index = queue.popleft()  # 從佇列前端取出
+        group.append(positions[index])
 
-        # 📝 STUDY: 檢查 8 個相鄰方向
-        for dx, dy in config.DIRECTIONS:
-            new_row = row + dx
-            new_col = col + dy
-
-            # 檢查新位置是否有效
-            if not is_valid_position(new_row, new_col):
+        # 📝 STUDY: 檢查所有相鄰格子（Grid 事先算好，不用再檢查是否超出盤面）
+        for neighbor in neighbors[index]:
+            # 檢查顏色是否相同
+            if cells[neighbor] != target_color:
                 continue
 
             # 檢查是否已訪問
+            new_row, new_col = positions[neighbor]
             if visited[new_row][new_col]:
                 continue
 
-            # 檢查顏色是否相同
-            if board_state[new_row][new_col] != target_color:
-                continue
-
             # 加入佇列和已訪問集合
             visited[new_row][new_col] = True
-            queue.append((new_row, new_col))
+            queue.append(neighbor)
 
     return group
 
@@ -103,7 +114,7 @@ def find_all_groups(board_state):
     尋找盤面上所有可消除的球組（>=3 顆同色相鄰）
 
     Args:
-        board_state: 二維陣列，表示盤面狀態
+        board_state: Board（或二維字串陣列），表示盤面狀態
 
     Returns:
         list: 所有可消除組合的列表
@@ -113,17 +124,27 @@ def find_all_groups(board_state):
     - 遍歷整個盤面
     - 對每個未訪問的位置執行 BFS
     - 只保留大小 >= MIN_GROUP_SIZE 的組合
+    - config.GROUP_ENGINE = "bitboard" 時改用位元盤面引擎（找到的組合相同）
     """
+    # 只轉換一次，之後每次 BFS 直接使用
+    board_state = as_board(board_state)
+
+    if config.GROUP_ENGINE == "bitboard":
+        return bitboard.find_all_groups(board_state)
+
+    # 盤面大小由盤面本身決定（不限於 config.GRID_ROWS x GRID_COLS）
+    grid = get_grid(board_state.rows, board_state.cols)
+
     # 建立訪問標記陣列
-    visited = [[False] * config.GRID_COLS for _ in range(config.GRID_ROWS)]
+    visited = [[False] * grid.cols for _ in range(grid.rows)]
 
     all_groups = []
 
     # 遍歷整個盤面
-    for row in range(config.GRID_ROWS):
-        for col in range(config.GRID_COLS):
+    for row in range(grid.rows):
+        for col in range(grid.cols):
             # 尋找連通組
-            group = find_connected_group(board_state, row, col, visited)
+            group = find_connected_group(board_state, row, col, visited, grid)
 
             # 只保留大小足夠的組合
             if len(group) >= config.MIN_GROUP_SIZE:
@@ -155,23 +176,25 @@ def select_best_move(all_groups):
 
 
 # ✅ COMPLETE: 計算移動起點
-def find_best_start_point(group):
+def find_best_start_point(group, connectivity=None):
     """
     找出最佳的拖曳起點（邊緣的球）
 
         Args:
             group: 球組座標列表
+            connectivity: 4 或 8（預設 config.CONNECTIVITY）
 
         Returns:
             tuple: 最佳起點座標
     """
     group_set = set(group)
+    directions = directions_for(connectivity)
 
     # 計算每顆球有多少相鄰同組球
     neighbor_counts = {}
     for ball in group:
         count = 0
-        for dr, dc in config.DIRECTIONS:
+        for dr, dc in directions:
             neighbor = (ball[0] + dr, ball[1] + dc)
             if neighbor in group_set:
                 count += 1
@@ -182,14 +205,15 @@ def find_best_start_point(group):
     return best_start
 
 
-# ✅ COMPLETE: 計算移動路徑
-def calculate_drag_path(group):
+# 📝 STUDY: 貪心路徑（精確搜尋的起始答案）
+def greedy_drag_path(group, connectivity=None):
     """
-    從連通組中找出可拖曳的路徑
-    先選最佳起點，再貪心建立路徑
+    從連通組中找出可拖曳的路徑（貪心版本）
+    先選最佳起點，再貪心建立路徑；走到死路就停下來，可能只涵蓋部分的球
 
     Args:
         group: 球組座標列表 [(row, col), ...]
+        connectivity: 4 或 8（預設 config.CONNECTIVITY）
 
     Returns:
         list: 可拖曳的路徑（排序後的座標列表）
@@ -201,7 +225,8 @@ def calculate_drag_path(group):
         return group
 
     # 找最佳起點
-    start = find_best_start_point(group)
+    directions = directions_for(connectivity)
+    start = find_best_start_point(group, connectivity)
 
     remaining = set(group)
     current = start
@@ -212,7 +237,7 @@ def calculate_drag_path(group):
     while remaining:
         # 找相鄰的球
         neighbors = []
-        for dr, dc in config.DIRECTIONS:
+        for dr, dc in directions:
             neighbor = (current[0] + dr, current[1] + dc)
             if neighbor in remaining:
                 neighbors.append(neighbor)
@@ -239,13 +264,705 @@ def calculate_drag_path(group):
     return path
 
 
+# ✅ COMPLETE: 計算移動路徑
+def calculate_drag_path(group):
+    """
+    從連通組中找出最長的可拖曳路徑（精確搜尋）
+
+    Args:
+        group: 球組座標列表 [(row, col), ...]
+
+    Returns:
+        list: 可拖曳的路徑（排序後的座標列表）
+
+    學習重點:
+    - 把組合平移到左上角 (0, 0) 當作「形狀」，相同形狀只需要搜尋一次
+    - 形狀的答案存在 lru_cache，之後查表再平移回原位置
+    - 統計數字可以用 drag_path_cache_info() 查看
+    """
+    if not group:
+        return []
+
+    if len(group) == 1:
+        return list(group)
+
+    min_row = min(row for row, _ in group)
+    min_col = min(col for _, col in group)
+    shape = tuple(sorted((row - min_row, col - min_col) for row, col in group))
+
+    path = _solve_shape(shape, config.CONNECTIVITY)
+    return [(row + min_row, col + min_col) for row, col in path]
+
+
+@lru_cache(maxsize=config.DRAG_PATH_CACHE_SIZE)
+def _solve_shape(shape, connectivity):
+    """
+    找出形狀中最長的簡單路徑（每顆球最多經過一次、每一步都相鄰）
+
+    學習重點 - 回溯搜尋（Hamiltonian path）:
+    - 格子編號 0..n-1，走過的格子用一個整數的位元記錄（bitmask）
+    - 先用貪心路徑當作目前最好的答案，已經涵蓋全部就不用搜尋
+    - 下一步優先走「剩下鄰居最少」的格子（Warnsdorff 規則），通常很快就走完全部
+    - 剪枝：目前長度 + 還走得到的格子數 <= 目前最好的長度，就不用再往下走
+    - 起點優先選鄰居少的邊緣格子
+    - 找到涵蓋全部的路徑，或搜尋超過 DRAG_PATH_MAX_NODES 個節點就停止
+
+    Args:
+        shape: 排序過的座標 tuple（左上角平移到 (0, 0)）
+        connectivity: 4 或 8
+
+    Returns:
+        tuple: 路徑座標
+    """
+    best = greedy_drag_path(list(shape), connectivity)
+    count = len(shape)
+    if len(best) == count:
+        return tuple(best)
+
+    index_of = {cell: index for index, cell in enumerate(shape)}
+    neighbors = []
+    for row, col in shape:
+        neighbors.append(
+            [
+                index_of[(row + dr, col + dc)]
+                for dr, dc in directions_for(connectivity)
+                if (row + dr, col + dc) in index_of
+            ]
+        )
+
+    neighbor_masks = [sum(1 << n for n in near) for near in neighbors]
+
+    def reachable(current, visited):
+        """從 current 出發、只經過沒走過的格子，最多還能到幾格"""
+        seen = 0
+        frontier = neighbor_masks[current] & ~visited
+        while frontier:
+            seen |= frontier
+            grown = 0
+            while frontier:
+                low = frontier & -frontier
+                grown |= neighbor_masks[low.bit_length() - 1]
+                frontier ^= low
+            frontier = grown & ~visited & ~seen
+        return seen.bit_count()
+
+    best_path = [index_of[cell] for cell in best]
+    path = []
+    budget = [config.DRAG_PATH_MAX_NODES]
+
+    def extend(current, visited):
+        nonlocal best_path
+
+        budget[0] -= 1
+        if len(path) > len(best_path):
+            best_path = path[:]
+            if len(best_path) == count:
+                return True
+        if budget[0] <= 0:
+            return True
+
+        # 剪枝：就算把走得到的格子全部走完，也不會比目前最好的長
+        if len(path) + reachable(current, visited) <= len(best_path):
+            return False
+
+        # Warnsdorff：剩下鄰居最少的先走
+        options = [n for n in neighbors[current] if not visited >> n & 1]
+        options.sort(
+            key=lambda n: sum(1 for m in neighbors[n] if not visited >> m & 1)
+        )
+        for nxt in options:
+            path.append(nxt)
+            done = extend(nxt, visited | (1 << nxt))
+            path.pop()
+            if done:
+                return True
+        return False
+
+    starts = sorted(range(count), key=lambda index: len(neighbors[index]))
+    for start in starts:
+        path.append(start)
+        done = extend(start, 1 << start)
+        path.pop()
+        if done:
+            break
+
+    return tuple(shape[index] for index in best_path)
+
+
+def drag_path_cache_info():
+    """
+    拖曳路徑快取的統計
+
+    Returns:
+        CacheInfo: hits / misses / maxsize / currsize（functools.lru_cache）
+    """
+    return _solve_shape.cache_info()
+
+
+# ==================== 前瞻搜尋（planner） ====================
+
+# 每一步決策的搜尋統計
+PlannerStats = namedtuple(
+    "PlannerStats", ["planner", "nodes", "depth", "elapsed", "nodes_per_sec", "value"]
+)
+
+
+class _SearchTimeout(Exception):
+    """搜尋時間用完（只在 planner 內部使用）"""
+
+
+def planning_deadline(start=None):
+    """
+    計算這一步的搜尋截止時間
+
+    規劃時間取自本來就要等的消除動畫時間：
+    WAIT_ANIMATION * PLANNER_TIME_FRACTION
+
+    Returns:
+        float: time.perf_counter() 的截止時間
+    """
+    if start is None:
+        start = time.perf_counter()
+    return start + config.WAIT_ANIMATION * config.PLANNER_TIME_FRACTION
+
+
+def list_moves(board_state, all_groups=None):
+    """
+    列出盤面上所有可以執行的移動
+
+    Args:
+        board_state: Board（或二維字串陣列）
+        all_groups: find_all_groups 的結果（已經算過時傳入，避免重算）
+
+    Returns:
+        list: [(group, path), ...]，只保留路徑長度 >= MIN_GROUP_SIZE 的組合
+    """
+    if all_groups is None:
+        all_groups = find_all_groups(board_state)
+
+    moves = []
+    for group in all_groups:
+        path = calculate_drag_path(group)
+        if len(path) >= config.MIN_GROUP_SIZE:
+            moves.append((group, path))
+    return moves
+
+
+class Planner:
+    """
+    移動策略的基底類別
+
+    子類別要實作 select(board, all_groups, deadline) -> group
+    每次決策後把統計存在 last_stats，並累加到整體統計（只記總和，不保留每一筆，
+    自我對戰的 worker 跑上千局也不會越用越多記憶體）
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.last_stats = None
+        self.decision_count = 0
+        self._total_elapsed = 0.0
+        self._max_elapsed = 0.0
+        self._total_nodes = 0
+        self._total_depth = 0
+
+    def select(self, board, all_groups, deadline):
+        raise NotImplementedError
+
+    def reset(self):
+        """
+        開始新的一局（清掉只屬於上一局的狀態，統計數字保留）
+
+        需要事先準備的資源（例如 process pool）也在這裡建立，
+        不要等到第一次決策時才建立，不然第一步一定來不及
+        """
+
+    def close(self):
+        """釋放策略使用的資源（例如 process pool）"""
+
+    def _record(self, start, nodes, depth, value):
+        elapsed = time.perf_counter() - start
+        self.last_stats = PlannerStats(
+            planner=self.name,
+            nodes=nodes,
+            depth=depth,
+            elapsed=elapsed,
+            nodes_per_sec=nodes / elapsed if elapsed > 0 else 0.0,
+            value=value,
+        )
+        self.decision_count += 1
+        self._total_elapsed += elapsed
+        self._max_elapsed = max(self._max_elapsed, elapsed)
+        self._total_nodes += nodes
+        self._total_depth += depth
+        return self.last_stats
+
+    def report(self):
+        """印出所有決策的統計"""
+        if not self.decision_count:
+            return
+
+        count = self.decision_count
+        elapsed = self._total_elapsed
+        print(
+            f"[邏輯] 策略 {self.name}: {count} 次決策，"
+            f"平均 {elapsed / count * 1000:.1f} ms（最長 {self._max_elapsed * 1000:.1f} ms），"
+            f"平均深度 {self._total_depth / count:.1f}，"
+            f"{self._total_nodes / elapsed if elapsed > 0 else 0:.0f} 節點/秒"
+        )
+
+
+class GreedyPlanner(Planner):
+    """貪心策略：選最大的組合（原本的 select_best_move）"""
+
+    name = "greedy"
+
+    def select(self, board, all_groups, deadline):
+        start = time.perf_counter()
+        best_group = select_best_move(all_groups)
+        self._record(start, len(all_groups), 1, len(best_group) if best_group else 0)
+        return best_group
+
+
+class ExpectimaxPlanner(Planner):
+    """
+    期望值搜尋：往前看幾步，對補球抽樣取平均
+
+    學習重點:
+    - 決策節點（我們選移動）取最大值；機會節點（隨機補球）取抽樣的平均
+    - 補球用 simulator 抽 PLANNER_SAMPLES 次，而不是列舉所有可能
+    - 抽樣的種子由「盤面 + 移動」決定，同一個盤面的價值永遠相同，
+      不同順序走到同一個盤面時，用 Zobrist 雜湊 + 置換表就不用重複搜尋
+    - 疊代加深：深度 1、2、3… 逐層搜尋，時間到就用最後一個完整深度的結果
+      （深度 1 就是「消除最多顆」的貪心）
+    - 內層只考慮最長的 PLANNER_BRANCHING 條路徑，控制搜尋量
+    """
+
+    name = "expectimax"
+
+    def __init__(self, samples=None, branching=None, max_depth=None, seed=None, table=None):
+        super().__init__()
+        self.samples = samples or config.PLANNER_SAMPLES
+        self.branching = branching or config.PLANNER_BRANCHING
+        self.max_depth = max_depth or config.PLANNER_MAX_DEPTH
+        self.seed = config.PLANNER_SEED if seed is None else seed
+        self.simulator = simulator.GameSimulator(seed=self.seed)
+
+        # 📝 STUDY: 置換表跨決策保留
+        # 盤面的價值只和盤面本身有關（抽樣的種子也由盤面決定），所以舊的結果仍然正確
+        self.table = table if table is not None else transposition.TranspositionTable()
+        self._hasher = None
+
+        self._deadline = 0.0
+        self._nodes = 0
+
+    def select(self, board, all_groups, deadline):
+        start = time.perf_counter()
+        board = as_board(board)
+        moves = list_moves(board, all_groups)
+
+        if not moves:
+            # 路徑都太短時，退回貪心
+            best_group = select_best_move(all_groups)
+            self._record(start, 0, 0, 0)
+            return best_group
+
+        self._hasher = transposition.get_hasher(board.rows, board.cols)
+        self._deadline = deadline
+        self._nodes = len(moves)
+
+        key = self._hasher.hash_board(board)
+
+        # 深度 1：消除最多顆
+        values = [len(path) for _, path in moves]
+        best = max(range(len(moves)), key=values.__getitem__)
+        depth_reached = 1
+
+        for depth in range(2, self.max_depth + 1):
+            if len(moves) == 1:
+                break
+            try:
+                values = [
+                    len(path) + self._expect(board, key, path, depth - 1) for _, path in moves
+                ]
+            except _SearchTimeout:
+                break
+            best = max(range(len(moves)), key=values.__getitem__)
+            depth_reached = depth
+
+        self._record(start, self._nodes, depth_reached, values[best])
+        return moves[best][0]
+
+    def _expect(self, board, key, path, depth):
+        """機會節點：執行移動後，對補球抽樣取平均"""
+        # 📝 STUDY: 種子只由 (盤面, 移動) 決定，同一個盤面每次都抽到同樣的補球，
+        # 決策可重現，置換表也只要用盤面的雜湊當 key
+        # （先把所有樣本抽完再往下搜尋，遞迴時重設種子不會影響這一層）
+        self.simulator.reseed(hash((key, tuple(path), self.seed)))
+        children = [
+            self.simulator.apply_move(board, path, validate=False)[0]
+            for _ in range(self.samples)
+        ]
+
+        columns = {col for _, col in path}
+        total = 0.0
+        for child in children:
+            child_key = self._hasher.update_columns(key, board, child, columns)
+            total += self._best(child, child_key, depth)
+        return total / self.samples
+
+    def _best(self, board, key, depth):
+        """決策節點：最好的移動的價值（剩下 depth 步）"""
+        entry = self.table.probe(key, depth)
+        if entry is not None:
+            return entry[1]
+
+        self._nodes += 1
+        if time.perf_counter() > self._deadline:
+            raise _SearchTimeout
+
+        paths = _search_paths(board, self.branching)
+        if not paths:
+            value = 0.0
+        elif depth == 1:
+            value = len(paths[0])
+        else:
+            value = max(len(path) + self._expect(board, key, path, depth - 1) for path in paths)
+
+        self.table.store(key, depth, value)
+        return value
+
+    def report(self):
+        super().report()
+        self.table.report()
+
+
+class RolloutPlanner(Planner):
+    """
+    隨機模擬（rollout）評估：每個候選移動各玩 ROLLOUT_COUNT 局短局，取平均分數
+
+    學習重點:
+    - 每個候選移動先執行一次，之後用貪心策略往下玩 ROLLOUT_DEPTH 步，
+      補球用不同的種子，平均起來就是這個移動的期望分數
+    - 所有候選移動使用同一組種子（common random numbers），比較起來比較公平
+    - rollout 交給常駐的 process pool（get_rollout_pool），
+      pool 在遊戲開始時（reset）建立並先暖身，之後每次決策都重用，不用每步重新 fork
+    - 每次決策有自己的編號，逾時後編號就換掉，還在跑的舊 rollout 看到就提早結束，
+      不會佔住 worker 讓下一次決策也逾時
+    - 剩下的時間不夠（少於 ROLLOUT_MIN_TIME）或在截止時間前沒算完，就退回貪心
+    """
+
+    name = "rollout"
+
+    def __init__(self, rollouts=None, depth=None, seed=None):
+        super().__init__()
+        self.rollouts = rollouts or config.ROLLOUT_COUNT
+        self.depth = depth or config.ROLLOUT_DEPTH
+        self.seed = config.PLANNER_SEED if seed is None else seed
+        self.decisions = 0
+        self.fallbacks = 0
+
+    def select(self, board, all_groups, deadline):
+        start = time.perf_counter()
+        board = as_board(board)
+        moves = list_moves(board, all_groups)
+
+        if len(moves) <= 1 or deadline - start < config.ROLLOUT_MIN_TIME:
+            return self._fallback(start, all_groups, len(moves) > 1)
+
+        pool = get_rollout_pool()
+        generation = next_rollout_generation()
+
+        # 每次決策換一組種子（決策仍然可重現），同一次決策的所有候選共用
+        base = self.seed + self.decisions * self.rollouts
+        seeds = list(range(base, base + self.rollouts))
+        self.decisions += 1
+
+        # 候選比 worker 少時，把同一個候選的 rollout 再切開，讓每個 worker 都有事做
+        chunks = min(self.rollouts, max(1, _rollout_workers() // len(moves)))
+        step = -(-self.rollouts // chunks)
+
+        futures = []
+        for index, (_, path) in enumerate(moves):
+            for offset in range(0, self.rollouts, step):
+                future = pool.submit(
+                    _rollout_task,
+                    board.data,
+                    board.rows,
+                    board.cols,
+                    path,
+                    seeds[offset : offset + step],
+                    self.depth,
+                    generation,
+                )
+                futures.append((index, future))
+
+        done, not_done = wait(
+            [future for _, future in futures], timeout=max(0.0, deadline - time.perf_counter())
+        )
+        if not_done:
+            # 📝 STUDY: cancel() 只能取消還沒開始的工作，已經在跑的要靠換掉決策編號讓它停下來
+            next_rollout_generation()
+            for future in not_done:
+                future.cancel()
+            return self._fallback(start, all_groups, True)
+
+        totals = [0] * len(moves)
+        nodes = 0
+        for index, future in futures:
+            score, steps = future.result()
+            totals[index] += score
+            nodes += steps
+
+        values = [
+            len(path) + total / self.rollouts for (_, path), total in zip(moves, totals)
+        ]
+        best = max(range(len(moves)), key=values.__getitem__)
+        self._record(start, nodes, self.depth + 1, values[best])
+        return moves[best][0]
+
+    def _fallback(self, start, all_groups, counted):
+        """退回貪心（counted=True 時計入 fallbacks，只有一個候選不算）"""
+        if counted:
+            self.fallbacks += 1
+        best_group = select_best_move(all_groups)
+        self._record(start, len(all_groups), 1, len(best_group) if best_group else 0)
+        return best_group
+
+    def reset(self):
+        # 種子從頭開始，每一局的結果不受之前玩過幾局影響
+        self.decisions = 0
+        get_rollout_pool()
+
+    def report(self):
+        super().report()
+        if self.decision_count:
+            print(f"[邏輯] rollout: 時間不夠退回貪心 {self.fallbacks} 次")
+
+    def close(self):
+        shutdown_rollout_pool()
+
+
+def _rollout_task(data, rows, cols, path, seeds, depth, generation=None):
+    """
+    在 worker 中執行：先走 path，再用貪心玩 depth 步，每個種子一局
+
+    Args:
+        generation: 這次決策的編號（None 表示一定跑完，暖身時使用）
+
+    Returns:
+        tuple: (所有局的總消除數（不含 path 本身）, 模擬的步數)，
+               決策已經結束（編號換掉了）時返回 None
+    """
+    board = Board.from_bytes(data, rows, cols)
+    sim = _rollout_simulator(rows, cols)
+
+    total = 0
+    steps = 0
+    for seed in seeds:
+        if generation is not None and _rollout_generation.value != generation:
+            return None
+        sim.reseed(seed)
+        current, _ = sim.apply_move(board, path, validate=False)
+        for _ in range(depth):
+            paths = _search_paths(current, 1)
+            if not paths:
+                break
+            current, cleared = sim.apply_move(current, paths[0], validate=False)
+            total += cleared
+            steps += 1
+    return total, steps
+
+
+_rollout_simulators = {}
+
+
+def _rollout_simulator(rows, cols):
+    """worker 中每種盤面大小共用一個模擬器（換種子用 reseed）"""
+    if (rows, cols) not in _rollout_simulators:
+        _rollout_simulators[rows, cols] = simulator.GameSimulator(rows=rows, cols=cols)
+    return _rollout_simulators[rows, cols]
+
+
+def _init_rollout_worker(generation):
+    """
+    worker 啟動時執行一次：記住共用的決策編號，關掉除錯輸出，先跑一次 rollout 建好快取
+
+    Args:
+        generation: 主程式建立的 multiprocessing.Value（目前的決策編號）
+    """
+    global _rollout_generation
+
+    _rollout_generation = generation
+    config.DEBUG_MODE = False
+    sim = simulator.GameSimulator(seed=config.PLANNER_SEED)
+    board = sim.new_board()
+    paths = _search_paths(board, 1)
+    if paths:
+        _rollout_task(board.data, board.rows, board.cols, paths[0], [0], config.ROLLOUT_DEPTH)
+
+
+def _warmup_task():
+    """讓 pool 把每個 worker 都啟動（initializer 會在啟動時執行）"""
+    return True
+
+
+_rollout_pool = None
+_rollout_generation = None  # 目前的決策編號（主程式和所有 worker 共用）
+
+
+def _rollout_workers():
+    return config.ROLLOUT_WORKERS or os.cpu_count() or 1
+
+
+def get_rollout_pool():
+    """
+    取得常駐的 rollout process pool（第一次呼叫時建立並暖身）
+
+    Returns:
+        ProcessPoolExecutor
+    """
+    global _rollout_pool, _rollout_generation
+
+    if _rollout_pool is None:
+        workers = _rollout_workers()
+        start = time.perf_counter()
+        _rollout_generation = multiprocessing.Value("q", 0)
+        _rollout_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_rollout_worker,
+            initargs=(_rollout_generation,),
+        )
+        # 📝 STUDY: 先讓每個 worker 都啟動並跑完初始化，第一次決策才不會等 fork
+        wait([_rollout_pool.submit(_warmup_task) for _ in range(workers)])
+        print(
+            f"[邏輯] rollout pool 已啟動: {workers} 個 process，"
+            f"暖身 {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+    return _rollout_pool
+
+
+def next_rollout_generation():
+    """
+    換下一個決策編號（還在跑的舊 rollout 會提早結束）
+
+    Returns:
+        int: 新的編號
+    """
+    with _rollout_generation.get_lock():
+        _rollout_generation.value += 1
+        return _rollout_generation.value
+
+
+def shutdown_rollout_pool():
+    """關閉 rollout process pool（沒有建立過時不做任何事）"""
+    global _rollout_pool, _rollout_generation
+
+    if _rollout_pool is not None:
+        next_rollout_generation()  # 還在跑的 rollout 提早結束，shutdown 不用等它們
+        _rollout_pool.shutdown(cancel_futures=True)
+        _rollout_pool = None
+        _rollout_generation = None
+
+
+def _search_paths(board, limit):
+    """
+    搜尋用的移動產生器：用 bitboard 找組合，回傳最長的 limit 條路徑
+
+    Returns:
+        list: [path, ...]，依路徑長度由大到小
+    """
+    geometry = bitboard.get_geometry(board.rows, board.cols)
+    paths = []
+    for _, mask in bitboard.group_masks(bitboard.color_masks(board), geometry):
+        path = calculate_drag_path(bitboard.mask_to_cells(mask, board.cols))
+        if len(path) >= config.MIN_GROUP_SIZE:
+            paths.append(path)
+
+    paths.sort(key=len, reverse=True)
+    return paths[:limit]
+
+
+# 可用的策略（名稱 -> 類別）
+PLANNERS = {
+    GreedyPlanner.name: GreedyPlanner,
+    ExpectimaxPlanner.name: ExpectimaxPlanner,
+    RolloutPlanner.name: RolloutPlanner,
+}
+
+_planner = None
+
+
+def create_planner(name):
+    """
+    依名稱建立策略
+
+    Args:
+        name: PLANNERS 中的名稱（如 "greedy", "expectimax", "rollout"）
+
+    Returns:
+        Planner: 策略實例
+    """
+    if name not in PLANNERS:
+        raise ValueError(f"未知的策略: {name}（可用: {list(PLANNERS)}）")
+    return PLANNERS[name]()
+
+
+def get_planner():
+    """
+    取得目前使用的策略（第一次呼叫時依 config.PLANNER 建立）
+
+    Returns:
+        Planner: 策略實例
+    """
+    global _planner
+
+    if _planner is None or _planner.name != config.PLANNER:
+        if _planner is not None:
+            _planner.close()
+        _planner = create_planner(config.PLANNER)
+    return _planner
+
+
+_decision_table = None
+
+
+def get_decision_table():
+    """
+    取得記住「盤面 -> 決策」的置換表（LRU，上限 config.TT_DECISION_MB）
+
+    Returns:
+        TranspositionTable
+    """
+    global _decision_table
+
+    if _decision_table is None:
+        _decision_table = transposition.TranspositionTable(
+            max_mb=config.TT_DECISION_MB, policy="lru"
+        )
+    return _decision_table
+
+
+def reset_game_state():
+    """
+    開始新的一局：清空決策快取，並讓策略清掉上一局的狀態（順便準備好需要的資源）
+
+    自我對戰的 worker 會連續玩很多局，不清掉的話快取會一直留著上一局的盤面，
+    rollout 的種子也會和之前玩過幾局有關（同一個種子的結果就不能重現）
+    """
+    get_decision_table().clear()
+    get_planner().reset()
+
+
 # ✅ COMPLETE: 分析並選擇移動
-def analyze_and_select_move(board_state):
+def analyze_and_select_move(board_state, all_groups=None):
     """
     分析盤面並選擇最佳移動
 
     Args:
-        board_state: 二維陣列，表示盤面狀態
+        board_state: Board（或二維字串陣列），表示盤面狀態
+        all_groups: 已經算好的組合（例如 GroupIndex.groups()）；None 時呼叫 find_all_groups
 
     Returns:
         tuple: (group, path) 若有可消除組合
@@ -253,8 +970,25 @@ def analyze_and_select_move(board_state):
                path: 拖曳路徑
                若無可消除組合則返回 (None, None)
     """
+    # 只轉換一次，策略也會用到
+    board_state = as_board(board_state)
+
+    # 📝 STUDY: 同一個盤面（例如上一次拖曳沒有成功）直接重用之前的決策
+    planner = get_planner()
+    decisions = get_decision_table()
+    # 不同策略的決策分開記（策略名稱也放進 key）
+    hasher = transposition.get_hasher(board_state.rows, board_state.cols)
+    key = hasher.hash_board(board_state) ^ hash(planner.name)
+    entry = decisions.probe(key)
+    if entry is not None:
+        best_group, path = entry[1]
+        if config.DEBUG_MODE:
+            print(f"[邏輯] 盤面和之前相同，重用決策（{len(best_group)} 顆球）")
+        return best_group, path
+
     # 尋找所有可消除組合
-    all_groups = find_all_groups(board_state)
+    if all_groups is None:
+        all_groups = find_all_groups(board_state)
 
     if config.DEBUG_MODE:
         print(f"[邏輯] 找到 {len(all_groups)} 個可消除組合")
@@ -263,19 +997,27 @@ def analyze_and_select_move(board_state):
         print("[邏輯] 沒有可消除的組合")
         return None, None
 
-    # 選擇最佳組合
-    best_group = select_best_move(all_groups)
+    # 選擇最佳組合（依 config.PLANNER 決定策略）
+    best_group = planner.select(board_state, all_groups, planning_deadline())
 
     if config.DEBUG_MODE:
-        color = None
-        if best_group:
-            row, col = best_group[0]
-            # 假設 board_state 在外部可訪問，這裡簡化處理
         print(f"[邏輯] 最佳組合: {len(best_group)} 顆球")
 
+    # 搜尋統計（深度、節點數、決策延遲）；整局的彙總由 planner.report() 印出
+    stats = planner.last_stats
+    if config.DEBUG_MODE:
+        print(
+            f"[邏輯] 策略 {stats.planner}: 深度 {stats.depth}，{stats.nodes} 節點，"
+            f"{stats.elapsed * 1000:.1f} ms（{stats.nodes_per_sec:.0f} 節點/秒）"
+        )
+
     # 計算拖曳路徑
     path = calculate_drag_path(best_group)
 
+    if config.DEBUG_MODE and len(path) < len(best_group):
+        print(f"[邏輯] 這個形狀無法一筆拖完：路徑涵蓋 {len(path)}/{len(best_group)} 顆")
+
+    decisions.store(key, stats.depth, (best_group, path))
     return best_group, path
 
 
@@ -294,8 +1036,7 @@ def print_group_info(group, board_state):
         return
 
     # 取得顏色
-    row, col = group[0]
-    color = board_state[row][col]
+    color = as_board(board_state).color_at(*group[0])
     emoji = config.COLOR_EMOJI.get(color, "❓")
 
     print(f"  {emoji} {color}: {len(group)} 顆球")
@@ -330,6 +1071,18 @@ def test_drag_path():
     print(f"  輸出: {path3}")
     print(f"  檢查: {'✅' if verify_path(path3) else '❌'}\n")
 
+    # 測試案例 4：貪心會走進死路（只走 4 顆），精確搜尋可以走完 5 顆
+    group4 = [(2, 0), (3, 1), (4, 0), (4, 1), (5, 2)]
+    path4 = calculate_drag_path(group4)
+    print(f"案例4 - 貪心會卡住的組合:")
+    print(f"  輸入: {group4}")
+    print(f"  貪心: {greedy_drag_path(group4)}")
+    print(f"  輸出: {path4}")
+    covered = verify_path(path4) and len(path4) == len(group4)
+    print(f"  檢查: {'✅' if covered else '❌'}\n")
+
+    print(f"形狀快取: {drag_path_cache_info()}")
+
 
 def verify_path(path):
     """驗證路徑是否有效（每步都相鄰）"""
@@ -340,12 +1093,8 @@ def verify_path(path):
         current = path[i]
         next_ball = path[i + 1]
 
-        # 檢查是否相鄰
-        dr = abs(current[0] - next_ball[0])
-        dc = abs(current[1] - next_ball[1])
-
-        # 相鄰定義：8方向，距離為1
-        if not ((dr <= 1 and dc <= 1) and (dr + dc > 0)):
+        # 檢查是否相鄰（依 config.CONNECTIVITY）
+        if not is_adjacent(current, next_ball):
             return False
 
     return True
@@ -364,17 +1113,20 @@ def test_game_logic():
     print("=" * 50 + "\n")
 
     # 📝 STUDY: 建立測試盤面
-    test_board = [
-        ["RED", "BLUE", "GREEN", "BLUE", "YELLOW", "RED"],
-        ["BLUE", "BLUE", "GREEN", "GREEN", "GREEN", "YELLOW"],
-        ["RED", "YELLOW", "RED", "GREEN", "BLUE", "BLUE"],
-        ["GREEN", "GREEN", "RED", "RED", "YELLOW", "YELLOW"],
-        ["BLUE", "RED", "YELLOW", "GREEN", "BLUE", "RED"],
-        ["YELLOW", "BLUE", "GREEN", "RED", "YELLOW", "GREEN"],
-    ]
+    # 顏色必須是 config.BALL_COLORS 中的名稱，其他名稱會被當作 UNKNOWN
+    test_board = as_board(
+        [
+            ["RED", "BLUE", "GREEN", "BLUE", "ORANGE", "RED"],
+            ["BLUE", "BLUE", "GREEN", "GREEN", "GREEN", "ORANGE"],
+            ["RED", "ORANGE", "RED", "GREEN", "BLUE", "BLUE"],
+            ["GREEN", "GREEN", "RED", "RED", "ORANGE", "ORANGE"],
+            ["BLUE", "RED", "ORANGE", "GREEN", "BLUE", "RED"],
+            ["ORANGE", "BLUE", "GREEN", "RED", "ORANGE", "GREEN"],
+        ]
+    )
 
     print("測試盤面:")
-    for row in test_board:
+    for row in test_board.to_grid():
         row_display = " ".join([config.COLOR_EMOJI.get(color, "❓") for color in row])
         print(row_display)
     print()
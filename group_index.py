@@ -0,0 +1,208 @@
+"""
+Collect Em All! 自動遊戲程式 - 增量連通組索引
+每次移動後只重建受影響的連通組，其他組合直接沿用
+
+學習資源:
+- Union-Find（併查集）: https://en.wikipedia.org/wiki/Disjoint-set_data_structure
+- 路徑壓縮與按大小合併: https://cp-algorithms.com/data_structures/disjoint_set_union.html
+
+學習重點:
+- 每個格子 index = row * cols + col，parent[index] 指向所屬連通組的代表（root）
+- 移動後只有「顏色改變的格子」會影響連通關係：
+  1. 找出顏色改變的格子
+  2. 包含這些格子的舊連通組整個拆掉（組合可能因此分裂）
+  3. 拆掉的格子重新和同色鄰居合併（也可能併入沒有受影響的組合）
+- 沒有碰到改變格子的連通組完全不動，轉成座標列表的結果也會沿用
+- 結果和 find_all_groups 完整重算相同（組合的集合相同）
+
+用法:
+    index = GroupIndex(board)
+    groups = index.groups()
+    index.update(new_board, columns={2, 3})   # 只比較被消除到的行
+    groups = index.groups()
+"""
+
+import config
+from board import as_board, get_grid, BALL_CODES
+
+
+class GroupIndex:
+    """
+    以 Union-Find 維護盤面上所有同色連通組
+
+    Attributes:
+        board: 目前的 Board
+        rows, cols: 盤面大小
+        rebuilt_cells: 最近一次 update 重新合併的格子數（統計用）
+    """
+
+    def __init__(self, board_state=None):
+        """
+        Args:
+            board_state: 起始盤面（Board 或二維字串陣列）；None 時等第一次 update 再建立
+        """
+        self.board = None
+        self.rows = 0
+        self.cols = 0
+        self.rebuilt_cells = 0
+
+        self._parent = []
+        self._members = {}  # root -> [index, ...]
+        self._cells_cache = {}  # root -> 排序過的座標列表（組合沒變就沿用）
+        self._neighbors = []
+
+        if board_state is not None:
+            self.rebuild(board_state)
+
+    # ==================== Union-Find ====================
+
+    def _find(self, index):
+        """找出 index 所屬連通組的 root（順便做路徑壓縮）"""
+        parent = self._parent
+        root = index
+        while parent[root] != root:
+            root = parent[root]
+        while parent[index] != root:
+            parent[index], index = root, parent[index]
+        return root
+
+    def _union(self, a, b):
+        """合併 a、b 所在的連通組（小的併入大的）"""
+        root_a = self._find(a)
+        root_b = self._find(b)
+        if root_a == root_b:
+            return
+
+        members = self._members
+        if len(members[root_a]) < len(members[root_b]):
+            root_a, root_b = root_b, root_a
+
+        self._parent[root_b] = root_a
+        members[root_a].extend(members.pop(root_b))
+        self._cells_cache.pop(root_a, None)
+        self._cells_cache.pop(root_b, None)
+
+    def _link(self, indices):
+        """把 indices 中每個格子和同色的鄰居合併"""
+        data = self.board.data
+        neighbors = self._neighbors
+        for index in indices:
+            code = data[index]
+            if code not in _BALL_CODE_SET:
+                continue
+            for other in neighbors[index]:
+                if data[other] == code:
+                    self._union(index, other)
+
+    # ==================== 建立 / 更新 ====================
+
+    def rebuild(self, board_state):
+        """完整重建（盤面大小改變或第一次使用時）"""
+        board = as_board(board_state)
+        self.board = board
+        self.rows, self.cols = board.shape
+        self._neighbors = get_grid(self.rows, self.cols).neighbors
+
+        count = self.rows * self.cols
+        self._parent = list(range(count))
+        self._members = {index: [index] for index in range(count)}
+        self._cells_cache = {}
+
+        self._link(range(count))
+        self.rebuilt_cells = count
+
+    def update(self, board_state, columns=None):
+        """
+        套用新的盤面，只重建受影響的連通組
+
+        Args:
+            board_state: 移動後觀察到的新盤面
+            columns: 可能改變的行（例如路徑經過的行）；None 時比較整個盤面
+
+        Returns:
+            int: 顏色改變的格子數
+        """
+        board = as_board(board_state)
+        if self.board is None or board.shape != self.board.shape:
+            self.rebuild(board)
+            return self.rows * self.cols
+
+        old_data = self.board.data
+        new_data = board.data
+        cols = self.cols
+
+        # 1. 找出顏色改變的格子
+        if columns is None:
+            if old_data == new_data:
+                self.rebuilt_cells = 0
+                return 0
+            scan = range(len(new_data))
+        else:
+            scan = [index for col in columns for index in range(col, len(new_data), cols)]
+        changed = [index for index in scan if old_data[index] != new_data[index]]
+
+        self.board = board
+        if not changed:
+            self.rebuilt_cells = 0
+            return 0
+
+        # 2. 拆掉包含改變格子的舊連通組
+        dirty = set()
+        for root in {self._find(index) for index in changed}:
+            dirty.update(self._members.pop(root))
+            self._cells_cache.pop(root, None)
+
+        parent = self._parent
+        members = self._members
+        for index in dirty:
+            parent[index] = index
+            members[index] = [index]
+
+        # 3. 重新和同色鄰居合併（鄰居可能屬於沒有受影響的組合）
+        self._link(dirty)
+        self.rebuilt_cells = len(dirty)
+        return len(changed)
+
+    # ==================== 查詢 ====================
+
+    def groups(self, min_size=None):
+        """
+        目前所有可消除的組合
+
+        Args:
+            min_size: 最小組合大小（預設 config.MIN_GROUP_SIZE）
+
+        Returns:
+            list: [[(row, col), ...], ...]
+                  組合依最小的格子編號排序，組內格子依列優先順序排列
+                  （和 bitboard.find_all_groups 相同）
+        """
+        if self.board is None:
+            return []
+        if min_size is None:
+            min_size = config.MIN_GROUP_SIZE
+
+        data = self.board.data
+        cols = self.cols
+        cache = self._cells_cache
+
+        found = []
+        for root, indices in self._members.items():
+            if len(indices) < min_size or data[root] not in _BALL_CODE_SET:
+                continue
+            cells = cache.get(root)
+            if cells is None:
+                cells = [divmod(index, cols) for index in sorted(indices)]
+                cache[root] = cells
+            found.append(cells)
+
+        found.sort()
+        return found
+
+    def group_of(self, row, col):
+        """(row, col) 所在的連通組（不論大小）"""
+        root = self._find(row * self.cols + col)
+        return [divmod(index, self.cols) for index in sorted(self._members[root])]
+
+
+_BALL_CODE_SET = frozenset(BALL_CODES)
@@ -16,7 +16,9 @@ import game_launcher
 import vision_module
 import game_logic
 import controller
-import pyautogui
+import debug_sink
+import pipeline
+from group_index import GroupIndex
 
 
 def print_header():
@@ -30,44 +32,49 @@ def print_header():
         print(f"📁 除錯輸出: {config.DEBUG_OUTPUT_DIR}\n")
 
 
-def detect_game_over_popup():
+def detect_game_over_popup(board_x=None, board_y=None):
     """
     偵測遊戲結束彈窗
 
+    Args:
+        board_x: 盤面 x 座標（有提供時只截盤面周圍的區域）
+        board_y: 盤面 y 座標
+
     Returns:
         bool: True 表示偵測到彈窗
     """
-    import os
-
     # 🔧 詳細日誌
     if config.DEBUG_MODE:
         print("[除錯] detect_game_over_popup() 執行中...")
 
-    if not os.path.exists(config.POPUP_TEXT_IMAGE):
+    matcher = vision_module.get_template_matcher()
+    if not matcher.has_template("popup_text"):
         if config.DEBUG_MODE:
             print(f"[除錯] 圖片不存在: {config.POPUP_TEXT_IMAGE}")
         return False
 
     try:
-        # 🔧 關鍵：確保使用正確的 pyautogui
-        location = pyautogui.locateOnScreen(config.POPUP_TEXT_IMAGE, confidence=0.9)
+        # 📝 STUDY: 一次截圖同時找彈窗文字和關閉按鈕
+        # 關閉按鈕的結果會保留給 controller.close_ad_popup() 使用，不用再截一次
+        region = None
+        if board_x is not None and board_y is not None:
+            region = vision_module.board_search_region(board_x, board_y)
+
+        matches = matcher.capture_and_match(
+            {"popup_text": region, "close_button": region}
+        )
+        location = matches["popup_text"]
+
+        if location is None:
+            # 正常情況：沒找到
+            if config.DEBUG_MODE:
+                print("[除錯] 未找到彈窗")
+            return False
 
         # 找到了
         print(f"[遊戲] ✅ 偵測到彈窗！位置: {location}")
         return True
 
-    except pyautogui.ImageNotFoundException:
-        # 正常情況：沒找到
-        if config.DEBUG_MODE:
-            print("[除錯] 未找到彈窗（ImageNotFoundException）")
-        return False
-
-    except NameError as e:
-        # pyautogui 沒有正確 import
-        print(f"[錯誤] NameError: {e}")
-        print("[錯誤] 可能原因：main.py 沒有 import pyautogui")
-        return False
-
     except Exception as e:
         print(f"[錯誤] 偵測彈窗時發生錯誤: {type(e).__name__}: {e}")
         import traceback
@@ -93,6 +100,10 @@ def initialize_game():
         print(f"\n❌ 啟動瀏覽器失敗: {e}")
         return None
 
+    # canvas 輸入後端 / browser 截圖後端直接透過這個 driver 派送事件、取得畫面
+    controller.attach_driver(driver)
+    vision_module.attach_driver(driver)
+
     # 2. 開啟遊戲頁面
     if not game_launcher.open_game(driver):
         print("\n❌ 開啟遊戲頁面失敗")
@@ -146,52 +157,110 @@ def play_game(driver, board_x, board_y):
     Returns:
         int: 執行的移動次數
     """
+    # 策略需要的資源（rollout pool）在第一步之前準備好，第一次決策才不會逾時
+    game_logic.reset_game_state()
+
+    # 📝 STUDY: 管線模式：截圖辨識、規劃、拖曳分開執行，動畫播放時就先規劃下一步
+    if config.PIPELINED_LOOP:
+        return pipeline.play_pipelined(board_x, board_y, detect_game_over_popup)
+
     print("【階段 3】開始遊戲\n")
 
     move_count = 0
+    round_count = 0
     previous_board_state = None  # 🔧 記錄上一次的盤面
     same_board_count = 0  # 🔧 相同盤面計數
+    change_detector = vision_module.FrameChangeDetector()  # 🔧 畫面變化偵測
+    cached_decision = None  # 🔧 上次分析的結果 (best_group, path)
+    group_index = GroupIndex() if config.INCREMENTAL_GROUPS else None
+    settle_times = []  # 🔧 每次動畫實際等待的秒數
+    settle_timeouts = 0
 
     while True:
+        round_count += 1
         print(f"\n--- 回合 {move_count + 1} ---")
 
+        # 0. 定期確認盤面位置（只截參考圖示附近的小區域）
+        interval = config.BOARD_VERIFY_INTERVAL
+        if interval and round_count > 1 and round_count % interval == 0:
+            board_pos = vision_module.locate_game_board()
+            if board_pos is None:
+                print("[遊戲] 找不到盤面，視窗可能被移動或關閉")
+                break
+            if board_pos != (board_x, board_y):
+                change_detector.reset()
+            board_x, board_y = board_pos
+
         # 1. 截圖並分析盤面
         try:
-            board_state, has_popup = vision_module.detect_board_state(board_x, board_y)
+            # 截圖後端會重複使用緩衝區，拖曳驗證要用到拖曳前的畫面，先複製一份
+            board_array = vision_module.capture_board_array(board_x, board_y).copy()
 
-            # 🔧 檢查彈窗
-            if has_popup:
-                print("[遊戲] 偵測到彈窗！")
-                break
+            # 📝 STUDY: 畫面和上次分析時相同，就不用再辨識顏色和計算移動
+            frame_unchanged = change_detector.is_unchanged(board_array)
+            frame_unchanged = frame_unchanged and cached_decision is not None
 
-            if board_state is None:
-                print("[遊戲] 無法分析盤面")
-                break
+            if frame_unchanged:
+                change_detector.record_skip()
+                board_state = previous_board_state
+                best_group, path = cached_decision
+
+                same_board_count += 1
+                print(f"[警告] 畫面與上次相同，沿用上次的分析（連續 {same_board_count} 次）")
 
-            # 🔧 檢查盤面是否與上次相同
-            if previous_board_state is not None:
-                if board_state == previous_board_state:
-                    same_board_count += 1
-                    print(f"[警告] 盤面與上次相同（連續 {same_board_count} 次）")
+                if same_board_count >= 3:
+                    print("[遊戲] 盤面持續不變，遊戲可能已結束")
+                    break
 
-                    if same_board_count >= 3:
-                        print("[遊戲] 盤面持續不變，遊戲可能已結束")
-                        break
-                else:
-                    same_board_count = 0  # 重置計數
+            else:
+                analysis_start = time.perf_counter()
+
+                board_state, has_popup = vision_module.analyze_board_array(board_array)
+
+                # 🔧 檢查彈窗
+                if has_popup:
+                    print("[遊戲] 偵測到彈窗！")
+                    break
+
+                if board_state is None:
+                    print("[遊戲] 無法分析盤面")
+                    break
+
+                # 🔧 檢查盤面是否與上次相同
+                if previous_board_state is not None:
+                    if board_state == previous_board_state:
+                        same_board_count += 1
+                        print(f"[警告] 盤面與上次相同（連續 {same_board_count} 次）")
 
-            previous_board_state = [row[:] for row in board_state]  # 深拷貝
+                        if same_board_count >= 3:
+                            print("[遊戲] 盤面持續不變，遊戲可能已結束")
+                            break
+                    else:
+                        same_board_count = 0  # 重置計數
+
+                previous_board_state = board_state  # Board 不可修改，不用深拷貝
 
         except Exception as e:
             print(f"❌ 分析盤面失敗: {e}")
             break
 
         # 2. 尋找可消除組合
-        try:
-            best_group, path = game_logic.analyze_and_select_move(board_state)
-        except Exception as e:
-            print(f"❌ 分析移動失敗: {e}")
-            break
+        if not frame_unchanged:
+            try:
+                # 📝 STUDY: 增量更新連通組，只重建顏色改變的格子所在的組合
+                # （比較整個盤面而不只路徑經過的行，辨識誤差造成的變化也會更新到）
+                all_groups = None
+                if group_index is not None:
+                    group_index.update(board_state)
+                    all_groups = group_index.groups()
+
+                best_group, path = game_logic.analyze_and_select_move(board_state, all_groups)
+            except Exception as e:
+                print(f"❌ 分析移動失敗: {e}")
+                break
+
+            change_detector.record_analysis(time.perf_counter() - analysis_start)
+            cached_decision = (best_group, path)
 
         # 3. 檢查是否有可執行的移動
         if not best_group or not path:
@@ -199,7 +268,7 @@ def play_game(driver, board_x, board_y):
 
             # 可能是遊戲結束了，檢查彈窗
             time.sleep(0.5)
-            if detect_game_over_popup():
+            if detect_game_over_popup(board_x, board_y):
                 print("[遊戲] 確認遊戲結束（偵測到彈窗）")
                 break
             else:
@@ -210,17 +279,31 @@ def play_game(driver, board_x, board_y):
 
         # 4. 除錯：顯示選中的組合
         if config.DEBUG_MODE:
-            color = board_state[best_group[0][0]][best_group[0][1]]
+            color = board_state.color_at(*best_group[0])
             emoji = config.COLOR_EMOJI.get(color, "❓")
             print(f"[遊戲] 選中: {emoji} {color} × {len(best_group)}")
 
+            # 在背景儲存移動路徑圖片
+            debug_sink.get_debug_sink().submit(
+                "current_move", controller.save_debug_move, board_array, path, board_state
+            )
+
         # 5. 執行移動
+        if config.USE_SETTLE_DETECTOR:
+            # 移動前的畫面指紋（之後用來判斷動畫是否開始）
+            settle_reference = vision_module.board_fingerprint(
+                board_array, step=config.SETTLE_FINGERPRINT_STEP
+            )
+
         try:
-            success = controller.perform_drag_full_path(path, board_x, board_y)
+            # 傳入拖曳前的截圖：放開後馬上確認遊戲有沒有收到，沒收到就重試
+            success = controller.perform_drag_full_path(path, board_x, board_y, board_array)
 
             if not success:
                 print("⚠️ 移動執行失敗，嘗試繼續...")
-                time.sleep(config.WAIT_AFTER_MOVE)
+                # 有驗證拖曳時已經確認盤面沒有變化，沒有動畫要等
+                if not config.VERIFY_DRAGS:
+                    time.sleep(config.WAIT_AFTER_MOVE)
                 continue
 
         except Exception as e:
@@ -232,20 +315,49 @@ def play_game(driver, board_x, board_y):
         print(f"✅ 移動 {move_count} 完成")
 
         # 7. 等待動畫和盤面更新
-        time.sleep(config.WAIT_AFTER_MOVE)
-
+        if config.USE_SETTLE_DETECTOR:
+            settle = vision_module.wait_for_board_settle(
+                board_x, board_y, reference=settle_reference
+            )
+            settle_times.append(settle.elapsed)
+            if not settle.settled:
+                settle_timeouts += 1
+
+            status = "穩定" if settle.settled else "逾時"
+            if not settle.changed:
+                status += "，畫面沒有變化"
+            print(f"[遊戲] 動畫等待 {settle.elapsed * 1000:.0f} ms（{status}）")
+        else:
+            time.sleep(config.WAIT_AFTER_MOVE)
+
+    change_detector.report()
+    controller.get_drag_stats().report()
+    game_logic.get_planner().report()
+    game_logic.get_decision_table().report("決策快取")
+    if settle_times:
+        print(
+            f"[遊戲] 動畫等待: 平均 {sum(settle_times) / len(settle_times) * 1000:.0f} ms，"
+            f"最長 {max(settle_times) * 1000:.0f} ms，逾時 {settle_timeouts} 次"
+            f"（固定等待為 {(config.WAIT_ANIMATION + config.WAIT_AFTER_MOVE) * 1000:.0f} ms）"
+        )
     return move_count
 
 
-def cleanup(driver):
+def cleanup(driver, board_x=None, board_y=None):
     """清理資源並結束程式"""
     print("\n【階段 4】結束遊戲\n")
 
     # 🔧 關閉彈窗（應該已經在螢幕上了）
     print("[清理] 關閉彈窗...")
-    controller.close_ad_popup()
+    controller.close_ad_popup(board_x, board_y)
     time.sleep(1)
 
+    # 寫完剩下的除錯圖片
+    debug_sink.shutdown()
+
+    # 關閉策略的背景 process（rollout 策略）
+    game_logic.get_planner().close()
+
     # 等待一下
     print("\n[清理] 3 秒後關閉瀏覽器...")
     time.sleep(3)
@@ -296,8 +408,13 @@ def main():
         traceback.print_exc()
 
     finally:
+        # 🔧 遊戲中可能重新定位過盤面，用定位器記住的最新位置關閉彈窗
+        board_pos = vision_module.get_board_locator().board_position()
+        if board_pos is not None:
+            board_x, board_y = board_pos
+
         # 清理資源
-        cleanup(driver)
+        cleanup(driver, board_x, board_y)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,447 @@
+"""
+Collect Em All! 自動遊戲程式 - 管線化遊戲迴圈
+把「截圖辨識 / 規劃 / 操作」分成三個階段，讓規劃和動畫等待同時進行
+
+學習資源:
+- queue.Queue: https://docs.python.org/3/library/queue.html
+- concurrent.futures.Future: https://docs.python.org/3/library/concurrent.futures.html#future-objects
+
+學習重點:
+- 三個階段:
+  1. 截圖（背景執行緒）：等動畫結束訊號，馬上截圖並辨識顏色
+  2. 規劃（背景執行緒）：analyze_and_select_move
+  3. 操作（主執行緒）：拖曳，並安排下一輪的工作
+- 拖曳之前就用 simulator（不補球）預測下一個盤面，
+  把「預測盤面」交給規劃階段先算（投機規劃），和拖曳、動畫同時進行
+- 實際截到的盤面和預測不符（已知的格子顏色不同、路徑不合法、
+  新補的球組成更大的組合）就取消投機結果，用實際盤面重新規劃
+- 階段之間的佇列有上限，前一個階段太快時會被擋住（不會無限堆積）
+- 結束時印出每個階段的忙碌比例，看得出迴圈實際在等什麼
+
+用法:
+    config.PIPELINED_LOOP = True    # main.play_game 改用 play_pipelined
+"""
+
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+import config
+import controller
+import game_logic
+import vision_module
+from board import EMPTY
+from group_index import GroupIndex
+from simulator import GameSimulator, validate_path
+
+
+# 截圖階段的結果
+Observation = namedtuple("Observation", ["board_state", "board_array", "has_popup", "settle"])
+
+# 投機規劃：預測的盤面、用預測盤面規劃的結果（Future）
+Speculation = namedtuple("Speculation", ["predicted", "future"])
+
+
+# ==================== 階段 ====================
+
+
+class Stage:
+    """
+    一個背景執行緒 + 有上限的工作佇列
+
+    submit() 回傳 Future；佇列滿了時 submit() 會等待（背壓）
+    還沒開始的工作可以用 future.cancel() 取消
+    """
+
+    def __init__(self, name, maxsize=None, initializer=None, finalizer=None):
+        """
+        Args:
+            name: 階段名稱（統計用）
+            maxsize: 佇列上限（預設 config.PIPELINE_QUEUE_SIZE）
+            initializer: 執行緒啟動時先執行的函數
+            finalizer: 執行緒結束前執行的函數（在同一個執行緒裡）
+        """
+        self.name = name
+        self.busy = 0.0
+        self.jobs = 0
+        self.cancelled = 0
+        self.started = time.perf_counter()
+
+        self._queue = queue.Queue(maxsize or config.PIPELINE_QUEUE_SIZE)
+        self._initializer = initializer
+        self._finalizer = finalizer
+        self._thread = threading.Thread(target=self._run, name=f"pipeline-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args):
+        """把工作放進佇列，回傳 Future"""
+        future = Future()
+        self._queue.put((future, func, args))
+        return future
+
+    def _run(self):
+        if self._initializer is not None:
+            self._initializer()
+
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+
+                future, func, args = item
+                if not future.set_running_or_notify_cancel():
+                    self.cancelled += 1
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    result = func(*args)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                finally:
+                    self.busy += time.perf_counter() - start
+                    self.jobs += 1
+        finally:
+            if self._finalizer is not None:
+                self._finalizer()
+
+    def close(self, timeout=5.0):
+        """等目前的工作做完後結束執行緒"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def occupancy(self, elapsed=None):
+        """忙碌時間佔整段時間的比例"""
+        if elapsed is None:
+            elapsed = time.perf_counter() - self.started
+        return self.busy / elapsed if elapsed > 0 else 0.0
+
+
+class StageTimer:
+    """主執行緒（操作階段）的時間統計：忙碌時間和各種等待時間"""
+
+    def __init__(self, name):
+        self.name = name
+        self.busy = 0.0
+        self.jobs = 0
+        self.waits = {}
+        self.started = time.perf_counter()
+
+    def wait(self, future, reason):
+        """等待 future 的結果，並記錄等了多久"""
+        start = time.perf_counter()
+        try:
+            return future.result()
+        finally:
+            self.waits[reason] = self.waits.get(reason, 0.0) + time.perf_counter() - start
+
+    def occupancy(self, elapsed=None):
+        if elapsed is None:
+            elapsed = time.perf_counter() - self.started
+        return self.busy / elapsed if elapsed > 0 else 0.0
+
+
+# ==================== 各階段的工作 ====================
+
+
+def _init_capture_thread(name):
+    """
+    截圖執行緒啟動時建立自己的截圖後端
+
+    Args:
+        name: 截圖後端名稱（和主執行緒目前使用的相同）
+
+    學習重點:
+    - mss 等截圖後端要在建立它的執行緒中使用，管線模式下所有截圖都在這個執行緒
+    - 只換掉這個執行緒的截圖後端，主執行緒（座標換算、關閉彈窗）仍然使用原本共用的那一個
+    """
+    vision_module.set_thread_frame_source(vision_module.create_frame_source(name))
+
+
+def _close_capture_thread():
+    """截圖執行緒結束前關閉自己的截圖後端"""
+    vision_module.set_thread_frame_source(None)
+
+
+def observe(board_x, board_y, reference=None):
+    """
+    截圖階段：等動畫結束，截圖並辨識
+
+    Args:
+        board_x, board_y: 盤面位置
+        reference: 拖曳前的畫面指紋（None 時不等動畫，直接截圖）
+
+    Returns:
+        Observation
+    """
+    settle = None
+    if reference is not None:
+        if config.USE_SETTLE_DETECTOR:
+            settle = vision_module.wait_for_board_settle(board_x, board_y, reference=reference)
+        else:
+            time.sleep(config.WAIT_AFTER_MOVE)
+
+    # 截圖後端的緩衝區會被下一次截圖覆寫，跨執行緒傳遞前先複製
+    board_array = vision_module.capture_board_array(board_x, board_y).copy()
+    board_state, has_popup = vision_module.analyze_board_array(board_array)
+    return Observation(board_state, board_array, has_popup, settle)
+
+
+def predict_board(board_state, path):
+    """
+    預測拖曳後的盤面（消除 + 落下，不補球：新球的位置留 EMPTY）
+
+    Returns:
+        Board
+    """
+    sim = GameSimulator(rows=board_state.rows, cols=board_state.cols, refill=False)
+    predicted, _ = sim.apply_move(board_state, path, validate=False)
+    return predicted
+
+
+def prediction_matches(predicted, observed):
+    """
+    比較預測盤面和實際盤面
+
+    Args:
+        predicted: predict_board() 的結果（新球的位置是 EMPTY）
+        observed: 實際截到的 Board
+
+    Returns:
+        set: 符合時回傳新補的球的格子編號；已知的格子有任何一格顏色不同時回傳 None
+    """
+    if predicted.shape != observed.shape:
+        return None
+
+    refilled = set()
+    for index, (expected, actual) in enumerate(zip(predicted.data, observed.data)):
+        if expected == EMPTY:
+            refilled.add(index)
+        elif expected != actual:
+            return None
+    return refilled
+
+
+def decision_holds(decision, observed, refilled):
+    """
+    檢查用預測盤面規劃的決策能不能直接用在實際盤面
+
+    條件:
+    - 規劃出的路徑在實際盤面上仍然合法
+    - 新補的球沒有組成比規劃的組合更大的組合
+
+    Args:
+        decision: 用預測盤面規劃的 (group, path)
+        observed: 實際截到的 Board
+        refilled: prediction_matches() 回傳的新球格子
+
+    Returns:
+        bool
+    """
+    group, path = decision
+    if not group or not path:
+        return False
+
+    try:
+        validate_path(observed, path)
+    except ValueError:
+        return False
+
+    cols = observed.cols
+    for other in game_logic.find_all_groups(observed):
+        if len(other) > len(group) and any(row * cols + col in refilled for row, col in other):
+            return False
+    return True
+
+
+# ==================== 管線化遊戲迴圈 ====================
+
+
+def play_pipelined(board_x, board_y, game_over_check=None):
+    """
+    管線化的主遊戲迴圈（結果和 main.play_game 相同，但規劃和動畫同時進行）
+
+    Args:
+        board_x, board_y: 盤面位置
+        game_over_check: 函數 (board_x, board_y) -> bool，沒有移動時確認是否遊戲結束
+                         （在截圖執行緒中執行）
+
+    Returns:
+        int: 執行的移動次數
+    """
+    print("【階段 3】開始遊戲（管線模式）\n")
+
+    # 截圖執行緒用和主執行緒同一種截圖後端（主執行緒可能已經退回 pyautogui）
+    source_name = vision_module.get_frame_source().name
+    capture = Stage(
+        "截圖",
+        initializer=lambda: _init_capture_thread(source_name),
+        finalizer=_close_capture_thread,
+    )
+    planner = Stage("規劃")
+    act = StageTimer("操作")
+    group_index = GroupIndex() if config.INCREMENTAL_GROUPS else None
+
+    def plan_observed(board_state):
+        all_groups = None
+        if group_index is not None:
+            group_index.update(board_state)
+            all_groups = group_index.groups()
+        return game_logic.analyze_and_select_move(board_state, all_groups)
+
+    def plan_predicted(board_state):
+        return game_logic.analyze_and_select_move(board_state)
+
+    def verify(*args):
+        return act.wait(capture.submit(controller.verify_drag, *args), "驗證")
+
+    move_count = 0
+    same_board_count = 0
+    previous_board_state = None
+    speculation = None
+    speculation_hits = 0
+    speculation_misses = 0
+    settle_times = []
+
+    pending = capture.submit(observe, board_x, board_y)
+
+    try:
+        while True:
+            print(f"\n--- 回合 {move_count + 1} ---")
+
+            # 1. 等截圖階段的結果
+            observation = act.wait(pending, "截圖")
+            if observation.settle is not None:
+                settle_times.append(observation.settle.elapsed)
+
+            if observation.has_popup:
+                print("[遊戲] 偵測到彈窗！")
+                break
+            board_state = observation.board_state
+            if board_state is None:
+                print("[遊戲] 無法分析盤面")
+                break
+
+            if board_state == previous_board_state:
+                same_board_count += 1
+                print(f"[警告] 盤面與上次相同（連續 {same_board_count} 次）")
+                if same_board_count >= 3:
+                    print("[遊戲] 盤面持續不變，遊戲可能已結束")
+                    break
+            else:
+                same_board_count = 0
+            previous_board_state = board_state
+
+            # 2. 取得決策：投機結果仍然成立就直接用，否則取消並重新規劃
+            decision = None
+            if speculation is not None:
+                refilled = prediction_matches(speculation.predicted, board_state)
+                if refilled is None:
+                    # 預測錯了：還沒開始的投機規劃直接取消，不用等它算完
+                    speculation.future.cancel()
+                else:
+                    predicted_decision = act.wait(speculation.future, "投機規劃")
+                    if decision_holds(predicted_decision, board_state, refilled):
+                        decision = predicted_decision
+
+                if decision is not None:
+                    speculation_hits += 1
+                    print("[管線] 盤面符合預測，使用預先規劃的移動")
+                else:
+                    speculation_misses += 1
+                    print("[管線] 盤面和預測不同，重新規劃")
+                speculation = None
+
+            if decision is None:
+                decision = act.wait(planner.submit(plan_observed, board_state), "規劃")
+            best_group, path = decision
+
+            if not best_group or not path:
+                print("[遊戲] 沒有可消除的組合")
+                if game_over_check is not None:
+                    if act.wait(capture.submit(game_over_check, board_x, board_y), "截圖"):
+                        print("[遊戲] 確認遊戲結束（偵測到彈窗）")
+                        break
+                time.sleep(config.WAIT_AFTER_MOVE)
+                pending = capture.submit(observe, board_x, board_y)
+                continue
+
+            # 3. 拖曳前就開始規劃預測的下一個盤面（和拖曳、動畫同時進行）
+            predicted = predict_board(board_state, path)
+            speculation = Speculation(predicted, planner.submit(plan_predicted, predicted))
+
+            reference = vision_module.board_fingerprint(
+                observation.board_array, step=config.SETTLE_FINGERPRINT_STEP
+            )
+
+            start = time.perf_counter()
+            try:
+                # 拖曳驗證的截圖也交給截圖執行緒
+                success = controller.perform_drag_full_path(
+                    path, board_x, board_y, observation.board_array, verify
+                )
+            finally:
+                act.busy += time.perf_counter() - start
+                act.jobs += 1
+
+            if not success:
+                print("⚠️ 移動執行失敗，嘗試繼續...")
+                speculation.future.cancel()
+                speculation = None
+                if not config.VERIFY_DRAGS:
+                    time.sleep(config.WAIT_AFTER_MOVE)
+                pending = capture.submit(observe, board_x, board_y)
+                continue
+
+            move_count += 1
+            print(f"✅ 移動 {move_count} 完成")
+
+            # 4. 截圖階段等動畫結束後馬上截圖辨識
+            pending = capture.submit(observe, board_x, board_y, reference)
+
+    except Exception as e:
+        print(f"❌ 管線執行失敗: {e}")
+
+    finally:
+        if speculation is not None:
+            speculation.future.cancel()
+        capture.close()
+        planner.close()
+
+    report(capture, planner, act, speculation_hits, speculation_misses)
+    controller.get_drag_stats().report()
+    game_logic.get_planner().report()
+    game_logic.get_decision_table().report("決策快取")
+    if settle_times:
+        print(
+            f"[遊戲] 動畫等待: 平均 {sum(settle_times) / len(settle_times) * 1000:.0f} ms，"
+            f"最長 {max(settle_times) * 1000:.0f} ms"
+        )
+    return move_count
+
+
+def report(capture, planner, act, hits, misses):
+    """印出每個階段的忙碌比例和投機規劃的命中率"""
+    elapsed = time.perf_counter() - act.started
+    if elapsed <= 0:
+        return
+
+    print(f"\n[管線] 總共 {elapsed:.1f} 秒")
+    for stage in (capture, planner):
+        print(
+            f"[管線] {stage.name}: 忙碌 {stage.occupancy(elapsed):.0%}"
+            f"（{stage.jobs} 次，{stage.busy:.2f} 秒，取消 {stage.cancelled} 次）"
+        )
+    waits = "，".join(f"等{reason} {seconds:.2f} 秒" for reason, seconds in act.waits.items())
+    print(
+        f"[管線] {act.name}: 忙碌 {act.occupancy(elapsed):.0%}"
+        f"（{act.jobs} 次拖曳，{act.busy:.2f} 秒）；{waits}"
+    )
+
+    total = hits + misses
+    if total:
+        print(f"[管線] 投機規劃: 命中 {hits}/{total}（{hits / total:.0%}）")
@@ -0,0 +1,322 @@
+"""
+Collect Em All! 自動遊戲程式 - 多核心自我對戰
+不開瀏覽器，用模擬器同時跑上千局，比較不同策略的分數
+
+學習資源:
+- concurrent.futures: https://docs.python.org/3/library/concurrent.futures.html
+- JSON Lines: https://jsonlines.org/
+
+學習重點:
+- 每局有自己的種子（base_seed + 局號），同樣的種子 + 同樣的策略 = 同樣的結果
+- 策略用 "模組:函數" 指定，每個 worker process 啟動時匯入一次
+  （函數簽名和 game_logic.analyze_and_select_move 相同: board -> (group, path)）
+- worker 關掉 DEBUG_MODE 並丟掉 print 輸出，不然上千局的每一步都會印在終端機
+- 每局結束馬上寫一行 JSON 到結果檔（中途中斷也保留已完成的局）
+
+執行方式:
+    python self_play.py                                  # 使用 config 的預設值
+    python self_play.py --games 5000 --workers 8 --seed 100
+    python self_play.py --policy my_strategy:choose_move --output results.jsonl
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import config
+import game_logic
+from simulator import GameSimulator
+
+
+# ==================== 策略載入 ====================
+
+
+def load_policy(spec):
+    """
+    依 "模組:函數" 載入策略
+
+    Args:
+        spec: 例如 "game_logic:analyze_and_select_move"
+
+    Returns:
+        callable: policy(board_state, all_groups=None) -> (group, path)
+
+    Raises:
+        ValueError: 格式錯誤或找不到函數
+    """
+    module_name, _, func_name = spec.partition(":")
+    if not module_name or not func_name:
+        raise ValueError(f"策略格式應為 '模組:函數'，收到 {spec!r}")
+
+    module = importlib.import_module(module_name)
+    policy = getattr(module, func_name, None)
+    if not callable(policy):
+        raise ValueError(f"{module_name} 沒有可呼叫的 {func_name}")
+    return policy
+
+
+# ==================== 單局（在 worker 中執行） ====================
+
+_worker_policy = None
+
+
+def _init_worker(policy_spec, quiet):
+    """
+    worker process 的初始化（每個 process 執行一次）
+
+    Args:
+        policy_spec: "模組:函數"
+        quiet: True 時丟掉策略的 print 輸出
+    """
+    global _worker_policy
+
+    config.DEBUG_MODE = False
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    _worker_policy = load_policy(policy_spec)
+
+
+def play_game(seed, policy=None, max_moves=None):
+    """
+    用模擬器玩一局
+
+    Args:
+        seed: 這一局的種子（決定起始盤面和補球）
+        policy: 策略函數（None 時使用 worker 載入的策略）
+        max_moves: 最多幾步（None 時使用 config.SIM_MAX_MOVES）
+
+    Returns:
+        dict: seed / score（消除球數）/ moves / decisions（呼叫策略的次數）/
+              decision_ms（平均決策時間）/ max_decision_ms / elapsed_s
+    """
+    policy = policy or _worker_policy
+    if max_moves is None:
+        max_moves = config.SIM_MAX_MOVES
+
+    started = time.perf_counter()
+    # worker 會連續玩很多局，每局開始前清掉上一局的決策快取和策略狀態
+    game_logic.reset_game_state()
+    sim = GameSimulator(seed=seed)
+    board = sim.new_board()
+
+    moves = 0
+    score = 0
+    decisions = 0
+    decision_total = 0.0
+    decision_max = 0.0
+
+    while moves < max_moves:
+        decide_start = time.perf_counter()
+        group, path = policy(board)
+        decision = time.perf_counter() - decide_start
+        decisions += 1
+        decision_total += decision
+        decision_max = max(decision_max, decision)
+
+        # 沒有組合，或路徑太短（真實遊戲也不會消除）就結束
+        if not group or not path or len(path) < config.MIN_GROUP_SIZE:
+            break
+
+        board, cleared = sim.apply_move(board, path)
+        moves += 1
+        score += cleared
+
+    return {
+        "seed": seed,
+        "score": score,
+        "moves": moves,
+        "decisions": decisions,
+        "decision_ms": round(decision_total / decisions * 1000, 3),
+        "max_decision_ms": round(decision_max * 1000, 3),
+        "elapsed_s": round(time.perf_counter() - started, 4),
+    }
+
+
+# ==================== 平行執行 ====================
+
+
+def run_self_play(
+    games=None,
+    seed=None,
+    workers=None,
+    policy=None,
+    output=None,
+    max_moves=None,
+    chunksize=None,
+):
+    """
+    平行跑多局自我對戰，結果逐行寫入 JSON Lines 檔案
+
+    Args:
+        games: 局數（預設 config.SELF_PLAY_GAMES）
+        seed: 第一局的種子，第 i 局為 seed + i（預設 config.SIM_SEED）
+        workers: process 數量（預設 config.SELF_PLAY_WORKERS，None = CPU 核心數）
+        policy: "模組:函數"（預設 config.SELF_PLAY_POLICY）
+        output: 結果檔路徑（預設 config.SELF_PLAY_OUTPUT）
+        max_moves: 每局最多幾步（預設 config.SIM_MAX_MOVES）
+        chunksize: 每次交給 worker 幾局（預設 config.SELF_PLAY_CHUNKSIZE）
+
+    Returns:
+        dict: 彙總統計（見 summarize_games）
+    """
+    games = config.SELF_PLAY_GAMES if games is None else games
+    seed = config.SIM_SEED if seed is None else seed
+    workers = workers or config.SELF_PLAY_WORKERS or os.cpu_count() or 1
+    policy = policy or config.SELF_PLAY_POLICY
+    output = output or config.SELF_PLAY_OUTPUT
+    chunksize = chunksize or config.SELF_PLAY_CHUNKSIZE
+
+    # 在主程式先載入一次，格式錯誤時馬上報錯（不用等 worker 啟動）
+    load_policy(policy)
+
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    print(f"[自我對戰] {games} 局，{workers} 個 process，策略 {policy}")
+    print(f"[自我對戰] 結果寫入 {output}")
+
+    seeds = range(seed, seed + games)
+    results = []
+    started = time.perf_counter()
+
+    with open(output, "w", encoding="utf-8") as f, ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(policy, True),
+    ) as executor:
+        moves = [max_moves] * games
+        for done, result in enumerate(
+            executor.map(play_game, seeds, [None] * games, moves, chunksize=chunksize), 1
+        ):
+            f.write(json.dumps(result, separators=(",", ":")) + "\n")
+            results.append(result)
+
+            if done % max(1, games // 10) == 0 or done == games:
+                f.flush()
+                elapsed = time.perf_counter() - started
+                print(f"[自我對戰] {done}/{games} 局（{done / elapsed:.1f} 局/秒）")
+
+    summary = summarize_games(results)
+    summary["elapsed_s"] = time.perf_counter() - started
+    print_summary(summary)
+    return summary
+
+
+def summarize_games(results):
+    """
+    彙總每局結果
+
+    Returns:
+        dict: games / mean_score / min_score / max_score / mean_moves /
+              mean_decision_ms / max_decision_ms
+    """
+    if not results:
+        return {"games": 0}
+
+    scores = [result["score"] for result in results]
+    moves = sum(result["moves"] for result in results)
+    decisions = sum(result["decisions"] for result in results)
+    decision_ms = sum(result["decision_ms"] * result["decisions"] for result in results)
+
+    return {
+        "games": len(results),
+        "mean_score": sum(scores) / len(scores),
+        "min_score": min(scores),
+        "max_score": max(scores),
+        "mean_moves": moves / len(results),
+        "mean_decision_ms": decision_ms / max(decisions, 1),
+        "max_decision_ms": max(result["max_decision_ms"] for result in results),
+    }
+
+
+def print_summary(summary):
+    """印出彙總統計"""
+    if not summary.get("games"):
+        print("[自我對戰] 沒有完成任何一局")
+        return
+
+    print(
+        f"[自我對戰] 平均分數 {summary['mean_score']:.1f}"
+        f"（{summary['min_score']} ~ {summary['max_score']}），"
+        f"平均 {summary['mean_moves']:.1f} 步"
+    )
+    print(
+        f"[自我對戰] 決策時間: 平均 {summary['mean_decision_ms']:.2f} ms，"
+        f"最長 {summary['max_decision_ms']:.2f} ms"
+    )
+    if "elapsed_s" in summary:
+        print(f"[自我對戰] 總共 {summary['elapsed_s']:.1f} 秒")
+
+
+# ==================== 測試函數 ====================
+
+
+def test_self_play():
+    """測試單局可重現、平行執行和單一 process 結果相同"""
+    import tempfile
+
+    print("\n" + "=" * 50)
+    print("測試: 自我對戰")
+    print("=" * 50 + "\n")
+
+    policy = load_policy(config.SELF_PLAY_POLICY)
+    debug_mode = config.DEBUG_MODE
+    config.DEBUG_MODE = False
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        first = play_game(3, policy, max_moves=20)
+        second = play_game(3, policy, max_moves=20)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        config.DEBUG_MODE = debug_mode
+
+    same = first["score"] == second["score"] and first["moves"] == second["moves"]
+    print(f"同樣種子結果相同: {'✅' if same else '❌'}（{first['moves']} 步，消除 {first['score']} 顆）")
+
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "self_play.jsonl")
+        run_self_play(games=4, seed=3, workers=2, output=output, max_moves=20, chunksize=1)
+        with open(output, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+
+    ok = len(lines) == 4 and lines[0]["score"] == first["score"]
+    print(f"平行執行結果一致: {'✅' if ok else '❌'}（{len(lines)} 行）")
+
+    print("\n[測試] 測試完成！")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多核心自我對戰")
+    parser.add_argument("--games", type=int, help="局數")
+    parser.add_argument("--seed", type=int, help="第一局的種子")
+    parser.add_argument("--workers", type=int, help="process 數量（預設 CPU 核心數）")
+    parser.add_argument("--policy", help=f"策略 '模組:函數'（預設 {config.SELF_PLAY_POLICY}）")
+    parser.add_argument("--output", help="結果檔（JSON Lines）")
+    parser.add_argument("--max-moves", type=int, help="每局最多幾步")
+    parser.add_argument("--chunksize", type=int, help="每次交給 worker 幾局")
+    parser.add_argument("--test", action="store_true", help="執行測試函數")
+    args = parser.parse_args()
+
+    if args.test:
+        test_self_play()
+        return
+
+    run_self_play(
+        games=args.games,
+        seed=args.seed,
+        workers=args.workers,
+        policy=args.policy,
+        output=args.output,
+        max_moves=args.max_moves,
+        chunksize=args.chunksize,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Collect Em All! 自動遊戲程式 - 遊戲模擬器
+不需要瀏覽器，在記憶體中模擬「拖曳 -> 消除 -> 落下 -> 補球」
+
+學習資源:
+- random.Random: https://docs.python.org/3/library/random.html#random.Random
+- bytearray 切片: https://docs.python.org/3/library/stdtypes.html#bytearray
+
+學習重點:
+- 盤面用 Board.data（逐列攤平的 bytes），第 c 行就是 data[c::cols]
+- 消除的格子先設成 EMPTY，再把每一行剩下的球「往下擠」，上方補新球
+- 只處理被消除到的那幾行，其他行不用動
+- 補球使用自己的 random.Random(seed)，同樣的種子 + 同樣的移動 = 同樣的結果
+
+用法:
+    sim = GameSimulator(seed=42)
+    board = sim.new_board()
+    board, cleared = sim.apply_move(board, path)
+"""
+
+import random
+import config
+import bitboard
+from board import Board, EMPTY, UNKNOWN, BALL_CODES, color_code, is_adjacent
+
+
+_EMPTY_BYTE = bytes([EMPTY])
+
+
+# ==================== 補球取樣 ====================
+
+
+def _sampling_table(codes, weights):
+    """
+    建立 byte -> 顏色代碼的查表（給 bytes.translate 使用）
+
+    學習重點:
+    - 每種顏色佔表格中「權重」比例的格子，表格最多 256 格
+    - 整數權重且總和 <= 256 時完全準確；否則先按比例換算成 256 份（最大餘數法），
+      每種顏色至少 1 份
+    - 表格用不到的 byte 放進 rejected，抽到時刪掉重抽
+
+    Returns:
+        tuple: (256 bytes 的查表, 要刪掉的 byte)
+    """
+    total = sum(weights)
+    if all(isinstance(weight, int) for weight in weights) and total <= 256:
+        units = list(weights)
+    else:
+        exact = [weight * 256 / total for weight in weights]
+        units = [max(1, int(value)) for value in exact]
+        # 把剩下的份數分給小數部分最大的顏色
+        order = sorted(range(len(exact)), key=lambda i: exact[i] - int(exact[i]), reverse=True)
+        for i in order[: max(0, 256 - sum(units))]:
+            units[i] += 1
+
+        # 🔧 很小的權重也至少佔 1 份，總和可能超過 256，多出的份數從份數最多的顏色扣回
+        for _ in range(sum(units) - 256):
+            largest = max(range(len(units)), key=lambda i: units[i])
+            if units[largest] <= 1:
+                raise ValueError(f"顏色種類太多（{len(units)} 種），查表最多只能放 256 種")
+            units[largest] -= 1
+
+    repeat = 256 // sum(units)
+    table = bytearray()
+    for code, unit in zip(codes, units):
+        table += bytes([code]) * (unit * repeat)
+
+    rejected = bytes(range(len(table), 256))
+    table += bytes(256 - len(table))
+    return bytes(table), rejected
+
+
+# ==================== 路徑檢查 ====================
+
+
+def validate_path(board, path):
+    """
+    檢查拖曳路徑是否合法
+
+    規則:
+    - 至少 MIN_GROUP_SIZE 顆球
+    - 每一步都在盤面內、和上一步相鄰（config.CONNECTIVITY）、沒有重複
+    - 所有球同色，而且不是 EMPTY / UNKNOWN
+
+    Args:
+        board: Board
+        path: [(row, col), ...]
+
+    Raises:
+        ValueError: 路徑不合法時（訊息說明原因）
+    """
+    if len(path) < config.MIN_GROUP_SIZE:
+        raise ValueError(f"路徑長度 {len(path)} 小於 MIN_GROUP_SIZE={config.MIN_GROUP_SIZE}")
+
+    rows, cols = board.shape
+    data = board.data
+    seen = set()
+    target = None
+    previous = None
+
+    for row, col in path:
+        if not (0 <= row < rows and 0 <= col < cols):
+            raise ValueError(f"格子 {(row, col)} 超出盤面範圍")
+        if (row, col) in seen:
+            raise ValueError(f"格子 {(row, col)} 重複出現")
+        if previous is not None:
+            if not is_adjacent(previous, (row, col)):
+                raise ValueError(f"格子 {previous} -> {(row, col)} 不相鄰")
+
+        code = data[row * cols + col]
+        if target is None:
+            if code == EMPTY or code == UNKNOWN:
+                raise ValueError(f"起點 {(row, col)} 不是球")
+            target = code
+        elif code != target:
+            raise ValueError(f"格子 {(row, col)} 顏色和起點不同")
+
+        seen.add((row, col))
+        previous = (row, col)
+
+
+# ==================== 模擬器 ====================
+
+
+class GameSimulator:
+    """
+    可重現的盤面模擬器
+
+    Attributes:
+        rows, cols: 盤面大小
+        codes: 補球可能出現的顏色代碼
+        rng: 補球用的亂數產生器
+        refill: False 時消除後的空格保持 EMPTY（不補球）
+    """
+
+    def __init__(self, seed=None, weights=None, rows=None, cols=None, refill=True):
+        """
+        Args:
+            seed: 亂數種子（None 時使用 config.SIM_SEED）
+            weights: {顏色名稱: 權重}（None 時使用 config.SIM_COLOR_WEIGHTS，
+                     再沒有就是 BALL_COLORS 平均分布）
+            rows, cols: 盤面大小（預設 config.GRID_ROWS / GRID_COLS）
+            refill: 是否在消除後補新球
+        """
+        self.rows = rows or config.GRID_ROWS
+        self.cols = cols or config.GRID_COLS
+        self.refill = refill
+
+        if weights is None:
+            weights = config.SIM_COLOR_WEIGHTS
+        if weights is None:
+            weights = {name: 1 for name in config.BALL_COLORS}
+
+        codes = []
+        units = []
+        for name, weight in weights.items():
+            code = color_code(name)
+            if code not in BALL_CODES:
+                raise ValueError(f"未知的顏色: {name}（可用: {config.BALL_COLORS}）")
+            if weight < 0:
+                raise ValueError(f"顏色 {name} 的權重不能是負數: {weight}")
+            if weight > 0:
+                codes.append(code)
+                units.append(weight)
+
+        if not codes:
+            raise ValueError("至少要有一種顏色的權重大於 0")
+
+        self.codes = codes
+        self._table, self._rejected = _sampling_table(codes, units)
+        self.seed = config.SIM_SEED if seed is None else seed
+        self.rng = random.Random(self.seed)
+
+        self._pool = b""
+        self._pool_pos = 0
+
+    def reseed(self, seed):
+        """重設亂數種子（之後的補球順序從頭開始）"""
+        self.seed = seed
+        self.rng.seed(seed)
+        self._pool = b""
+        self._pool_pos = 0
+
+    def draw(self, count):
+        """
+        抽出 count 顆新球，回傳 bytes（每顆一個顏色代碼）
+
+        學習重點:
+        - 一次產生 SIM_DRAW_POOL 個隨機 byte，用 translate 查表變成顏色代碼
+        - 落在表格外的 byte 直接刪掉（拒絕取樣），分布才會和權重一致
+        - 全部在 C 裡面完成，每顆球的成本接近 0
+        - 同樣的種子（和同樣的 SIM_DRAW_POOL）抽出的順序永遠相同
+        """
+        pos = self._pool_pos
+        end = pos + count
+        if end > len(self._pool):
+            pool = self._pool[pos:]
+            size = max(config.SIM_DRAW_POOL, count)
+            while len(pool) < count:
+                raw = self.rng.randbytes(size)
+                pool += raw.translate(self._table, self._rejected)
+            self._pool = pool
+            pos = 0
+            end = count
+
+        self._pool_pos = end
+        return self._pool[pos:end]
+
+    def new_board(self):
+        """產生一個隨機的滿盤面"""
+        return Board.from_bytes(self.draw(self.rows * self.cols), self.rows, self.cols)
+
+    def apply_move(self, board, path, validate=True):
+        """
+        執行一次拖曳：消除路徑上的球、落下、補球
+
+        Args:
+            board: Board
+            path: [(row, col), ...]
+            validate: 是否先檢查路徑（搜尋中已確定合法時可以關掉）
+
+        Returns:
+            tuple: (新的 Board, 消除的球數)
+
+        Raises:
+            ValueError: validate=True 且路徑不合法
+        """
+        if validate:
+            validate_path(board, path)
+
+        rows, cols = board.shape
+        cells = bytearray(board.data)
+        touched = set()
+        for row, col in path:
+            cells[row * cols + col] = EMPTY
+            touched.add(col)
+
+        # 📝 STUDY: 逐行落下（行 = cells[col::cols]，由上到下）
+        # 由左到右處理，補球的抽取順序固定，結果才可重現
+        columns = []
+        missing = 0
+        for col in sorted(touched):
+            remaining = cells[col::cols].replace(_EMPTY_BYTE, b"")
+            columns.append((col, remaining))
+            missing += rows - len(remaining)
+
+        # 整步需要的新球一次抽出來，再依序分給每一行
+        if self.refill:
+            fresh = self.draw(missing)
+        else:
+            fresh = _EMPTY_BYTE * missing
+
+        start = 0
+        for col, remaining in columns:
+            end = start + rows - len(remaining)
+            cells[col::cols] = fresh[start:end] + remaining
+            start = end
+
+        return Board.from_bytes(cells, rows, cols), len(path)
+
+    def has_moves(self, board):
+        """盤面上是否還有可消除的組合"""
+        geometry = bitboard.get_geometry(board.rows, board.cols)
+        return bool(bitboard.group_masks(bitboard.color_masks(board), geometry))
+
+    def play(self, policy, board=None, max_moves=None):
+        """
+        用指定策略玩一局
+
+        Args:
+            policy: 函數 policy(board) -> 路徑（沒有移動時回傳 None 或空列表）
+            board: 起始盤面（None 時產生新盤面）
+            max_moves: 最多幾步（None 時使用 config.SIM_MAX_MOVES）
+
+        Returns:
+            dict: moves / score（消除球數）/ board（最後的盤面）
+        """
+        if board is None:
+            board = self.new_board()
+        if max_moves is None:
+            max_moves = config.SIM_MAX_MOVES
+
+        moves = 0
+        score = 0
+        while moves < max_moves:
+            path = policy(board)
+            if not path:
+                break
+            board, cleared = self.apply_move(board, path)
+            moves += 1
+            score += cleared
+
+        return {"moves": moves, "score": score, "board": board}
+
+
+# ==================== 測試函數 ====================
+
+
+def test_simulator():
+    """測試模擬器：落下、補球、可重現性"""
+    import game_logic
+
+    print("\n" + "=" * 50)
+    print("測試: 遊戲模擬器")
+    print("=" * 50 + "\n")
+
+    board = Board.from_grid(
+        [
+            ["RED", "BLUE", "GREEN"],
+            ["BLUE", "RED", "GREEN"],
+            ["RED", "RED", "BLUE"],
+        ]
+    )
+
+    # 不補球：消除三顆 RED 後，上方的球掉到底部，頂端留下 EMPTY
+    sim = GameSimulator(seed=1, rows=3, cols=3, refill=False)
+    after, cleared = sim.apply_move(board, [(2, 0), (2, 1), (1, 1)])
+    expected = [
+        ["EMPTY", "EMPTY", "GREEN"],
+        ["RED", "EMPTY", "GREEN"],
+        ["BLUE", "BLUE", "BLUE"],
+    ]
+    ok = cleared == 3 and after.to_grid() == expected
+    print(f"消除 + 落下: {'✅' if ok else '❌'}")
+
+    try:
+        sim.apply_move(board, [(0, 0), (0, 1)])
+        print("不合法路徑: ❌（應該拋出 ValueError）")
+    except ValueError as e:
+        print(f"不合法路徑: ✅ ({e})")
+
+    # 可重現：同樣的種子 + 同樣的策略 = 同樣的結果
+    def greedy(state):
+        _, path = game_logic.analyze_and_select_move(state)
+        return path if path and len(path) >= config.MIN_GROUP_SIZE else None
+
+    debug_mode = config.DEBUG_MODE
+    config.DEBUG_MODE = False
+    try:
+        first = GameSimulator(seed=7).play(greedy, max_moves=20)
+        second = GameSimulator(seed=7).play(greedy, max_moves=20)
+    finally:
+        config.DEBUG_MODE = debug_mode
+    same = first["score"] == second["score"] and first["board"] == second["board"]
+    print(f"可重現: {'✅' if same else '❌'}（{first['moves']} 步，消除 {first['score']} 顆）")
+
+    # 權重差很多時，每種顏色還是至少佔 1 份，查表不會是空的
+    names = list(config.BALL_COLORS)
+    weights = {name: 1 for name in names}
+    weights[names[0]] = 1000
+    skewed = GameSimulator(seed=1, weights=weights)
+    drawn = skewed.draw(2000)
+    counts = {name: drawn.count(color_code(name)) for name in names}
+    ok = len(drawn) == 2000 and counts[names[0]] > 1900 and all(counts.values())
+    print(f"權重懸殊: {'✅' if ok else '❌'}（{counts}）")
+
+    print("\n[測試] 測試完成！")
+
+
+if __name__ == "__main__":
+    test_simulator()
@@ -0,0 +1,260 @@
+"""
+Collect Em All! 自動遊戲程式 - Zobrist 雜湊與置換表
+讓搜尋可以快速辨認「看過的盤面」並重用結果
+
+學習資源:
+- Zobrist hashing: https://www.chessprogramming.org/Zobrist_Hashing
+- Transposition table: https://www.chessprogramming.org/Transposition_Table
+
+學習重點:
+- 每個（格子, 顏色）配一個隨機 64 位元整數，盤面的雜湊 = 所有格子對應數字的 XOR
+- XOR 可以「撤銷」：格子從 A 變成 B，只要 hash ^= key[A] ^ key[B]，不用重算整個盤面
+- 置換表用雜湊當 key，記住（搜尋深度, 結果）
+- 表格有容量上限（MB），滿了之後依策略取代舊的資料
+"""
+
+import random
+from collections import OrderedDict
+import config
+from board import UNKNOWN
+
+
+# ==================== Zobrist 雜湊 ====================
+
+
+class ZobristHasher:
+    """
+    盤面的 Zobrist 雜湊
+
+    Attributes:
+        rows, cols: 盤面大小
+        keys: 攤平的亂數表，格子 index、顏色 code 的 key 是 keys[index * codes + code]
+    """
+
+    def __init__(self, rows=None, cols=None, seed=None):
+        """
+        Args:
+            rows, cols: 盤面大小（預設 config.GRID_ROWS / GRID_COLS）
+            seed: 產生亂數表的種子（預設 config.ZOBRIST_SEED；同樣的種子雜湊值相同）
+        """
+        self.rows = rows or config.GRID_ROWS
+        self.cols = cols or config.GRID_COLS
+        self.codes = UNKNOWN + 1  # EMPTY、所有球的顏色、UNKNOWN
+
+        rng = random.Random(config.ZOBRIST_SEED if seed is None else seed)
+        self.keys = [rng.getrandbits(64) for _ in range(self.rows * self.cols * self.codes)]
+
+    def key(self, index, code):
+        """格子 index 為顏色 code 時的亂數"""
+        return self.keys[index * self.codes + code]
+
+    def hash_board(self, board):
+        """
+        計算整個盤面的雜湊
+
+        Args:
+            board: Board（大小要和 rows, cols 相同）
+
+        Returns:
+            int: 64 位元雜湊值
+        """
+        keys = self.keys
+        codes = self.codes
+        value = 0
+        for index, code in enumerate(board.data):
+            value ^= keys[index * codes + code]
+        return value
+
+    def update(self, value, index, old_code, new_code):
+        """
+        增量更新：格子 index 從 old_code 變成 new_code
+
+        Returns:
+            int: 新的雜湊值
+        """
+        base = index * self.codes
+        return value ^ self.keys[base + old_code] ^ self.keys[base + new_code]
+
+    def update_columns(self, value, old_board, new_board, columns):
+        """
+        增量更新：只有 columns 這幾行有變化（消除 + 落下 + 補球後）
+
+        學習重點:
+        - 落下和補球只會改變被消除到的那幾行
+        - 只比較這幾行的格子，其他格子的 key 不用動
+
+        Args:
+            value: old_board 的雜湊值
+            old_board, new_board: 變化前後的 Board
+            columns: 有變化的行
+
+        Returns:
+            int: new_board 的雜湊值
+        """
+        keys = self.keys
+        codes = self.codes
+        cols = self.cols
+        old_data = old_board.data
+        new_data = new_board.data
+
+        for col in columns:
+            for index in range(col, len(old_data), cols):
+                old_code = old_data[index]
+                new_code = new_data[index]
+                if old_code != new_code:
+                    base = index * codes
+                    value ^= keys[base + old_code] ^ keys[base + new_code]
+        return value
+
+
+_hashers = {}
+
+
+def get_hasher(rows=None, cols=None):
+    """取得（並快取）指定大小的 ZobristHasher"""
+    size = (rows or config.GRID_ROWS, cols or config.GRID_COLS)
+    if size not in _hashers:
+        _hashers[size] = ZobristHasher(*size)
+    return _hashers[size]
+
+
+# ==================== 置換表 ====================
+
+
+class TranspositionTable:
+    """
+    有容量上限的置換表
+
+    取代策略:
+    - "depth": 固定大小的槽位陣列，雜湊決定槽位；
+               新資料的搜尋深度 >= 舊資料時才取代（深的結果比較貴，優先保留）
+    - "lru": 滿了就丟掉最久沒用到的資料
+
+    用法:
+        table = TranspositionTable(max_mb=16)
+        entry = table.probe(key, depth)
+        if entry is None:
+            value = search(...)
+            table.store(key, depth, value)
+    """
+
+    # 每筆資料大約佔用的記憶體（Python 物件：tuple + int + dict/list 的開銷）
+    ENTRY_BYTES = {"depth": 160, "lru": 240}
+
+    def __init__(self, max_mb=None, policy=None):
+        """
+        Args:
+            max_mb: 記憶體上限（MB，預設 config.TT_MAX_MB）
+            policy: "depth" 或 "lru"（預設 config.TT_POLICY）
+        """
+        self.max_mb = config.TT_MAX_MB if max_mb is None else max_mb
+        self.policy = policy or config.TT_POLICY
+        if self.policy not in self.ENTRY_BYTES:
+            raise ValueError(f"未知的取代策略: {self.policy}（可用: {list(self.ENTRY_BYTES)}）")
+
+        self.capacity = max(1, int(self.max_mb * 1024 * 1024) // self.ENTRY_BYTES[self.policy])
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+        self.clear()
+
+    def clear(self):
+        """清空資料（統計數字保留）"""
+        if self.policy == "depth":
+            self._slots = [None] * self.capacity
+            self._size = 0
+        else:
+            self._entries = OrderedDict()
+
+    def __len__(self):
+        if self.policy == "depth":
+            return self._size
+        return len(self._entries)
+
+    def probe(self, key, depth=0):
+        """
+        查詢置換表
+
+        Args:
+            key: 盤面雜湊
+            depth: 需要的搜尋深度（記錄的深度 >= depth 才算命中）
+
+        Returns:
+            tuple: (depth, value)；沒有命中時回傳 None
+        """
+        if self.policy == "depth":
+            entry = self._slots[key % self.capacity]
+            if entry is not None and entry[0] == key and entry[1] >= depth:
+                self.hits += 1
+                return entry[1], entry[2]
+        else:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= depth:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value):
+        """
+        寫入置換表
+
+        Args:
+            key: 盤面雜湊
+            depth: 這個結果的搜尋深度
+            value: 要記住的結果（任意物件）
+        """
+        self.stores += 1
+
+        if self.policy == "depth":
+            slot = key % self.capacity
+            entry = self._slots[slot]
+            if entry is None:
+                self._size += 1
+            elif entry[0] != key:
+                # 不同盤面搶同一個槽位：深度比較淺的新資料不取代
+                if depth < entry[1]:
+                    return
+                self.replacements += 1
+            elif depth < entry[1]:
+                return
+            self._slots[slot] = (key, depth, value)
+            return
+
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+        elif len(entries) >= self.capacity:
+            entries.popitem(last=False)
+            self.replacements += 1
+        entries[key] = (depth, value)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """統計數字（dict）"""
+        return {
+            "policy": self.policy,
+            "entries": len(self),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "stores": self.stores,
+            "replacements": self.replacements,
+        }
+
+    def report(self, name="置換表"):
+        """印出統計"""
+        print(
+            f"[邏輯] {name}: 命中 {self.hits} / 查詢 {self.hits + self.misses}"
+            f"（{self.hit_rate:.1%}），{len(self)}/{self.capacity} 筆，"
+            f"取代 {self.replacements} 次（{self.policy}，{self.max_mb} MB）"
+        )
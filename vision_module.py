@@ -8,11 +8,447 @@ Collect Em All! 自動遊戲程式 - 視覺辨識模組
 - 顏色空間: https://en.wikipedia.org/wiki/RGB_color_model
 """
 
-import pyautogui
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
+import cv2
+import hashlib
+import json
+import os
+import threading
 import time
+import base64
+from collections import namedtuple
 import config
+import debug_sink
+from board import Board, UNKNOWN, as_board
+
+try:
+    import mss  # 選用：區域截圖後端
+except ImportError:
+    mss = None
+
+
+# ==================== 截圖後端（FrameSource） ====================
+
+
+class FrameSource:
+    """
+    截圖後端的基底類別
+
+    所有座標都是「截圖像素座標」，也就是 locate_game_board() 回傳的盤面座標
+    （HiDPI 螢幕上是實體像素）。
+
+    子類別需要實作:
+    - grab(region): 截取指定區域，回傳 (H, W, 3) 的 uint8 RGB 陣列
+    - grab_screen(): 截取整個螢幕，回傳 PIL.Image
+    """
+
+    name = "base"
+
+    def grab(self, region):
+        """
+        截取指定區域
+
+        Args:
+            region: (left, top, width, height)
+
+        Returns:
+            np.ndarray: (height, width, 3) 的 RGB 陣列
+                        注意：可能是重複使用的緩衝區，下次 grab() 會被覆寫，
+                        需要保留請自行 .copy()
+        """
+        raise NotImplementedError
+
+    def grab_screen(self):
+        """截取整個螢幕，回傳 PIL.Image"""
+        raise NotImplementedError
+
+    # 截圖像素 / 滑鼠座標（grid_to_screen 用來換算）
+    @property
+    def display_scale(self):
+        return config.DISPLAY_SCALE_FACTOR
+
+    def screen_size(self):
+        """
+        可以截取的範圍 (width, height)，單位是截圖像素；grab() 的區域不能超出這個範圍
+
+        Returns:
+            tuple: (width, height)，None 表示不限制（超出的部分由後端自己處理）
+        """
+        return None
+
+    def close(self):
+        """釋放資源"""
+
+
+class PyAutoGUIFrameSource(FrameSource):
+    """原本的截圖方式：每次都截全螢幕，再裁切出需要的區域"""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        # 📝 STUDY: 用到時才匯入（Linux 上匯入 pyautogui 就會連線 $DISPLAY，
+        # 沒有桌面的主機只用 browser 截圖後端時，載入這個模組不能需要顯示器）
+        try:
+            import pyautogui
+        except Exception as e:
+            raise RuntimeError(
+                f"無法使用 pyautogui（需要安裝套件，並且有可用的桌面 $DISPLAY）: {e}"
+            ) from e
+        self._pyautogui = pyautogui
+
+    def grab(self, region):
+        left, top, width, height = region
+        screenshot = self._pyautogui.screenshot()
+        cropped = screenshot.crop((left, top, left + width, top + height))
+        return _to_rgb_array(cropped)
+
+    def grab_screen(self):
+        return self._pyautogui.screenshot()
+
+
+class RegionFrameSource(FrameSource):
+    """
+    只截取需要的區域（mss；X11 上使用 shared memory）
+
+    學習重點:
+    - 4K 螢幕截全螢幕約 33 MB，盤面區域只有 1 MB 左右
+    - 每種大小的區域各配置一個緩衝區，之後每回合重複使用，不再配置新記憶體
+    - mss 使用邏輯座標，輸出的是實體像素；兩者的比例在建立時量一次
+    """
+
+    name = "region"
+
+    def __init__(self):
+        if mss is None:
+            raise RuntimeError("需要安裝 mss 套件: pip install mss")
+
+        self._sct = mss.mss()
+        self._buffers = {}
+
+        # 📝 STUDY: 截一小塊區域，量出「實體像素 / 邏輯座標」的比例
+        probe = self._sct.grab({"left": 0, "top": 0, "width": 8, "height": 8})
+        self._pixel_ratio = max(1, int(round(probe.width / 8)))
+
+    def _buffer(self, height, width):
+        """取得（或建立）指定大小的緩衝區"""
+        key = (height, width)
+        if key not in self._buffers:
+            self._buffers[key] = np.empty((height, width, 3), dtype=np.uint8)
+        return self._buffers[key]
+
+    def grab(self, region):
+        left, top, width, height = (int(value) for value in region)
+        ratio = self._pixel_ratio
+
+        # 截圖像素座標 -> mss 邏輯座標（不能整除時多截一點，再裁掉）
+        logical_left = left // ratio
+        logical_top = top // ratio
+        offset_x = left - logical_left * ratio
+        offset_y = top - logical_top * ratio
+        logical_width = -(-(width + offset_x) // ratio)
+        logical_height = -(-(height + offset_y) // ratio)
+
+        shot = self._sct.grab(
+            {
+                "left": logical_left,
+                "top": logical_top,
+                "width": logical_width,
+                "height": logical_height,
+            }
+        )
+
+        # mss 回傳 BGRA，直接從記憶體讀取，不轉成 PIL 圖片
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8)
+        bgra = bgra.reshape(shot.height, shot.width, 4)
+        bgra = bgra[offset_y : offset_y + height, offset_x : offset_x + width]
+
+        buffer = self._buffer(height, width)
+        np.copyto(buffer, bgra[..., 2::-1])  # BGR -> RGB
+        return buffer
+
+    def grab_screen(self):
+        shot = self._sct.grab(self._sct.monitors[1])
+        return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+    def screen_size(self):
+        # mss 截超出螢幕的區域會丟出例外
+        monitor = self._sct.monitors[1]
+        ratio = self._pixel_ratio
+        return (
+            (monitor["left"] + monitor["width"]) * ratio,
+            (monitor["top"] + monitor["height"]) * ratio,
+        )
+
+    def close(self):
+        self._sct.close()
+        self._buffers.clear()
+
+
+# 從 canvas 讀回指定區域（座標是頁面 CSS 像素），回傳 data URL
+_CANVAS_READBACK_SCRIPT = """
+const [selector, x, y, width, height, scale, format] = arguments;
+const canvas = document.querySelector(selector || "canvas");
+if (!canvas) {
+  return null;
+}
+const rect = canvas.getBoundingClientRect();
+const sx = canvas.width / rect.width;
+const sy = canvas.height / rect.height;
+// 暫存的 canvas 重複使用，不用每次配置
+const out = window.__frameReadback || (window.__frameReadback = document.createElement("canvas"));
+out.width = Math.round(width * scale);
+out.height = Math.round(height * scale);
+out.getContext("2d").drawImage(
+  canvas, (x - rect.left) * sx, (y - rect.top) * sy, width * sx, height * sy,
+  0, 0, out.width, out.height
+);
+return out.toDataURL("image/" + format);
+"""
+
+
+class BrowserFrameSource(FrameSource):
+    """
+    直接從瀏覽器取得畫面（不截作業系統的螢幕）
+
+    學習重點:
+    - 截圖座標 = 頁面 CSS 像素 * scale，和螢幕位置、視窗外框無關，HEADLESS_MODE 也能用
+    - BROWSER_CAPTURE_MODE:
+      "cdp": Page.captureScreenshot 只截 clip 指定的區域（Chrome）
+      "canvas": 在頁面裡把 canvas 的區域畫到暫存 canvas 再 toDataURL
+                （WebGL canvas 需要 preserveDrawingBuffer，跨網域 iframe 裡的 canvas 讀不到）
+    - 回傳的圖片是 base64，在記憶體中直接用 cv2.imdecode 解碼成 numpy，不寫到磁碟
+    - 每種大小的區域各配置一個緩衝區，和 RegionFrameSource 相同
+
+    用法:
+        attach_driver(driver)   # main 啟動瀏覽器之後呼叫
+        set_frame_source(create_frame_source("browser"))
+    """
+
+    name = "browser"
+
+    def __init__(self, driver=None, mode=None, scale=None):
+        """
+        Args:
+            driver: Selenium WebDriver（None 時使用 attach_driver() 設定的 driver）
+            mode: "cdp" 或 "canvas"（預設 config.BROWSER_CAPTURE_MODE）
+            scale: 截圖像素 / CSS 像素（預設 config.BROWSER_CAPTURE_SCALE，
+                   也就是 DISPLAY_SCALE_FACTOR，模板才對得上；
+                   設成 None 則使用頁面的 devicePixelRatio）
+        """
+        self.driver = driver or _driver
+        if self.driver is None:
+            raise RuntimeError("沒有瀏覽器可以用，請先呼叫 vision_module.attach_driver(driver)")
+
+        self.mode = mode or config.BROWSER_CAPTURE_MODE
+        if self.mode not in ("cdp", "canvas"):
+            raise ValueError(f"未知的 BROWSER_CAPTURE_MODE: {self.mode}（可用: ['cdp', 'canvas']）")
+        if self.mode == "cdp" and not hasattr(self.driver, "execute_cdp_cmd"):
+            raise RuntimeError("目前的瀏覽器不支援 Chrome DevTools Protocol，請改用 'canvas'")
+
+        self.device_pixel_ratio = self.driver.execute_script("return window.devicePixelRatio;") or 1
+        if scale is None:
+            scale = config.BROWSER_CAPTURE_SCALE
+        self.scale = scale or self.device_pixel_ratio
+        self.format = config.BROWSER_CAPTURE_FORMAT
+        self._buffers = {}
+
+    @property
+    def display_scale(self):
+        return self.scale
+
+    def _buffer(self, height, width):
+        """取得（或建立）指定大小的緩衝區"""
+        key = (height, width)
+        if key not in self._buffers:
+            self._buffers[key] = np.empty((height, width, 3), dtype=np.uint8)
+        return self._buffers[key]
+
+    def _capture(self, clip=None):
+        """
+        取得畫面（clip 為 CSS 像素的 (x, y, width, height)，None = 整個可視區域）
+
+        Returns:
+            bytes: 編碼過的圖片（png / jpeg）
+        """
+        if self.mode == "canvas":
+            x, y, width, height = clip or (0, 0, *self.driver.execute_script(
+                "return [window.innerWidth, window.innerHeight];"
+            ))
+            data_url = self.driver.execute_script(
+                _CANVAS_READBACK_SCRIPT,
+                config.CANVAS_SELECTOR,
+                x,
+                y,
+                width,
+                height,
+                self.scale,
+                self.format,
+            )
+            if not data_url:
+                raise RuntimeError("頁面上找不到 canvas（請檢查 CANVAS_SELECTOR）")
+            return base64.b64decode(data_url.partition(",")[2])
+
+        params = {"format": self.format, "optimizeForSpeed": True}
+        if self.format == "jpeg":
+            params["quality"] = 100
+        if clip is not None:
+            x, y, width, height = clip
+            # 輸出像素 = CSS 像素 * devicePixelRatio * clip.scale
+            params["clip"] = {
+                "x": x,
+                "y": y,
+                "width": width,
+                "height": height,
+                "scale": self.scale / self.device_pixel_ratio,
+            }
+        result = self.driver.execute_cdp_cmd("Page.captureScreenshot", params)
+        return base64.b64decode(result["data"])
+
+    def _decode(self, data):
+        """編碼過的圖片 -> BGR 陣列（在記憶體中解碼）"""
+        bgr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if bgr is None:
+            raise RuntimeError("無法解碼瀏覽器回傳的圖片")
+        return bgr
+
+    def grab(self, region):
+        left, top, width, height = (int(value) for value in region)
+        scale = self.scale
+        clip = (left / scale, top / scale, width / scale, height / scale)
+        bgr = self._decode(self._capture(clip))
+
+        # 捨入誤差可能差一兩個像素，縮放成要求的大小
+        if bgr.shape[:2] != (height, width):
+            bgr = cv2.resize(bgr, (width, height), interpolation=cv2.INTER_AREA)
+
+        buffer = self._buffer(height, width)
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=buffer)
+        return buffer
+
+    def grab_screen(self):
+        bgr = self._decode(self._capture())
+        return Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+
+    def screen_size(self):
+        # 可視區域（CSS 像素）換成截圖像素
+        width, height = self.driver.execute_script(
+            "return [window.innerWidth, window.innerHeight];"
+        )
+        return (int(width * self.scale), int(height * self.scale))
+
+    def close(self):
+        self._buffers.clear()
+
+
+_driver = None
+
+
+def attach_driver(driver):
+    """
+    設定 browser 截圖後端使用的 Selenium driver（main 啟動瀏覽器後呼叫）
+
+    Args:
+        driver: Selenium WebDriver 實例
+    """
+    global _driver
+
+    _driver = driver
+
+
+# 可用的截圖後端（名稱 -> 類別）
+FRAME_SOURCES = {
+    PyAutoGUIFrameSource.name: PyAutoGUIFrameSource,
+    RegionFrameSource.name: RegionFrameSource,
+    BrowserFrameSource.name: BrowserFrameSource,
+}
+
+_frame_source = None
+_thread_frame_source = threading.local()  # 執行緒自己的截圖後端（沒有設定時使用共用的）
+
+
+def create_frame_source(name):
+    """
+    依名稱建立截圖後端
+
+    Args:
+        name: FRAME_SOURCES 中的名稱（如 "region", "pyautogui", "browser"）
+
+    Returns:
+        FrameSource: 截圖後端實例
+
+    Raises:
+        ValueError: 未知的名稱
+        RuntimeError: 這個後端在目前的環境不能用（例如沒有安裝套件、沒有桌面）
+    """
+    if name not in FRAME_SOURCES:
+        raise ValueError(f"未知的截圖後端: {name}（可用: {list(FRAME_SOURCES)}）")
+    return FRAME_SOURCES[name]()
+
+
+def get_frame_source():
+    """
+    取得目前使用的截圖後端（第一次呼叫時依 config.CAPTURE_BACKEND 建立）
+
+    目前的執行緒有自己的截圖後端（set_thread_frame_source）時，優先使用它
+
+    Returns:
+        FrameSource: 截圖後端實例
+    """
+    global _frame_source
+
+    source = getattr(_thread_frame_source, "source", None)
+    if source is not None:
+        return source
+
+    if _frame_source is None:
+        try:
+            _frame_source = create_frame_source(config.CAPTURE_BACKEND)
+        except Exception as e:
+            print(f"[警告] 無法使用截圖後端 {config.CAPTURE_BACKEND}: {e}")
+            print("[警告] 改用 pyautogui 截圖")
+            try:
+                _frame_source = PyAutoGUIFrameSource()
+            except RuntimeError as fallback:
+                raise RuntimeError(
+                    f"沒有可用的截圖後端: {config.CAPTURE_BACKEND}（{e}）、pyautogui（{fallback}）"
+                ) from fallback
+
+        if config.DEBUG_MODE:
+            print(f"[視覺] 截圖後端: {_frame_source.name}")
+
+    return _frame_source
+
+
+def set_frame_source(source):
+    """
+    替換目前使用的截圖後端
+
+    Args:
+        source: FrameSource 實例
+    """
+    global _frame_source
+
+    if _frame_source is not None and _frame_source is not source:
+        _frame_source.close()
+    _frame_source = source
+
+
+def set_thread_frame_source(source):
+    """
+    讓目前的執行緒使用自己的截圖後端（其他執行緒仍然使用共用的）
+
+    學習重點:
+    - mss 等截圖後端要在建立它的執行緒中使用，背景執行緒截圖時要有自己的一份
+    - 執行緒結束前用 set_thread_frame_source(None) 關閉它
+
+    Args:
+        source: FrameSource 實例；None 表示關閉這個執行緒的截圖後端，改回共用的
+    """
+    current = getattr(_thread_frame_source, "source", None)
+    if current is not None and current is not source:
+        current.close()
+    _thread_frame_source.source = source
 
 
 # ✅ COMPLETE: 截圖整個螢幕
@@ -24,27 +460,540 @@ def capture_screen():
         PIL.Image: 螢幕截圖
 
     學習重點:
-    - pyautogui.screenshot(): 截取整個螢幕
+    - 透過截圖後端（FrameSource）截取整個螢幕
     """
     if config.DEBUG_MODE:
         print("[視覺] 截圖螢幕...")
 
-    screenshot = pyautogui.screenshot()
+    screenshot = get_frame_source().grab_screen()
     return screenshot
 
 
+# ==================== 模板匹配 ====================
+
+# 模板匹配結果（座標為截圖像素座標，欄位與 pyautogui 的 Box 相容）
+Match = namedtuple("Match", ["left", "top", "width", "height", "score"])
+
+
+def _to_gray(image):
+    """把 PIL 圖片或 RGB 陣列轉成灰階陣列"""
+    return cv2.cvtColor(np.ascontiguousarray(_to_rgb_array(image)), cv2.COLOR_RGB2GRAY)
+
+
+def _load_gray_template(path):
+    """讀取模板圖片（灰階），找不到檔案時丟出 FileNotFoundError"""
+    template = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if template is None:
+        raise FileNotFoundError(f"找不到模板圖片: {path}")
+    return template
+
+
+def _match_best(haystack_gray, needle_gray):
+    """
+    在 haystack 中找 needle 最相似的位置
+
+    Returns:
+        tuple: (score, (x, y))，haystack 比 needle 小時回傳 (-1.0, None)
+    """
+    if (
+        haystack_gray.shape[0] < needle_gray.shape[0]
+        or haystack_gray.shape[1] < needle_gray.shape[1]
+    ):
+        return -1.0, None
+
+    result = cv2.matchTemplate(haystack_gray, needle_gray, cv2.TM_CCOEFF_NORMED)
+    _, score, _, location = cv2.minMaxLoc(result)
+    return score, location
+
+
+def build_pyramid(gray, levels=None):
+    """
+    建立影像金字塔（每層縮小一半）
+
+    Args:
+        gray: 灰階影像
+        levels: 最多幾層（預設 config.TEMPLATE_PYRAMID_LEVELS）
+
+    Returns:
+        list: [原尺寸, 1/2, 1/4, ...]，縮到小於 8 像素就停止
+    """
+    if levels is None:
+        levels = config.TEMPLATE_PYRAMID_LEVELS
+
+    pyramid = [gray]
+    for _ in range(levels - 1):
+        previous = pyramid[-1]
+        if min(previous.shape[:2]) // 2 < 8:
+            break
+        pyramid.append(
+            cv2.resize(
+                previous,
+                (previous.shape[1] // 2, previous.shape[0] // 2),
+                interpolation=cv2.INTER_AREA,
+            )
+        )
+    return pyramid
+
+
+def _coarse_candidates(haystack_gray, needle_gray, count):
+    """
+    粗搜尋：分數最高的幾個位置
+
+    Returns:
+        list: [(x, y), ...]，依分數由高到低；每找到一個就把附近（半個模板大小）
+              清掉，避免同一個峰值附近的點佔滿名額
+    """
+    needle_h, needle_w = needle_gray.shape[:2]
+    if haystack_gray.shape[0] < needle_h or haystack_gray.shape[1] < needle_w:
+        return []
+
+    result = cv2.matchTemplate(haystack_gray, needle_gray, cv2.TM_CCOEFF_NORMED)
+    candidates = []
+    for _ in range(count):
+        _, score, _, location = cv2.minMaxLoc(result)
+        if candidates and score <= -1.0:
+            break
+        candidates.append(location)
+
+        x, y = location
+        result[
+            max(0, y - needle_h // 2) : y + needle_h // 2 + 1,
+            max(0, x - needle_w // 2) : x + needle_w // 2 + 1,
+        ] = -1.0
+    return candidates
+
+
+def pyramid_search(haystack_pyramid, needle_pyramid, candidates=None, min_score=None):
+    """
+    影像金字塔搜尋：先在縮小的圖上找大概位置，再回到原尺寸附近精修
+
+    Args:
+        haystack_pyramid: 截圖的金字塔（build_pyramid 的結果）
+        needle_pyramid: 模板的金字塔
+        candidates: 粗搜尋保留幾個位置（預設 config.TEMPLATE_PYRAMID_CANDIDATES）
+        min_score: 精修後的最高分低於這個值，就改在原尺寸全圖搜尋
+                   （預設 config.TEMPLATE_PYRAMID_FALLBACK_SCORE）
+
+    Returns:
+        Match: 原尺寸上最相似的位置與分數（相對於 haystack），無法比對則返回 None
+
+    學習重點:
+    - 縮小一半，像素數變成 1/4，模板匹配快很多
+    - 縮小後的位置只是「大概」，所以要在原尺寸的小範圍內再比對一次
+    - 縮小後細節不見了，最高分不一定是正確位置，所以保留前幾名都精修；
+      都不夠像時再全圖搜尋一次，不會因為粗搜尋選錯就回報找不到
+    """
+    if candidates is None:
+        candidates = config.TEMPLATE_PYRAMID_CANDIDATES
+    if min_score is None:
+        min_score = config.TEMPLATE_PYRAMID_FALLBACK_SCORE
+
+    haystack = haystack_pyramid[0]
+    needle = needle_pyramid[0]
+    needle_h, needle_w = needle.shape[:2]
+    height, width = haystack.shape[:2]
+
+    level = min(len(haystack_pyramid), len(needle_pyramid)) - 1
+    best = None
+
+    if level > 0:
+        # 📝 STUDY: 粗搜尋（縮小的圖），保留前幾名
+        coarse = _coarse_candidates(
+            haystack_pyramid[level], needle_pyramid[level], max(1, candidates)
+        )
+
+        # 📝 STUDY: 精修範圍（原尺寸，只看每個粗搜尋位置附近）
+        factor = 2**level
+        margin = factor * 2
+        for x, y in coarse:
+            left = max(0, x * factor - margin)
+            top = max(0, y * factor - margin)
+            right = min(width, x * factor + needle_w + margin)
+            bottom = min(height, y * factor + needle_h + margin)
+
+            score, location = _match_best(haystack[top:bottom, left:right], needle)
+            if location is not None and (best is None or score > best.score):
+                best = Match(left + location[0], top + location[1], needle_w, needle_h, score)
+
+        if best is not None and best.score >= min_score:
+            return best
+
+    # 沒有金字塔，或精修的分數都不夠 -> 原尺寸全圖搜尋
+    score, location = _match_best(haystack, needle)
+    if location is None:
+        return best
+
+    return Match(location[0], location[1], needle_w, needle_h, score)
+
+
+class TemplateMatcher:
+    """
+    共用的模板匹配服務
+
+    - 模板（參考圖示、彈窗文字、關閉按鈕）只讀一次，並預先建好灰階金字塔
+    - 一次截圖可以同時比對多個模板，每個模板可以指定自己的搜尋區域
+    - 最近一次的比對結果會保留一下，短時間內重複詢問不用再截圖
+    """
+
+    def __init__(self, templates=None):
+        self.templates = dict(templates or config.TEMPLATE_IMAGES)
+        self._pyramids = {}
+        self._recent = {}  # name -> (時間, 搜尋區域, Match)
+
+        for name, path in self.templates.items():
+            try:
+                self._pyramids[name] = build_pyramid(_load_gray_template(path))
+            except FileNotFoundError as e:
+                if config.DEBUG_MODE:
+                    print(f"[除錯] {e}")
+
+    def has_template(self, name):
+        """模板是否成功載入"""
+        return name in self._pyramids
+
+    def template_size(self, name):
+        """模板大小 (width, height)"""
+        height, width = self._pyramids[name][0].shape[:2]
+        return width, height
+
+    def match_frame(self, frame, requests, origin=(0, 0)):
+        """
+        在一張截圖上比對多個模板
+
+        Args:
+            frame: 截圖（PIL.Image 或 RGB 陣列）
+            requests: dict，模板名稱 -> 搜尋區域 (left, top, width, height)，
+                      None 表示整張截圖；區域使用截圖像素座標
+            origin: 這張截圖左上角的截圖像素座標
+
+        Returns:
+            dict: 模板名稱 -> Match（最相似的位置，尚未套用信心度門檻）
+        """
+        gray = _to_gray(frame)
+        origin_x, origin_y = origin
+        haystacks = {}  # 相同搜尋區域的模板共用同一個金字塔
+        results = {}
+
+        for name, region in requests.items():
+            if name not in self._pyramids:
+                results[name] = None
+                continue
+
+            if region is None:
+                left, top = 0, 0
+                right, bottom = gray.shape[1], gray.shape[0]
+            else:
+                left = max(0, int(region[0]) - origin_x)
+                top = max(0, int(region[1]) - origin_y)
+                right = min(gray.shape[1], int(region[0] + region[2]) - origin_x)
+                bottom = min(gray.shape[0], int(region[1] + region[3]) - origin_y)
+
+            key = (left, top, right, bottom)
+            if key not in haystacks:
+                haystacks[key] = build_pyramid(gray[top:bottom, left:right])
+
+            match = pyramid_search(haystacks[key], self._pyramids[name])
+            if match is not None:
+                match = match._replace(
+                    left=match.left + left + origin_x, top=match.top + top + origin_y
+                )
+            results[name] = match
+
+        return results
+
+    def capture_and_match(self, requests, confidences=None, max_age=0):
+        """
+        截一次圖，同時比對多個模板
+
+        Args:
+            requests: dict，模板名稱 -> 搜尋區域（None 表示全螢幕）
+            confidences: dict，模板名稱 -> 信心度（預設 config.TEMPLATE_CONFIDENCE）
+            max_age: 幾秒內的比對結果可以直接沿用（0 表示一定重新截圖）
+
+        Returns:
+            dict: 模板名稱 -> Match，分數低於信心度則為 None
+
+        學習重點:
+        - 只截所有搜尋區域的聯集，而不是整個螢幕
+        - 聯集超出螢幕（盤面靠近右邊或下緣）時先裁掉超出的部分
+        - 有任何模板要搜尋全螢幕，或裁完什麼都不剩時，才截全螢幕
+        """
+        now = time.time()
+        raw = {}
+        pending = {}
+
+        for name, region in requests.items():
+            recent = self._recent.get(name)
+            if recent and now - recent[0] <= max_age and recent[1] == region:
+                raw[name] = recent[2]
+            else:
+                pending[name] = region
+
+        if pending:
+            regions = list(pending.values())
+            search = pending
+
+            if any(region is None for region in regions):
+                frame, origin = capture_screen(), (0, 0)
+            else:
+                left = max(0, min(int(region[0]) for region in regions))
+                top = max(0, min(int(region[1]) for region in regions))
+                right = max(int(region[0] + region[2]) for region in regions)
+                bottom = max(int(region[1] + region[3]) for region in regions)
+
+                # 🔧 只有左上角不會是負的，右下角可能超出螢幕（截圖後端會丟出例外）
+                source = get_frame_source()
+                size = source.screen_size()
+                if size is not None:
+                    right = min(right, size[0])
+                    bottom = min(bottom, size[1])
+
+                if right > left and bottom > top:
+                    frame = source.grab((left, top, right - left, bottom - top))
+                    origin = (left, top)
+                else:
+                    # 搜尋區域整個在螢幕外：改成在全螢幕上搜尋
+                    frame, origin = capture_screen(), (0, 0)
+                    search = {name: None for name in pending}
+
+            for name, match in self.match_frame(frame, search, origin).items():
+                self._recent[name] = (now, pending[name], match)
+                raw[name] = match
+
+        thresholds = dict(config.TEMPLATE_CONFIDENCE)
+        thresholds.update(confidences or {})
+
+        results = {}
+        for name, match in raw.items():
+            if match is not None and match.score >= thresholds.get(name, 0.8):
+                results[name] = match
+            else:
+                results[name] = None
+        return results
+
+
+_template_matcher = None
+
+
+def get_template_matcher():
+    """取得共用的模板匹配服務（第一次呼叫時載入所有模板）"""
+    global _template_matcher
+
+    if _template_matcher is None:
+        _template_matcher = TemplateMatcher()
+    return _template_matcher
+
+
+def board_search_region(board_x, board_y, margin=None):
+    """
+    盤面周圍的搜尋區域（彈窗會出現在盤面上方）
+
+    Args:
+        board_x: 盤面左上角 x 座標
+        board_y: 盤面左上角 y 座標
+        margin: 往外擴展的像素數（預設 config.POPUP_SEARCH_MARGIN）
+
+    Returns:
+        tuple: (left, top, width, height)
+    """
+    if margin is None:
+        margin = config.POPUP_SEARCH_MARGIN
+
+    left = max(0, board_x - margin)
+    top = max(0, board_y - margin)
+    width = config.GRID_COLS * config.CELL_SIZE + (board_x - left) + margin
+    height = config.GRID_ROWS * config.CELL_SIZE + (board_y - top) + margin
+    return (left, top, width, height)
+
+
+# ==================== 盤面定位 ====================
+
+
+class BoardLocator:
+    """
+    會記住盤面位置的定位器
+
+    定位流程:
+    1. 有上次的位置 -> 只截參考圖示周圍的小區域確認（很便宜）
+    2. 確認失敗（視窗移動了）-> 全螢幕影像金字塔搜尋
+    3. 找到後連同視窗位置一起存檔，下次啟動如果視窗沒變就直接從步驟 1 開始
+    """
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or config.BOARD_LOCATION_CACHE
+        self.reference_box = None  # 參考圖示位置 (left, top, width, height)
+        self.stats = {"roi_hits": 0, "full_searches": 0, "failures": 0}
+        self._load_cache()
+
+    def _match(self, frame, origin=(0, 0)):
+        """在截圖中比對參考圖示，分數不足則返回 None"""
+        matcher = get_template_matcher()
+        if not matcher.has_template("reference_icon"):
+            raise FileNotFoundError(f"找不到參考圖示: {config.REFERENCE_ICON_PATH}")
+
+        match = matcher.match_frame(frame, {"reference_icon": None}, origin)
+        match = match["reference_icon"]
+        if match is None or match.score < config.MATCH_CONFIDENCE:
+            return None
+        return match
+
+    def board_position(self):
+        """根據參考圖示位置計算盤面左上角，還沒定位時返回 None"""
+        if self.reference_box is None:
+            return None
+
+        ref_x, ref_y = self.reference_box[:2]
+        board_x = ref_x + config.BOARD_OFFSET_FROM_REFERENCE[0]
+        board_y = ref_y + config.BOARD_OFFSET_FROM_REFERENCE[1]
+        return (board_x, board_y)
+
+    def locate(self, force_full_search=False):
+        """
+        定位盤面
+
+        Args:
+            force_full_search: True 時跳過小區域確認，直接全螢幕搜尋
+
+        Returns:
+            tuple: (board_x, board_y)，找不到則返回 None
+        """
+        if self.reference_box is not None and not force_full_search:
+            box = self.verify()
+            if box is not None:
+                self.stats["roi_hits"] += 1
+                if box != self.reference_box:
+                    print(f"[視覺] 盤面位置微調: {self.reference_box[:2]} -> {box[:2]}")
+                    self.reference_box = box
+                    self._save_cache()
+                return self.board_position()
+
+            print("[視覺] 盤面不在上次的位置，重新搜尋全螢幕...")
+
+        self.stats["full_searches"] += 1
+        screenshot = capture_screen()
+        match = self._match(screenshot)
+
+        if match is None:
+            self.stats["failures"] += 1
+            self.reference_box = None
+            return None
+
+        self.reference_box = tuple(int(value) for value in match[:4])
+        self._save_cache()
+
+        board_x, board_y = self.board_position()
+        if config.DEBUG_MODE:
+            debug_sink.get_debug_sink().submit(
+                "board_location", save_debug_board_location, board_x, board_y, screenshot
+            )
+
+        return (board_x, board_y)
+
+    def verify(self):
+        """
+        只截參考圖示周圍的小區域，確認它還在原本的位置
+
+        Returns:
+            tuple: 目前的參考圖示位置 (left, top, width, height)，不在附近則返回 None
+        """
+        left, top, width, height = self.reference_box
+        margin = config.BOARD_VERIFY_MARGIN
+        roi_left = max(0, left - margin)
+        roi_top = max(0, top - margin)
+        region = (
+            roi_left,
+            roi_top,
+            width + (left - roi_left) + margin,
+            height + (top - roi_top) + margin,
+        )
+
+        try:
+            roi = get_frame_source().grab(region)
+        except Exception as e:
+            if config.DEBUG_MODE:
+                print(f"[除錯] 確認盤面位置時截圖失敗: {e}")
+            return None
+
+        match = self._match(roi, origin=(roi_left, roi_top))
+        if match is None:
+            return None
+
+        return (int(match.left), int(match.top), width, height)
+
+    def _window_geometry(self):
+        """目前設定的視窗位置與大小"""
+        return [
+            config.WINDOW_X,
+            config.WINDOW_Y,
+            config.WINDOW_WIDTH,
+            config.WINDOW_HEIGHT,
+        ]
+
+    def _load_cache(self):
+        """讀取快取檔，視窗位置相同時才採用"""
+        if not os.path.exists(self.cache_path):
+            return
+
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+            if data.get("window") != self._window_geometry():
+                if config.DEBUG_MODE:
+                    print("[除錯] 視窗位置已改變，不使用盤面位置快取")
+                return
+
+            self.reference_box = tuple(data["reference_box"])
+            print(f"[視覺] 載入盤面位置快取: {self.reference_box[:2]}")
+
+        except Exception as e:
+            print(f"[警告] 讀取盤面位置快取失敗: {e}")
+
+    def _save_cache(self):
+        """把參考圖示位置與視窗位置存檔"""
+        data = {
+            "window": self._window_geometry(),
+            "reference_box": list(self.reference_box),
+            "board": list(self.board_position()),
+        }
+
+        try:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+        except Exception as e:
+            print(f"[警告] 儲存盤面位置快取失敗: {e}")
+
+
+_board_locator = None
+
+
+def get_board_locator():
+    """取得共用的盤面定位器"""
+    global _board_locator
+
+    if _board_locator is None:
+        _board_locator = BoardLocator()
+    return _board_locator
+
+
 # 📝 STUDY: 定位遊戲盤面
-def locate_game_board():
+def locate_game_board(force_full_search=False):
     """
     使用參考圖示定位遊戲盤面的位置
 
+    Args:
+        force_full_search: True 時忽略快取，直接全螢幕搜尋
+
     Returns:
         tuple: (x, y) 盤面左上角座標，若失敗則返回 None
 
     學習重點:
-    - pyautogui.locateOnScreen(): 在螢幕上尋找圖片
+    - 先確認上次的位置（只截一小塊），失敗才全螢幕搜尋
+    - cv2.matchTemplate(): 模板匹配，分數介於 -1 與 1
     - confidence: 匹配信心度（0.0-1.0）
-    - 返回值: Box(left, top, width, height) 或 None
 
     重要提示:
     1. 需要先準備參考圖示（assets/reference_icon.png）
@@ -54,12 +1003,9 @@ def locate_game_board():
     print("[視覺] 定位遊戲盤面...")
 
     try:
-        # 📝 STUDY: 在螢幕上尋找參考圖示
-        location = pyautogui.locateOnScreen(
-            config.REFERENCE_ICON_PATH, confidence=config.MATCH_CONFIDENCE
-        )
+        board_pos = get_board_locator().locate(force_full_search)
 
-        if location is None:
+        if board_pos is None:
             print("[錯誤] 找不到參考圖示！")
             print(f"[提示] 請確認 {config.REFERENCE_ICON_PATH} 存在")
             print(
@@ -67,21 +1013,9 @@ def locate_game_board():
             )
             return None
 
-        # 📝 STUDY: 計算盤面位置
-        # location 的格式: Box(left, top, width, height)
-        ref_x = location.left
-        ref_y = location.top
-
-        # 根據偏移量計算盤面左上角
-        board_x = ref_x + config.BOARD_OFFSET_FROM_REFERENCE[0]
-        board_y = ref_y + config.BOARD_OFFSET_FROM_REFERENCE[1]
-
+        board_x, board_y = board_pos
         print(f"[視覺] 盤面定位成功！位置: ({board_x}, {board_y})")
 
-        # 除錯模式：標記盤面位置
-        if config.DEBUG_MODE:
-            save_debug_board_location(board_x, board_y)
-
         return (board_x, board_y)
 
     except Exception as e:
@@ -93,22 +1027,23 @@ def locate_game_board():
         return None
 
 
-# 📝 STUDY: 截取盤面區域
-def capture_board(board_x, board_y):
+# 📝 STUDY: 截取盤面區域（numpy 陣列）
+def capture_board_array(board_x, board_y):
     """
-    截取遊戲盤面區域
+    截取遊戲盤面區域，直接回傳 numpy 陣列
 
     Args:
         board_x: 盤面左上角 x 座標
         board_y: 盤面左上角 y 座標
 
     Returns:
-        PIL.Image: 盤面截圖
+        np.ndarray: (H, W, 3) 的 RGB 陣列
+                    注意：可能是截圖後端重複使用的緩衝區，需要保留請 .copy()
 
     學習重點:
     - 計算盤面區域大小
-    - 使用 pyautogui.screenshot(region=...) 截取特定區域
     - region 格式: (x, y, width, height)
+    - 由截圖後端決定要截全螢幕再裁切，還是只截這個區域
     """
     if config.DEBUG_MODE:
         print("[視覺] 截取盤面區域...")
@@ -117,17 +1052,23 @@ def capture_board(board_x, board_y):
     board_width = config.GRID_COLS * config.CELL_SIZE
     board_height = config.GRID_ROWS * config.CELL_SIZE
 
-    # 截取盤面區域
-    # region = (board_x, board_y, board_width, board_height)
-    # board_image = pyautogui.screenshot(region=region)
+    region = (board_x, board_y, board_width, board_height)
+    return get_frame_source().grab(region)
 
-    # 🔧 修改：先截全螢幕，再裁切
-    full_screenshot = pyautogui.screenshot()
-    board_image = full_screenshot.crop(
-        (board_x, board_y, board_x + board_width, board_y + board_height)
-    )
 
-    return board_image
+# 📝 STUDY: 截取盤面區域
+def capture_board(board_x, board_y):
+    """
+    截取遊戲盤面區域
+
+    Args:
+        board_x: 盤面左上角 x 座標
+        board_y: 盤面左上角 y 座標
+
+    Returns:
+        PIL.Image: 盤面截圖
+    """
+    return Image.fromarray(capture_board_array(board_x, board_y))
 
 
 # 📝 STUDY: 辨識單個格子的顏色
@@ -190,34 +1131,311 @@ def detect_cell_color(board_image, row, col):
     return best_match
 
 
-def detect_popup_in_board(board_image):
-    """在盤面截圖中偵測彈窗（方案 1：藍色區域）"""
+# 📝 STUDY: 一次辨識整個盤面（向量化版本）
+def _palette_arrays():
+    """
+    把 config.BALL_COLORS 轉成 numpy 陣列
 
-    try:
-        img_array = np.array(board_image)
-        height, width = img_array.shape[:2]
+    Returns:
+        tuple: (color_names, palette)
+               color_names: 顏色名稱列表
+               palette: (K, 3) 的 float64 陣列
+    """
+    color_names = list(config.BALL_COLORS.keys())
+    palette = np.array(list(config.BALL_COLORS.values()), dtype=np.float64)
+    return color_names, palette
+
+
+def _to_rgb_array(image):
+    """
+    把 PIL 圖片或 numpy 陣列轉成 RGB 陣列（忽略 alpha）
+
+    Args:
+        image: PIL.Image 或形狀為 (..., H, W, C) 的陣列
+
+    Returns:
+        np.ndarray: 形狀為 (..., H, W, 3) 的陣列
+    """
+    array = np.asarray(image)
+    return array[..., :3]
+
+
+def compute_cell_means(frames, step=1):
+    """
+    一次計算所有格子取樣區域的平均顏色
+
+    Args:
+        frames: 單張盤面 (H, W, 3) 或多張盤面 (N, H, W, 3)
+        step: 取樣區域內每隔幾個像素取一次（1 表示全部）
+
+    Returns:
+        np.ndarray: (GRID_ROWS, GRID_COLS, 3) 或 (N, GRID_ROWS, GRID_COLS, 3)
+
+    學習重點:
+    - reshape 成 (列, 格子高, 行, 格子寬, 3) 不會複製資料，只是換個角度看同一塊記憶體
+    - 切出每個格子中心的取樣區域後，一次對所有格子取平均
+    - 取樣範圍與 detect_cell_color() 相同：中心 ± COLOR_SAMPLE_RADIUS
+    """
+    frames = _to_rgb_array(frames)
+    cell = config.CELL_SIZE
+    rows, cols = config.GRID_ROWS, config.GRID_COLS
+
+    # 盤面截圖可能比 rows * cell 多幾個像素，先裁掉
+    board = frames[..., : rows * cell, : cols * cell, :]
+    lead = board.shape[:-3]
+
+    # (..., rows, cell, cols, cell, 3) -> (..., rows, cols, cell, cell, 3)
+    grid = board.reshape(lead + (rows, cell, cols, cell, 3))
+    grid = np.moveaxis(grid, -3, -4)
+
+    # 取樣區域（相對於格子左上角）
+    center = cell // 2
+    start = max(0, center - config.COLOR_SAMPLE_RADIUS)
+    stop = min(cell, center + config.COLOR_SAMPLE_RADIUS)
+    patches = grid[..., start:stop:step, start:stop:step, :]
+
+    return patches.mean(axis=(-3, -2))
+
+
+def classify_cell_means(cell_means):
+    """
+    把格子平均顏色一次對應到調色盤
+
+    Args:
+        cell_means: (..., 3) 的平均顏色陣列
+
+    Returns:
+        np.ndarray: 與輸入相同前綴形狀的整數陣列，
+                    值為 BALL_COLORS 中的索引，-1 表示 UNKNOWN
+
+    學習重點:
+    - broadcasting: (..., 1, 3) - (K, 3) -> (..., K, 3)
+    - 與 detect_cell_color() 相同：取最近的顏色，且距離必須小於 COLOR_TOLERANCE
+    """
+    _, palette = _palette_arrays()
+    diff = cell_means[..., np.newaxis, :] - palette
+    distances = np.sqrt((diff**2).sum(axis=-1))
+
+    best = distances.argmin(axis=-1)
+    best_distance = np.take_along_axis(distances, best[..., np.newaxis], axis=-1)
+    best[best_distance[..., 0] >= config.COLOR_TOLERANCE] = -1
+    return best
+
+
+# ==================== 顏色查表（LUT） ====================
+
+_color_lut = None
+_color_lut_key = None
+
+
+def _color_lut_key_for(bits):
+    """調色盤、容忍度與位元數的雜湊（任何一個改變都要重建查表）"""
+    payload = json.dumps(
+        {
+            "colors": [[name, list(rgb)] for name, rgb in config.BALL_COLORS.items()],
+            "tolerance": config.COLOR_TOLERANCE,
+            "bits": bits,
+        }
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def build_color_lut(bits=None):
+    """
+    建立 RGB -> 顏色索引的查表
+
+    Args:
+        bits: 每個通道保留幾個位元（預設 config.COLOR_LUT_BITS）
+
+    Returns:
+        np.ndarray: (2^bits, 2^bits, 2^bits) 的 int8 陣列，
+                    值為 BALL_COLORS 中的索引，-1 表示 UNKNOWN
+
+    學習重點:
+    - 把 0-255 的每個通道切成 2^bits 個區間，每個區間用中心點代表
+    - 每個區間的顏色用 classify_cell_means() 算一次，之後只要查表
+    """
+    if bits is None:
+        bits = config.COLOR_LUT_BITS
+
+    step = 256 >> bits
+    centers = np.arange(1 << bits) * step + (step - 1) / 2
+    r, g, b = np.meshgrid(centers, centers, centers, indexing="ij")
+    grid = np.stack([r, g, b], axis=-1)
+
+    return classify_cell_means(grid).astype(np.int8)
+
+
+def get_color_lut():
+    """
+    取得目前調色盤的查表
+
+    Returns:
+        np.ndarray: build_color_lut() 的結果
+
+    學習重點:
+    - 記憶體中的查表與調色盤雜湊不符時（BALL_COLORS 被修改）自動重建
+    - 依雜湊存到 COLOR_LUT_CACHE_DIR，下次啟動直接讀檔
+    """
+    global _color_lut, _color_lut_key
+
+    bits = config.COLOR_LUT_BITS
+    key = _color_lut_key_for(bits)
+    if _color_lut is not None and key == _color_lut_key:
+        return _color_lut
+
+    path = os.path.join(config.COLOR_LUT_CACHE_DIR, f"color_lut_{key}.npy")
+    lut = None
+
+    if os.path.exists(path):
+        try:
+            lut = np.load(path)
+        except Exception as e:
+            print(f"[警告] 讀取顏色查表快取失敗: {e}")
+
+    if lut is None or lut.shape != (1 << bits,) * 3:
+        if config.DEBUG_MODE:
+            print(f"[視覺] 建立顏色查表（{1 << bits}^3）...")
+        lut = build_color_lut(bits)
+
+        try:
+            os.makedirs(config.COLOR_LUT_CACHE_DIR, exist_ok=True)
+            np.save(path, lut)
+        except Exception as e:
+            print(f"[警告] 儲存顏色查表快取失敗: {e}")
+
+    _color_lut, _color_lut_key = lut, key
+    return lut
+
+
+def lookup_colors(rgb):
+    """
+    用查表把 RGB 值轉成顏色索引
+
+    Args:
+        rgb: (..., 3) 的陣列（整數或浮點數皆可）
+
+    Returns:
+        np.ndarray: 與輸入相同前綴形狀的 int8 陣列，-1 表示 UNKNOWN
+    """
+    lut = get_color_lut()
+    shift = 8 - config.COLOR_LUT_BITS
+
+    rgb = np.asarray(rgb)
+    if rgb.dtype != np.uint8:
+        # 🔧 平均值先四捨五入，直接 astype 會無條件捨去，邊界附近的值會落到隔壁的格子
+        if np.issubdtype(rgb.dtype, np.floating):
+            rgb = np.rint(rgb)
+        rgb = np.clip(rgb, 0, 255).astype(np.uint8)
 
-        blue_pixel_count = 0
-        total_pixels = 0
+    # 📝 STUDY: 一次 fancy indexing 完成所有顏色的分類
+    quantized = rgb[..., :3] >> shift
+    return lut[quantized[..., 0], quantized[..., 1], quantized[..., 2]]
 
-        for y in range(0, height, 10):
-            for x in range(0, width, 10):
-                try:
-                    r, g, b = img_array[y, x][:3]
 
-                    if 30 < r < 90 and 90 < g < 150 and 150 < b < 210:
-                        blue_pixel_count += 1
+def segment_pixels(image):
+    """
+    逐像素分類（分割遮罩）
 
-                    total_pixels += 1
-                except:
-                    continue
+    Args:
+        image: PIL 圖片或 (..., H, W, C) 陣列
 
-        if total_pixels > 0:
-            blue_ratio = blue_pixel_count / total_pixels
+    Returns:
+        np.ndarray: (..., H, W) 的顏色索引，-1 表示 UNKNOWN
+    """
+    return lookup_colors(_to_rgb_array(image))
+
+
+def indices_to_board_state(indices):
+    """
+    把顏色索引陣列轉回原本的二維字串陣列
+
+    Args:
+        indices: (GRID_ROWS, GRID_COLS) 的顏色索引陣列
+
+    Returns:
+        list: 二維陣列，例如 [["RED", "BLUE", ...], ...]
+    """
+    color_names, _ = _palette_arrays()
+    lookup = color_names + ["UNKNOWN"]  # 索引 -1 會取到最後一個
+    return [[lookup[index] for index in row] for row in indices.tolist()]
+
+
+def classify_board_image(board_image):
+    """
+    一次辨識整個盤面的顏色（取代 36 次 detect_cell_color）
+
+    Args:
+        board_image: 盤面截圖（PIL.Image 或 numpy 陣列）
+
+    Returns:
+        Board: 盤面（與 detect_cell_color() 相同，只差在查表的量化誤差）
+               需要字串陣列時可用 board.to_grid()
+    """
+    cell_means = compute_cell_means(board_image)
+    return Board.from_indices(lookup_colors(cell_means))
 
-            if blue_ratio > 0.4:
-                print(f"[視覺] ✅ 偵測到彈窗！藍色比例: {blue_ratio:.1%}")
-                return True
+
+def classify_board_batch(frames):
+    """
+    一次辨識多張盤面截圖
+
+    Args:
+        frames: (N, H, W, 3) 的陣列，或盤面截圖的列表
+
+    Returns:
+        np.ndarray: (N, GRID_ROWS, GRID_COLS) 的顏色索引陣列，-1 表示 UNKNOWN
+                    可用 Board.from_indices() 轉成盤面
+    """
+    if not isinstance(frames, np.ndarray):
+        frames = np.stack([_to_rgb_array(frame) for frame in frames])
+
+    return lookup_colors(compute_cell_means(frames))
+
+
+def popup_blue_ratio(frames, stride=None):
+    """
+    計算截圖中「彈窗藍色」像素的比例
+
+    Args:
+        frames: 單張截圖 (H, W, C) 或多張截圖 (N, H, W, C)
+        stride: 取樣間隔（預設 config.POPUP_SAMPLE_STRIDE）
+
+    Returns:
+        float 或 np.ndarray: 單張時回傳比例，多張時回傳 (N,) 陣列
+
+    學習重點:
+    - frames[..., ::s, ::s, :] 直接取出取樣點，不需要 Python 迴圈
+    - 一個布林運算式完成所有取樣點的範圍判斷
+    """
+    if stride is None:
+        stride = config.POPUP_SAMPLE_STRIDE
+
+    samples = np.asarray(frames)[..., ::stride, ::stride, :]
+    r, g, b = samples[..., 0], samples[..., 1], samples[..., 2]
+    (r_low, g_low, b_low) = config.POPUP_BLUE_LOWER
+    (r_high, g_high, b_high) = config.POPUP_BLUE_UPPER
+
+    # 📝 STUDY: 三個通道都要落在範圍內（不含邊界）
+    is_blue = (
+        (r > r_low) & (r < r_high) & (g > g_low) & (g < g_high) & (b > b_low) & (b < b_high)
+    )
+    ratio = is_blue.mean(axis=(-2, -1))
+
+    if np.ndim(ratio) == 0:
+        return float(ratio)
+    return ratio
+
+
+def detect_popup_in_board(board_image):
+    """在盤面截圖中偵測彈窗（方案 1：藍色區域）"""
+
+    try:
+        blue_ratio = popup_blue_ratio(board_image)
+
+        if blue_ratio > config.POPUP_BLUE_RATIO:
+            print(f"[視覺] ✅ 偵測到彈窗！藍色比例: {blue_ratio:.1%}")
+            return True
 
         return False
 
@@ -227,16 +1445,30 @@ def detect_popup_in_board(board_image):
         return False
 
 
+def detect_popup_batch(frames):
+    """
+    一次判斷多張截圖是否有彈窗
+
+    Args:
+        frames: (N, H, W, C) 的陣列，或截圖的列表
+
+    Returns:
+        tuple: (has_popup, blue_ratio)
+               has_popup: (N,) 布林陣列
+               blue_ratio: (N,) 藍色比例
+    """
+    if not isinstance(frames, np.ndarray):
+        frames = np.stack([_to_rgb_array(frame) for frame in frames])
+
+    blue_ratio = popup_blue_ratio(frames)
+    return blue_ratio > config.POPUP_BLUE_RATIO, blue_ratio
+
+
 def detect_popup_in_board_state(board_state):
     """檢查盤面狀態是否異常（方案 3）"""
-    unknown_count = 0
-    total_cells = 0
-
-    for row in board_state:
-        for color in row:
-            if color == "UNKNOWN":
-                unknown_count += 1
-            total_cells += 1
+    board = as_board(board_state)
+    unknown_count = board.count(UNKNOWN)
+    total_cells = board.rows * board.cols
 
     if total_cells > 0:
         unknown_ratio = unknown_count / total_cells
@@ -248,41 +1480,203 @@ def detect_popup_in_board_state(board_state):
     return False
 
 
-def detect_board_state(board_x, board_y):
+# ==================== 畫面變化偵測 ====================
+
+
+def board_fingerprint(board_array, step=None):
     """
-    辨識整個盤面的狀態
+    盤面截圖的指紋：每格取樣區域（跳著取樣）的平均顏色
+
+    Args:
+        board_array: 盤面截圖陣列
+        step: 取樣間隔（預設 config.FRAME_FINGERPRINT_STEP）
 
     Returns:
-        tuple: (board_state, has_popup)
-               board_state: 二維陣列
-               has_popup: bool，是否偵測到彈窗
+        np.ndarray: (GRID_ROWS, GRID_COLS, 3) 的 int16 陣列
+    """
+    if step is None:
+        step = config.FRAME_FINGERPRINT_STEP
+    return compute_cell_means(board_array, step=step).astype(np.int16)
+
+
+def fingerprints_match(first, second, threshold=None):
+    """
+    兩個指紋是否視為同一個畫面
+
+    Args:
+        threshold: 每格每個通道允許的最大差異（預設 config.FRAME_CHANGE_THRESHOLD）
+    """
+    if first is None or second is None:
+        return False
+    if threshold is None:
+        threshold = config.FRAME_CHANGE_THRESHOLD
+    return int(np.abs(first - second).max()) <= threshold
+
+
+class FrameChangeDetector:
+    """
+    偵測盤面畫面是否和上次分析時相同
+
+    用法:
+        if detector.is_unchanged(board_array):
+            detector.record_skip()        # 沿用上次的分析結果
+        else:
+            ...完整分析...
+            detector.record_analysis(秒數)
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold
+        self.skipped_rounds = 0
+        self.analysed_rounds = 0
+        self.analysis_seconds = 0.0
+        self._last_fingerprint = None  # 上次完整分析時的指紋
+        self._pending_fingerprint = None  # 這回合的指紋
+
+    def is_unchanged(self, board_array):
+        """這張截圖是否與上次完整分析的畫面相同"""
+        self._pending_fingerprint = board_fingerprint(board_array)
+        return fingerprints_match(
+            self._last_fingerprint, self._pending_fingerprint, self.threshold
+        )
+
+    def record_analysis(self, seconds):
+        """記錄一次完整分析（之後的畫面都跟這次比較）"""
+        self._last_fingerprint = self._pending_fingerprint
+        self.analysed_rounds += 1
+        self.analysis_seconds += seconds
+
+    def record_skip(self):
+        """記錄一次略過的分析"""
+        self.skipped_rounds += 1
+
+    def reset(self):
+        """忘記上次的畫面（下一回合一定完整分析）"""
+        self._last_fingerprint = None
+
+    @property
+    def time_saved(self):
+        """略過分析省下的時間（以完整分析的平均時間估算）"""
+        if self.analysed_rounds == 0:
+            return 0.0
+        return self.skipped_rounds * self.analysis_seconds / self.analysed_rounds
+
+    def report(self):
+        """印出統計"""
+        print(
+            f"[視覺] 畫面未變化略過分析: {self.skipped_rounds} 回合"
+            f"（完整分析 {self.analysed_rounds} 回合），"
+            f"估計省下 {self.time_saved * 1000:.1f} ms"
+        )
+
+
+# 動畫結束偵測的結果
+SettleResult = namedtuple("SettleResult", ["settled", "changed", "elapsed", "polls"])
+
+
+def wait_for_board_settle(
+    board_x,
+    board_y,
+    reference=None,
+    stable_window=None,
+    timeout=None,
+    poll_interval=None,
+):
+    """
+    等待盤面動畫結束（畫面連續一段時間不再變化）
+
+    Args:
+        board_x: 盤面左上角 x 座標
+        board_y: 盤面左上角 y 座標
+        reference: 移動前的指紋（board_fingerprint，step 為 SETTLE_FINGERPRINT_STEP）
+                   有提供時會先等畫面開始變化，避免動畫還沒開始就以為結束了
+        stable_window: 畫面連續幾秒不變才算結束（預設 config.SETTLE_STABLE_WINDOW）
+        timeout: 最多等幾秒（預設 config.SETTLE_TIMEOUT）
+        poll_interval: 截圖間隔（預設 config.SETTLE_POLL_INTERVAL）
+
+    Returns:
+        SettleResult: (settled, changed, elapsed, polls)
+                      settled: 是否在時限內穩定
+                      changed: 畫面是否有變化過（False 可能表示移動沒有成功）
+                      elapsed: 實際等待秒數
+                      polls: 截圖次數
+
+    學習重點:
+    - 只比較每格的平均顏色（而且跳著取樣），一次截圖加比較只要幾毫秒
+    - 動畫結束就馬上返回，不用每次都等滿固定秒數
+    """
+    if stable_window is None:
+        stable_window = config.SETTLE_STABLE_WINDOW
+    if timeout is None:
+        timeout = config.SETTLE_TIMEOUT
+    if poll_interval is None:
+        poll_interval = config.SETTLE_POLL_INTERVAL
+
+    step = config.SETTLE_FINGERPRINT_STEP
+    start = time.perf_counter()
+    changed = reference is None
+    previous = None
+    stable_since = None
+    polls = 0
+
+    while True:
+        now = time.perf_counter()
+        current = board_fingerprint(capture_board_array(board_x, board_y), step=step)
+        polls += 1
+
+        if not changed:
+            # 📝 STUDY: 第一階段：等動畫開始
+            if not fingerprints_match(reference, current):
+                changed = True
+            elif now - start >= config.SETTLE_START_TIMEOUT:
+                return SettleResult(True, False, now - start, polls)
+
+        if changed:
+            # 📝 STUDY: 第二階段：等畫面連續 stable_window 秒不變
+            if fingerprints_match(previous, current):
+                if stable_since is None:
+                    stable_since = previous_time
+                if now - stable_since >= stable_window:
+                    return SettleResult(True, True, now - start, polls)
+            else:
+                stable_since = None
+
+        previous, previous_time = current, now
+
+        if now - start >= timeout:
+            return SettleResult(False, changed, now - start, polls)
+
+        time.sleep(poll_interval)
+
+
+def analyze_board_array(board_array):
+    """
+    分析已經截好的盤面截圖
+
+    Args:
+        board_array: capture_board_array() 的結果
+
+    Returns:
+        tuple: (board_state, has_popup)，與 detect_board_state() 相同
     """
     if config.DEBUG_MODE:
         print("[視覺] 分析盤面顏色...")
 
-    # 截取盤面
-    board_image = capture_board(board_x, board_y)
-
     # 🔧 檢查彈窗
-    has_popup = detect_popup_in_board(board_image)
+    has_popup = detect_popup_in_board(board_array)
 
     if has_popup:
         # 如果有彈窗，返回空盤面
         return None, True
 
-    # 建立二維陣列儲存盤面狀態
-    board_state = []
-
-    for row in range(config.GRID_ROWS):
-        row_colors = []
-        for col in range(config.GRID_COLS):
-            color = detect_cell_color(board_image, row, col)
-            row_colors.append(color)
-        board_state.append(row_colors)
+    # 📝 STUDY: 一次辨識所有格子（向量化，結果與逐格 detect_cell_color 相同）
+    board_state = classify_board_image(board_array)
 
     # 除錯模式：視覺化盤面狀態
     if config.DEBUG_MODE:
-        save_debug_color_detection(board_image, board_state)
+        debug_sink.get_debug_sink().submit(
+            "color_detection", save_debug_color_detection, board_array, board_state
+        )
         print_board_state(board_state)
 
     # 🔧 額外檢查盤面狀態
@@ -291,16 +1685,31 @@ def detect_board_state(board_x, board_y):
     return board_state, has_popup
 
 
+def detect_board_state(board_x, board_y):
+    """
+    辨識整個盤面的狀態
+
+    Returns:
+        tuple: (board_state, has_popup)
+               board_state: Board
+               has_popup: bool，是否偵測到彈窗
+    """
+    # 截取盤面（numpy 陣列，不經過 PIL）
+    board_array = capture_board_array(board_x, board_y)
+
+    return analyze_board_array(board_array)
+
+
 # ✅ COMPLETE: 印出盤面狀態
 def print_board_state(board_state):
     """
     以 emoji 形式印出盤面狀態
 
     Args:
-        board_state: 二維陣列，表示盤面狀態
+        board_state: Board 或二維陣列，表示盤面狀態
     """
     print("\n當前盤面:")
-    for row in board_state:
+    for row in as_board(board_state).to_grid():
         row_display = " ".join([config.COLOR_EMOJI.get(color, "❓") for color in row])
         print(row_display)
     print()
@@ -309,11 +1718,19 @@ def print_board_state(board_state):
 # ==================== 除錯函數 ====================
 
 
-def save_debug_board_location(board_x, board_y):
+def save_debug_board_location(board_x, board_y, screenshot=None):
     """
     儲存標記盤面位置的除錯圖片
+
+    Args:
+        board_x: 盤面左上角 x 座標
+        board_y: 盤面左上角 y 座標
+        screenshot: 已經截好的螢幕截圖（沒有提供才重新截圖）
     """
-    screenshot = capture_screen()
+    if screenshot is None:
+        screenshot = capture_screen()
+    else:
+        screenshot = screenshot.copy()
     draw = ImageDraw.Draw(screenshot)
 
     # 計算盤面矩形
@@ -335,8 +1752,15 @@ def save_debug_board_location(board_x, board_y):
 def save_debug_color_detection(board_image, board_state):
     """
     儲存標記顏色辨識結果的除錯圖片
+
+    Args:
+        board_image: 盤面截圖（PIL.Image 或 numpy 陣列）
+        board_state: 盤面狀態
     """
-    debug_image = board_image.copy()
+    if isinstance(board_image, np.ndarray):
+        debug_image = Image.fromarray(board_image)
+    else:
+        debug_image = board_image.copy()
     draw = ImageDraw.Draw(debug_image)
 
     # 嘗試載入字體，失敗則使用預設
@@ -346,9 +1770,10 @@ def save_debug_color_detection(board_image, board_state):
         font = ImageFont.load_default()
 
     # 在每個格子上標記顏色
+    grid = as_board(board_state).to_grid()
     for row in range(config.GRID_ROWS):
         for col in range(config.GRID_COLS):
-            color = board_state[row][col]
+            color = grid[row][col]
             emoji = config.COLOR_EMOJI.get(color, "❓")
 
             # 計算文字位置（格子中心）